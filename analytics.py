@@ -0,0 +1,260 @@
+"""
+Population-level rollups of predictions and appointments.
+
+prediction_rollup holds risk-score histogram counts per day, age band and
+gender; appointment_rollup holds appointment counts per appointment day,
+doctor and status. Both are kept current incrementally: ORM writes are
+rolled up from the session's flush, and the bulk Core writers (batch
+prediction, re-scoring, bulk import) pass their rows to the
+apply_*_deltas() helpers inside the same transaction. rebuild() recomputes
+both tables from scratch with INSERT ... SELECT ... GROUP BY.
+"""
+import logging
+from bisect import bisect_right
+from collections import Counter
+
+from sqlalchemy import event, select, delete, insert, func, case, cast, inspect, Date
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Prediction, Appointment, PredictionRollup, AppointmentRollup
+
+# Upper edges of the risk buckets: bucket i holds results in [i/10, (i+1)/10)
+RISK_EDGES = tuple(i / 10 for i in range(1, 10))
+AGE_BAND_WIDTH = 10
+MAX_AGE_BAND = 80
+
+PREDICTION_FIELDS = ('created_at', 'age', 'gender', 'prediction_result')
+APPOINTMENT_FIELDS = ('appointment_date', 'doctor_id', 'status')
+
+PREDICTION_DIMENSIONS = ('day', 'age_band', 'gender')
+APPOINTMENT_DIMENSIONS = ('day', 'doctor_id', 'status')
+
+def age_band(age):
+    return min(int(age) // AGE_BAND_WIDTH * AGE_BAND_WIDTH, MAX_AGE_BAND)
+
+def gender_key(gender):
+    return (gender if gender is not None else 'unknown').strip().lower()
+
+def risk_bucket(prediction_result):
+    return bisect_right(RISK_EDGES, prediction_result)
+
+def prediction_key(created_at, age, gender, prediction_result):
+    """Rollup key of one prediction row."""
+    return created_at.date(), age_band(age), gender_key(gender), risk_bucket(prediction_result)
+
+def appointment_key(appointment_date, doctor_id, status):
+    """Rollup key of one appointment row."""
+    return appointment_date, doctor_id, status if status is not None else 'unknown'
+
+def count_predictions(rows, sign=1):
+    """Counter of rollup deltas for (created_at, age, gender, prediction_result) rows."""
+    deltas = Counter()
+    for row in rows:
+        deltas[prediction_key(*row)] += sign
+    return deltas
+
+def count_appointments(rows, sign=1):
+    """Counter of rollup deltas for (appointment_date, doctor_id, status) rows."""
+    deltas = Counter()
+    for row in rows:
+        deltas[appointment_key(*row)] += sign
+    return deltas
+
+def _apply_deltas(connection, model, key_names, deltas):
+    rows = [dict(zip(key_names, key), count=delta) for key, delta in deltas.items() if delta]
+    if not rows:
+        return
+    table = model.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table)
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table)
+    else:
+        raise NotImplementedError(f"Analytics rollups do not support the {dialect} dialect")
+    # Add the delta to the existing count, or start the row at the delta
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_names),
+        set_={'count': table.c.count + statement.excluded.count}
+    )
+    connection.execute(statement, rows)
+
+def apply_prediction_deltas(connection, deltas):
+    _apply_deltas(connection, PredictionRollup, ('day', 'age_band', 'gender', 'risk_bucket'), deltas)
+
+def apply_appointment_deltas(connection, deltas):
+    _apply_deltas(connection, AppointmentRollup, ('day', 'doctor_id', 'status'), deltas)
+
+def _values_before_flush(instance, fields):
+    state = inspect(instance)
+    values = []
+    for field in fields:
+        history = state.attrs[field].history
+        values.append(history.deleted[0] if history.deleted else getattr(instance, field))
+    return values
+
+def _changed(instance, fields):
+    state = inspect(instance)
+    return any(state.attrs[field].history.has_changes() for field in fields)
+
+@event.listens_for(db.session, 'after_flush')
+def _roll_up_flush(session, flush_context):
+    prediction_deltas, appointment_deltas = Counter(), Counter()
+    for instance in session.new:
+        if isinstance(instance, Prediction):
+            prediction_deltas[prediction_key(*(getattr(instance, f) for f in PREDICTION_FIELDS))] += 1
+        elif isinstance(instance, Appointment):
+            appointment_deltas[appointment_key(*(getattr(instance, f) for f in APPOINTMENT_FIELDS))] += 1
+    for instance in session.deleted:
+        if isinstance(instance, Prediction):
+            prediction_deltas[prediction_key(*_values_before_flush(instance, PREDICTION_FIELDS))] -= 1
+        elif isinstance(instance, Appointment):
+            appointment_deltas[appointment_key(*_values_before_flush(instance, APPOINTMENT_FIELDS))] -= 1
+    for instance in session.dirty:
+        if isinstance(instance, Prediction) and _changed(instance, PREDICTION_FIELDS):
+            prediction_deltas[prediction_key(*_values_before_flush(instance, PREDICTION_FIELDS))] -= 1
+            prediction_deltas[prediction_key(*(getattr(instance, f) for f in PREDICTION_FIELDS))] += 1
+        elif isinstance(instance, Appointment) and _changed(instance, APPOINTMENT_FIELDS):
+            appointment_deltas[appointment_key(*_values_before_flush(instance, APPOINTMENT_FIELDS))] -= 1
+            appointment_deltas[appointment_key(*(getattr(instance, f) for f in APPOINTMENT_FIELDS))] += 1
+
+    # Written on the flush's own connection, so the rollups commit or roll back with the rows
+    if prediction_deltas:
+        apply_prediction_deltas(session.connection(), prediction_deltas)
+    if appointment_deltas:
+        apply_appointment_deltas(session.connection(), appointment_deltas)
+
+def _day(column, dialect):
+    # SQLite has no DATE type; date() yields the same 'YYYY-MM-DD' text the ORM stores
+    return func.date(column) if dialect == 'sqlite' else cast(column, Date)
+
+def _prediction_rollup_select(dialect):
+    table = Prediction.__table__
+    day = _day(table.c.created_at, dialect)
+    band = case((table.c.age >= MAX_AGE_BAND, MAX_AGE_BAND), else_=table.c.age // AGE_BAND_WIDTH * AGE_BAND_WIDTH)
+    gender = func.lower(func.trim(func.coalesce(table.c.gender, 'unknown')))
+    bucket = case(
+        *((table.c.prediction_result >= edge, index + 1) for index, edge in reversed(list(enumerate(RISK_EDGES)))),
+        else_=0
+    )
+    return select(day, band, gender, bucket, func.count()).group_by(day, band, gender, bucket)
+
+def _appointment_rollup_select():
+    table = Appointment.__table__
+    status = func.coalesce(table.c.status, 'unknown')
+    return (
+        select(table.c.appointment_date, table.c.doctor_id, status, func.count())
+        .group_by(table.c.appointment_date, table.c.doctor_id, status)
+    )
+
+def rebuild(connection):
+    """
+    Recompute both rollup tables from the source tables in set-based SQL.
+
+    Returns:
+        dict: Rollup rows written per table
+    """
+    dialect = connection.dialect.name
+    prediction_table, appointment_table = PredictionRollup.__table__, AppointmentRollup.__table__
+
+    connection.execute(delete(prediction_table))
+    connection.execute(insert(prediction_table).from_select(
+        ['day', 'age_band', 'gender', 'risk_bucket', 'count'], _prediction_rollup_select(dialect)
+    ))
+    connection.execute(delete(appointment_table))
+    connection.execute(insert(appointment_table).from_select(
+        ['day', 'doctor_id', 'status', 'count'], _appointment_rollup_select()
+    ))
+
+    counts = {
+        'prediction_rollup': connection.execute(select(func.count()).select_from(prediction_table)).scalar(),
+        'appointment_rollup': connection.execute(select(func.count()).select_from(appointment_table)).scalar(),
+    }
+    logging.info(f"Rebuilt analytics rollups: {counts}")
+    return counts
+
+def _normalized(rows):
+    # Keys compared as text so SQLite's string dates match the ORM's date objects
+    return {tuple(str(value) for value in row[:-1]): row[-1] for row in rows if row[-1]}
+
+def check(connection):
+    """
+    Compare the incrementally maintained rollups with a fresh recomputation.
+
+    Returns:
+        dict: Table name -> list of (key, stored count, recomputed count) mismatches
+    """
+    dialect = connection.dialect.name
+    mismatches = {}
+    for model, recompute in (
+        (PredictionRollup, _prediction_rollup_select(dialect)),
+        (AppointmentRollup, _appointment_rollup_select()),
+    ):
+        table = model.__table__
+        stored = _normalized(connection.execute(select(*table.c)).all())
+        expected = _normalized(connection.execute(recompute).all())
+        mismatches[table.name] = [
+            (key, stored.get(key, 0), expected.get(key, 0))
+            for key in sorted(set(stored) | set(expected))
+            if stored.get(key, 0) != expected.get(key, 0)
+        ]
+    return mismatches
+
+def _dimensions(by, allowed):
+    dimensions = [name.strip() for name in by.split(',') if name.strip()] if by else []
+    unknown = [name for name in dimensions if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown grouping {', '.join(unknown)}; choose from {', '.join(allowed)}")
+    return dimensions
+
+def risk_histograms(start=None, end=None, by='age_band,gender'):
+    """
+    Risk-score histograms from the rollup, grouped by any of day, age_band and gender.
+
+    The cost depends on the number of rollup rows in the date range, not on
+    the number of predictions.
+    """
+    table = PredictionRollup.__table__
+    dimensions = _dimensions(by, PREDICTION_DIMENSIONS)
+    columns = [table.c[name] for name in dimensions]
+    query = select(*columns, table.c.risk_bucket, func.sum(table.c.count)).group_by(*columns, table.c.risk_bucket)
+    if start:
+        query = query.where(table.c.day >= start)
+    if end:
+        query = query.where(table.c.day <= end)
+
+    groups = {}
+    for *key, bucket, count in db.session.execute(query.order_by(*columns)):
+        histogram = groups.setdefault(tuple(key), [0] * (len(RISK_EDGES) + 1))
+        histogram[bucket] += int(count)
+
+    edges = (0.0, *RISK_EDGES, 1.0)
+    return {
+        'buckets': [{'bucket': i, 'min': edges[i], 'max': edges[i + 1]} for i in range(len(edges) - 1)],
+        'groups': [
+            dict(zip(dimensions, (value.isoformat() if hasattr(value, 'isoformat') else value for value in key)),
+                 histogram=histogram, total=sum(histogram))
+            for key, histogram in groups.items()
+        ]
+    }
+
+def appointment_counts(start=None, end=None, by='doctor_id,status', doctor_id=None):
+    """Appointment counts from the rollup, grouped by any of day, doctor_id and status."""
+    table = AppointmentRollup.__table__
+    dimensions = _dimensions(by, APPOINTMENT_DIMENSIONS)
+    columns = [table.c[name] for name in dimensions]
+    query = select(*columns, func.sum(table.c.count)).group_by(*columns).order_by(*columns)
+    if start:
+        query = query.where(table.c.day >= start)
+    if end:
+        query = query.where(table.c.day <= end)
+    if doctor_id is not None:
+        query = query.where(table.c.doctor_id == doctor_id)
+
+    return [
+        dict(zip(dimensions, (value.isoformat() if hasattr(value, 'isoformat') else value for value in key)),
+             count=int(count))
+        for *key, count in db.session.execute(query)
+        if count
+    ]
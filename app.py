@@ -9,6 +9,10 @@ from flask_cors import CORS
 # Load environment variables from .env file
 load_dotenv()
 
+# These read their settings from the environment at import, so they come after load_dotenv()
+import storage
+import metrics
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -24,10 +28,7 @@ app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key-for-develo
 
 # Configure database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///smart_healthcare.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = storage.engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize extensions
@@ -36,12 +37,20 @@ CORS(app)
 
 # Create all tables
 with app.app_context():
+    # Connection settings of the selected storage profile (WAL, timeouts, ...)
+    storage.install(db.engine)
+    # Request latency and SQL timings for /metrics
+    metrics.install(app, db.engine)
+    
     # Import models here to ensure they're registered with SQLAlchemy
     import models
+    import migrations
     db.create_all()
+    migrations.upgrade()
 
 # Import routes after app initialization to avoid circular imports
 from routes import *
+import commands
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
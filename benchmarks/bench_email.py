@@ -0,0 +1,158 @@
+"""
+Email sending throughput against a local mock of the SendGrid API.
+
+A mock mail/send endpoint runs in a separate process. It speaks HTTP/1.1
+keep-alive, waits MOCK_LATENCY_MS per request to stand in for the
+provider's response time, and counts the personalizations it receives.
+The same N_MESSAGES reminder emails are then sent three ways:
+- the previous code path: a new SendGridAPIClient and connection per message
+- the pooled SendGridClient, still one request per message
+- send_many(), one request per MAX_PERSONALIZATIONS recipients of a template
+
+The reminders come from personalize_appointment_reminder(), as the reminder
+scheduler queues them. The mock rejects any request that includes
+REJECTED_RECIPIENT with a 400, like SendGrid does for a malformed address.
+A last send_many() run adds that address to the batch and checks that only
+its message fails.
+
+The script exits non-zero if the mock did not receive every recipient.
+
+Run from the repository root:
+    python -m benchmarks.bench_email
+"""
+import os
+import sys
+import json
+import time
+import threading
+import multiprocessing
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('SENDGRID_API_KEY', 'SG.benchmark')
+
+from sendgrid import SendGridAPIClient
+from sendgrid.helpers.mail import Mail, Email, To, Content
+
+from email_service import SendGridClient, OutgoingEmail, MAX_PERSONALIZATIONS, personalize_appointment_reminder
+from email_templates import apply_substitutions
+
+N_MESSAGES = 2000
+MOCK_LATENCY_MS = 2.0
+SENDER_THREADS = 4
+
+REJECTED_RECIPIENT = 'not-an-address'
+
+class MockSendGrid(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(MOCK_LATENCY_MS / 1000)
+        recipients = [to['email'] for p in payload['personalizations'] for to in p['to']]
+        rejected = REJECTED_RECIPIENT in recipients
+        with self.server.lock:
+            self.server.requests += 1
+            if not rejected:
+                self.server.recipients += len(recipients)
+        self.send_response(400 if rejected else 202)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        with self.server.lock:
+            body = json.dumps({'requests': self.server.requests, 'recipients': self.server.recipients}).encode()
+            self.server.requests = self.server.recipients = 0
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port_queue):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockSendGrid)
+    server.lock = threading.Lock()
+    server.requests = server.recipients = 0
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+def take_counts(base_url):
+    with urllib.request.urlopen(f"{base_url}/stats") as response:
+        return json.loads(response.read())
+
+def messages():
+    batch = []
+    for i in range(N_MESSAGES):
+        subject, body, substitutions = personalize_appointment_reminder({
+            'patient_name': f"Patient {i}", 'doctor_name': f"Doctor {i % 10}", 'specialization': 'Cardiology',
+            'date': 'Monday, June 02, 2025', 'time': f"{9 + i % 8:02d}:00 AM", 'reason': 'Check-up',
+        })
+        batch.append(OutgoingEmail(f"patient{i}@example.com", subject, body, substitutions))
+    return batch
+
+def render(message):
+    return apply_substitutions(message.body, message.substitutions)
+
+def legacy_path(base_url, batch):
+    def send(message):
+        client = SendGridAPIClient('SG.benchmark', host=base_url)
+        mail = Mail(Email('noreply@smarthealth.app'), To(message.recipient), message.subject,
+                    Content('text/plain', render(message)))
+        client.client.mail.send.post(request_body=mail.get())
+    with ThreadPoolExecutor(SENDER_THREADS) as pool:
+        list(pool.map(send, batch))
+
+def pooled_path(client, batch):
+    with ThreadPoolExecutor(SENDER_THREADS) as pool:
+        list(pool.map(lambda m: client.send(m.recipient, m.subject, render(m)), batch))
+
+def bulk_path(client, batch):
+    errors = client.send_many(batch)
+    if any(errors):
+        raise RuntimeError(next(error for error in errors if error))
+
+def timed(label, base_url, fn):
+    started = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - started
+    counts = take_counts(base_url)
+    print(f"{label:<40} {seconds:>7.2f} s  {N_MESSAGES / seconds:>8,.0f} emails/s  "
+          f"{counts['requests']:>5} requests")
+    return counts
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    base_url = f"http://127.0.0.1:{port_queue.get()}"
+    print(f"{N_MESSAGES:,} reminder emails, mock latency {MOCK_LATENCY_MS} ms, "
+          f"{SENDER_THREADS} sender threads for per-message paths, {MAX_PERSONALIZATIONS} personalizations per request")
+
+    batch = messages()
+    client = SendGridClient(api_key='SG.benchmark', base_url=base_url, pool_size=SENDER_THREADS)
+    results = [
+        timed('new client per message (previous)', base_url, lambda: legacy_path(base_url, batch)),
+        timed('pooled client, one request per email', base_url, lambda: pooled_path(client, batch)),
+        timed('send_many with personalizations', base_url, lambda: bulk_path(client, batch)),
+    ]
+    print(f"pooled client opened {client.stats()['connections']} connections")
+
+    rejected_at = N_MESSAGES // 3
+    batch[rejected_at] = batch[rejected_at]._replace(recipient=REJECTED_RECIPIENT)
+    errors = client.send_many(batch)
+    counts = take_counts(base_url)
+    print(f"send_many with one rejected address: {counts['requests']} requests, "
+          f"{counts['recipients']:,} delivered, {sum(1 for error in errors if error)} failed")
+    server.terminate()
+    if any(counts['recipients'] != N_MESSAGES for counts in results):
+        print('the mock server did not receive every recipient')
+        sys.exit(1)
+    if counts['recipients'] != N_MESSAGES - 1 or [i for i, error in enumerate(errors) if error] != [rejected_at]:
+        print('the rejected address failed other messages of its request')
+        sys.exit(1)
+    print('every path delivered every recipient, and only the rejected address failed')
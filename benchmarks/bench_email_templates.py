@@ -0,0 +1,79 @@
+"""
+Rendering speed of prediction result emails for a bulk mailing.
+
+Renders N_RECIPIENTS result emails with random health metrics two ways:
+- rebuilding the recommendation block for every recipient, as
+  get_recommendation_text() did before the cache
+- render_prediction_result(), which evaluates the rules, takes the block
+  from the per-signature cache and fills the compiled template
+
+The script exits non-zero if the two bodies differ for any recipient.
+The appointment confirmation and reminder templates are timed as well.
+
+Run from the repository root:
+    python -m benchmarks.bench_email_templates
+"""
+import sys
+import time
+import random
+
+from email_templates import PREDICTION_RESULT, recommendation_signature, recommendation_block
+from email_service import render_prediction_result, render_appointment_confirmation, render_appointment_reminder
+
+N_RECIPIENTS = 100_000
+
+def recipients():
+    rng = random.Random(5)
+    return [
+        {
+            'patient_name': f"Patient {i}",
+            'prediction_label': rng.random() < 0.4,
+            'prediction_result': rng.random(),
+            'systolic_bp': rng.randint(100, 170), 'diastolic_bp': rng.randint(60, 100),
+            'cholesterol': rng.randint(1, 3),
+            'smoking': rng.random() < 0.2, 'alcohol': rng.random() < 0.3,
+            'physical_activity': rng.random() < 0.6,
+            'height': rng.uniform(150, 195), 'weight': rng.uniform(50, 120),
+            'sleep_hours': rng.randint(4, 9), 'stress_level': rng.randint(1, 10),
+            'high_salt_diet': rng.random() < 0.3, 'high_fat_diet': rng.random() < 0.3,
+        }
+        for i in range(N_RECIPIENTS)
+    ]
+
+def uncached(details):
+    # Same fill, but the block is rebuilt from the rules every time
+    return PREDICTION_RESULT.render({
+        'patient_name': details['patient_name'],
+        'risk_level': "High" if details['prediction_label'] else "Low",
+        'risk_percentage': f"{details['prediction_result'] * 100:.1f}%",
+        'recommendations': recommendation_block.__wrapped__(recommendation_signature(details)),
+    })
+
+def timed(label, render, batch):
+    # Bodies are dropped as they are rendered, as a sender streaming them out would
+    started = time.perf_counter()
+    for details in batch:
+        render(details)
+    seconds = time.perf_counter() - started
+    print(f"{label:<46} {seconds:>7.2f} s  {len(batch) / seconds:>10,.0f} emails/s")
+
+if __name__ == '__main__':
+    batch = recipients()
+    print(f"{N_RECIPIENTS:,} prediction result emails")
+    recommendation_block.cache_clear()
+    timed('recommendations rebuilt per recipient', uncached, batch)
+    timed('cached recommendations + compiled template', render_prediction_result, batch)
+    print(f"distinct recommendation blocks: {recommendation_block.cache_info().currsize}")
+
+    appointment = {
+        'patient_name': 'Patient', 'doctor_name': 'Doctor', 'specialization': 'Cardiology',
+        'date': 'Monday, June 02, 2025', 'time': '09:00 AM', 'reason': 'Check-up',
+        'priority': 'Urgent', 'notes': 'Bring results', 'follow_up': 'Yes', 'medical_records': 'No',
+    }
+    timed('appointment confirmations', render_appointment_confirmation, [appointment] * N_RECIPIENTS)
+    timed('appointment reminders', render_appointment_reminder, [appointment] * N_RECIPIENTS)
+
+    if any(render_prediction_result(details) != uncached(details) for details in batch):
+        print('cached rendering differs from the uncached rendering')
+        sys.exit(1)
+    print('every body matches the uncached rendering')
@@ -0,0 +1,82 @@
+"""
+Per-row cost of the compiled feature encoder.
+
+Compares the previous dict-by-dict preprocessing (kept here as a baseline)
+with the encoder's single-row, list-of-dicts and column-array paths.
+
+Run from the repository root:
+    python -m benchmarks.bench_feature_encoder
+"""
+import random
+import time
+
+import numpy as np
+
+from feature_encoder import feature_encoder
+
+N_ROWS = 100_000
+
+LEGACY_DEFAULTS = {
+    'age': 50, 'height': 170, 'weight': 70,
+    'chest_pain': 0, 'shortness_of_breath': 0, 'fatigue': 0, 'palpitations': 0, 'dizziness': 0,
+    'systolic_bp': 120, 'diastolic_bp': 80, 'cholesterol': 1, 'glucose': 1, 'heart_rate': 75,
+    'smoking': 0, 'alcohol': 0, 'physical_activity': 1, 'high_salt_diet': 0, 'high_fat_diet': 0,
+    'family_history': 0, 'genetic_disorders': 0, 'previous_heart_problems': 0,
+    'diabetes': 0, 'hypertension': 0, 'kidney_disease': 0
+}
+
+def legacy_preprocess(features_dict):
+    """The former ml_model.preprocess_features, one row at a time."""
+    gender_binary = 1 if features_dict.get('gender', '').lower() == 'male' else 0
+    values = []
+    for name in feature_encoder.feature_names:
+        if name == 'gender':
+            values.append(gender_binary)
+        elif name in ('age', 'height', 'weight', 'systolic_bp', 'diastolic_bp',
+                      'cholesterol', 'glucose', 'heart_rate'):
+            values.append(features_dict.get(name, LEGACY_DEFAULTS[name]))
+        else:
+            values.append(1 if features_dict.get(name, LEGACY_DEFAULTS[name]) else 0)
+    return np.array(values).reshape(1, -1)
+
+def random_records(n_rows, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'age': rng.randint(20, 85),
+            'gender': rng.choice(['male', 'female']),
+            'height': rng.randint(150, 195),
+            'weight': rng.randint(45, 120),
+            'systolic_bp': rng.randint(95, 180),
+            'diastolic_bp': rng.randint(60, 110),
+            'cholesterol': rng.randint(1, 3),
+            'glucose': rng.randint(1, 3),
+            'smoking': rng.random() < 0.2,
+            'alcohol': rng.random() < 0.3,
+            'physical_activity': rng.random() < 0.6,
+        }
+        for _ in range(n_rows)
+    ]
+
+def timed(label, func, n_rows):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / n_rows * 1e6:>8.2f} us/row")
+    return result
+
+def main():
+    records = random_records(N_ROWS)
+    columns = {name: [record.get(name) for record in records] for name in records[0]}
+    out = feature_encoder.empty(N_ROWS)
+
+    legacy = timed('legacy preprocess_features', lambda: np.vstack([legacy_preprocess(r) for r in records]), N_ROWS)
+    timed('encode_record (one at a time)', lambda: [feature_encoder.encode_record(r) for r in records], N_ROWS)
+    batched = timed('encode_records (preallocated)', lambda: feature_encoder.encode_records(records, out=out), N_ROWS)
+    columnar = timed('encode_columns', lambda: feature_encoder.encode_columns(columns), N_ROWS)
+
+    assert np.array_equal(legacy.astype(np.float32), batched)
+    assert np.array_equal(batched, columnar)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Latency of the compiled forest against RandomForestClassifier.predict_proba.
+
+Run from the repository root:
+    python -m benchmarks.bench_forest_engine
+"""
+import time
+
+import numpy as np
+
+import ml_model
+from forest_engine import CompiledForest
+
+BATCH_SIZES = (1, 8, 64, 1024)
+
+def random_patients(n_rows, seed=0):
+    """Generate encoded feature rows in realistic clinical ranges."""
+    rng = np.random.default_rng(seed)
+    X = rng.integers(0, 2, size=(n_rows, len(ml_model.FEATURE_NAMES))).astype(np.float64)
+    X[:, 0] = rng.integers(20, 85, n_rows)       # age
+    X[:, 2] = rng.integers(150, 195, n_rows)     # height
+    X[:, 3] = rng.integers(45, 120, n_rows)      # weight
+    X[:, 9] = rng.integers(95, 180, n_rows)      # systolic_bp
+    X[:, 10] = rng.integers(60, 110, n_rows)     # diastolic_bp
+    X[:, 11] = rng.integers(1, 4, n_rows)        # cholesterol
+    X[:, 12] = rng.integers(1, 4, n_rows)        # glucose
+    X[:, 13] = rng.integers(55, 100, n_rows)     # heart_rate
+    return X
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    if not hasattr(ml_model.model, 'classes_'):
+        ml_model.initialize_model()
+    forest = ml_model.model
+    compiled = CompiledForest.from_sklearn(forest)
+
+    print(f"{'batch':>6} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8} {'max abs diff':>13}")
+    for batch_size in BATCH_SIZES:
+        X = random_patients(batch_size, seed=batch_size)
+        expected = forest.predict_proba(X)
+        actual = compiled.predict_proba(X)
+        assert np.allclose(expected, actual, atol=1e-9), 'compiled forest diverged from sklearn'
+
+        repeat = 50 if batch_size < 1024 else 10
+        sklearn_time = best_of(lambda: forest.predict_proba(X), repeat)
+        compiled_time = best_of(lambda: compiled.predict_proba(X), repeat)
+        print(
+            f"{batch_size:>6} {sklearn_time * 1000:>12.3f} {compiled_time * 1000:>12.3f} "
+            f"{sklearn_time / compiled_time:>7.1f}x {np.abs(expected - actual).max():>13.2e}"
+        )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Cost of the metrics recorded for every request.
+
+Times Histogram.observe() and Counter.inc() on their own, from one thread
+and from SENDER_THREADS threads at once. Then times N_REQUESTS calls to
+GET /api/doctors through the test client, each in a fresh process, once
+with METRICS_ENABLED=0 and once with METRICS_ENABLED=1. The difference is
+what one request pays for its latency, status, SQL statement and SQL time
+metrics.
+
+Run from the repository root:
+    python -m benchmarks.bench_metrics
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import subprocess
+
+N_OBSERVATIONS = 1_000_000
+N_REQUESTS = 2000
+SENDER_THREADS = 4
+REPEATS = 3
+
+def time_requests():
+    # Runs in a child process with METRICS_ENABLED and DATABASE_URL already set
+    from app import app
+    client = app.test_client()
+    for _ in range(100):
+        client.get('/api/doctors')
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        for _ in range(N_REQUESTS):
+            client.get('/api/doctors')
+        best = min(best, time.perf_counter() - started)
+    print(best)
+
+def request_seconds(enabled, database_url):
+    # No outbox workers, whose polling would add noise to the timings
+    env = dict(os.environ, METRICS_ENABLED='1' if enabled else '0', DATABASE_URL=database_url,
+               EMAIL_OUTBOX_IN_PROCESS='0')
+    env.pop('METRICS_DIR', None)
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_metrics', '--requests'],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.split()[-1])
+
+def observe_seconds(threads):
+    from metrics import Counter, Histogram
+    histogram = Histogram('bench_seconds', 'Benchmark histogram', ('route', 'method'))
+    counter = Counter('bench_total', 'Benchmark counter', ('route', 'method', 'status'))
+    per_thread = N_OBSERVATIONS // threads
+
+    def record():
+        for i in range(per_thread):
+            histogram.observe((i % 100) / 1000, ('/api/doctors', 'GET'))
+            counter.inc(('/api/doctors', 'GET', '200'))
+
+    workers = [threading.Thread(target=record) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+    # Every value but the trailing sum is a bucket count
+    observed = sum(sum(values[:-1]) for values in histogram.collect().values())
+    assert observed == per_thread * threads, 'lost histogram observations'
+    assert counter.collect()[('/api/doctors', 'GET', '200')][0] == per_thread * threads, 'lost counter increments'
+    return seconds / (per_thread * threads)
+
+if __name__ == '__main__':
+    if '--requests' in sys.argv:
+        time_requests()
+        sys.exit(0)
+
+    for threads in (1, SENDER_THREADS):
+        seconds = observe_seconds(threads)
+        print(f"observe() + inc(), {threads} thread(s): {seconds * 1e9:>8,.0f} ns per pair")
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        off = request_seconds(False, database_url)
+        on = request_seconds(True, database_url)
+    print(f"GET /api/doctors, metrics off: {off / N_REQUESTS * 1e6:>8,.1f} us per request")
+    print(f"GET /api/doctors, metrics on:  {on / N_REQUESTS * 1e6:>8,.1f} us per request")
+    print(f"overhead: {(on - off) / N_REQUESTS * 1e6:,.1f} us per request ({(on / off - 1) * 100:+.1f}%)")
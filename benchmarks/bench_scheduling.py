@@ -0,0 +1,135 @@
+"""
+Slot availability queries against 1,000 doctors and 1M booked appointments.
+
+Builds a ScheduleIndex from synthetic data (about 70% of each doctor's
+slots booked), times free-slot and first-available queries, checks the
+heap-based first-available answer against a linear scan, and finally
+fires concurrent bookings of one slot at the API to show that exactly
+one succeeds.
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduling
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), 'bench_scheduling.db')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{DATABASE_PATH}")
+
+from app import app
+from scheduling import ScheduleIndex, format_time, slot_key
+
+N_DOCTORS = 1000
+N_APPOINTMENTS = 1_000_000
+N_QUERIES = 2000
+SPECIALIZATIONS = ['Cardiology', 'Interventional Cardiology', 'Electrophysiology', 'Cardiac Surgery', 'Vascular Medicine']
+HOURS = ['09:00 AM', '10:00 AM', '11:00 AM', '12:00 PM', '01:00 PM', '02:00 PM', '03:00 PM', '04:00 PM', '05:00 PM']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+def synthetic_data(start):
+    rng = random.Random(42)
+    doctors, bookings = [], []
+    per_doctor = N_APPOINTMENTS // N_DOCTORS
+    for doctor_id in range(1, N_DOCTORS + 1):
+        days = sorted(rng.sample(range(6), 5))
+        hours = sorted(rng.sample(range(len(HOURS)), 8))
+        doctors.append((doctor_id, rng.choice(SPECIALIZATIONS),
+                        ','.join(DAYS[d] for d in days), ','.join(HOURS[h] for h in hours)))
+
+        # Enumerate the doctor's slots forward from start and book ~70% of them
+        booked, day = 0, start
+        while booked < per_doctor:
+            if day.weekday() in days:
+                for h in hours:
+                    if booked < per_doctor and rng.random() < 0.7:
+                        bookings.append((doctor_id, day, HOURS[h]))
+                        booked += 1
+            day += timedelta(days=1)
+    return doctors, bookings
+
+def timed(label, n, fn):
+    started = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<42} {elapsed / n * 1e6:>10.1f} us/query")
+
+def bench_index():
+    start = date.today()
+    doctors, bookings = synthetic_data(start)
+    index = ScheduleIndex(horizon_days=365)
+
+    started = time.perf_counter()
+    index.load(doctors, bookings)
+    print(f"Loaded {len(doctors)} doctors and {len(bookings):,} bookings in {time.perf_counter() - started:.2f}s")
+
+    rng = random.Random(7)
+    now = slot_key(start, 0)
+    offsets = [rng.randint(0, 200) for _ in range(N_QUERIES)]
+    timed('free slots, one doctor, 14-day window', N_QUERIES, lambda i: index.free_slots(
+        rng.randint(1, N_DOCTORS), start + timedelta(days=offsets[i]), start + timedelta(days=offsets[i] + 13)
+    ))
+    timed('next free slot, one doctor', N_QUERIES, lambda i: index.next_free(rng.randint(1, N_DOCTORS), now))
+
+    # First query per specialization builds its heap; time the steady state
+    for specialization in SPECIALIZATIONS:
+        index.first_available(specialization, now)
+    timed('first available, per specialization', N_QUERIES,
+          lambda i: index.first_available(SPECIALIZATIONS[i % len(SPECIALIZATIONS)], now))
+
+    def book_first(i):
+        doctor_id, day, minutes = index.first_available(SPECIALIZATIONS[i % len(SPECIALIZATIONS)], now)
+        index.book(doctor_id, day, minutes)
+    timed('first available + book it', N_QUERIES, book_first)
+
+    # The heap answer must match a scan over every doctor in the specialization
+    by_specialization = {}
+    for doctor_id, specialization, _, _ in doctors:
+        by_specialization.setdefault(specialization.lower(), []).append(doctor_id)
+    for specialization in SPECIALIZATIONS:
+        doctor_id, day, minutes = index.first_available(specialization, now)
+        expected = min(index.next_free(d, now) for d in by_specialization[specialization.lower()]
+                       if index.next_free(d, now) is not None)
+        assert (day, minutes) == expected, (specialization, (day, minutes), expected)
+    print('first available matches a linear scan for every specialization')
+
+def bench_concurrent_booking(n_threads=32):
+    client = app.test_client()
+    client.post('/api/register', json={'email': 'patient@example.com', 'username': 'patient',
+                                       'password': 'x', 'fullName': 'Patient', 'role': 'user'})
+    client.post('/api/register', json={
+        'email': 'doctor@example.com', 'username': 'doctor', 'password': 'x', 'fullName': 'Doctor',
+        'role': 'doctor', 'doctor': {'specialization': 'Cardiology', 'experienceYears': 5,
+                                     'availableDays': DAYS, 'availableHours': HOURS}
+    })
+    day = date.today() + timedelta(days=1)
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    body = {'userId': 1, 'doctorId': 1, 'appointmentDate': day.isoformat(), 'appointmentTime': HOURS[0]}
+
+    barrier = threading.Barrier(n_threads)
+    statuses = []
+
+    def book():
+        worker_client = app.test_client()
+        barrier.wait()
+        statuses.append(worker_client.post('/api/appointments', json=body).status_code)
+
+    threads = [threading.Thread(target=book) for _ in range(n_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    created = statuses.count(201)
+    print(f"{n_threads} concurrent bookings of {day} {format_time(540)}: "
+          f"{created} created, {statuses.count(409)} rejected with 409")
+    assert created == 1, statuses
+
+if __name__ == '__main__':
+    bench_index()
+    bench_concurrent_booking()
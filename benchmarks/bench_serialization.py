@@ -0,0 +1,98 @@
+"""
+Serialization throughput of a 10k-row prediction history.
+
+Compares the ORM path (load Prediction instances, call to_dict(), encode
+with Flask's JSON provider) with the Core read path (plain row tuples,
+the compiled row serializer, then serializers.dumps(), which uses orjson
+when installed and the standard library otherwise). Both outputs are
+decoded and compared, and the script exits non-zero if they differ. The
+full endpoint, /api/users/<id>/predictions, is timed as well.
+
+Run from the repository root:
+    python -m benchmarks.bench_serialization
+"""
+import os
+import sys
+import json
+import time
+import random
+from datetime import datetime, timedelta
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from sqlalchemy import select
+
+from app import app, db
+from models import User, Prediction
+import serializers
+
+N_ROWS = 10_000
+REPEATS = 5
+
+def seed():
+    rng = random.Random(3)
+    db.session.add(User(email='history@example.com', username='history', password_hash='x', full_name='History'))
+    db.session.flush()
+    started = datetime(2025, 1, 1)
+    db.session.add_all(
+        Prediction(
+            user_id=1, age=rng.randint(25, 85), gender=rng.choice(('male', 'female')),
+            height=rng.uniform(150, 195), weight=rng.uniform(50, 110),
+            systolic_bp=rng.randint(100, 170), diastolic_bp=rng.randint(60, 100),
+            cholesterol=rng.randint(1, 3), glucose=rng.randint(1, 3), heart_rate=rng.randint(55, 100),
+            smoking=rng.random() < 0.2, alcohol=rng.random() < 0.3, physical_activity=rng.random() < 0.6,
+            chest_pain=rng.random() < 0.2, diabetes=rng.random() < 0.1, family_history=rng.random() < 0.3,
+            prediction_result=rng.random(), prediction_label=rng.random() < 0.4, model_version='bench',
+            created_at=started + timedelta(minutes=i)
+        )
+        for i in range(N_ROWS)
+    )
+    db.session.commit()
+
+def orm_path():
+    db.session.expunge_all()
+    predictions = db.session.execute(
+        select(Prediction).where(Prediction.user_id == 1).order_by(Prediction.created_at.desc(), Prediction.id.desc())
+    ).scalars()
+    return app.json.dumps([prediction.to_dict() for prediction in predictions]).encode()
+
+def core_path():
+    rows = db.session.execute(
+        Prediction.list_statement(Prediction.user_id == 1)
+        .order_by(Prediction.created_at.desc(), Prediction.id.desc())
+    )
+    return serializers.dumps(list(Prediction.serialize_rows(rows)))
+
+def timed(label, fn):
+    fn()
+    best = float('inf')
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<44} {best * 1000:>8.1f} ms  {N_ROWS / best:>10,.0f} rows/s")
+    return body, best
+
+if __name__ == '__main__':
+    with app.app_context():
+        seed()
+        print(f"{N_ROWS:,} predictions, best of {REPEATS}; JSON encoder: "
+              f"{'orjson' if serializers.orjson is not None else 'json (stdlib)'}")
+        orm_body, orm_seconds = timed('ORM instances + to_dict + jsonify', orm_path)
+        core_body, core_seconds = timed('Core rows + compiled serializer + dumps', core_path)
+
+        encoder = serializers.orjson
+        serializers.orjson = None
+        stdlib_body, _ = timed('Core rows + compiled serializer + stdlib json', core_path)
+        serializers.orjson = encoder
+
+        client = app.test_client()
+        endpoint_body, _ = timed('GET /api/users/1/predictions', lambda: client.get('/api/users/1/predictions').data)
+        print(f"speed-up: {orm_seconds / core_seconds:.1f}x")
+
+        expected = json.loads(orm_body)
+        for label, body in (('core', core_body), ('stdlib', stdlib_body), ('endpoint', endpoint_body)):
+            if json.loads(body) != expected:
+                print(f"{label} output differs from to_dict()")
+                sys.exit(1)
+        print('Core output matches to_dict() for every row')
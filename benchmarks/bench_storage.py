@@ -0,0 +1,114 @@
+"""
+Prediction write throughput under concurrent writers, per storage profile.
+
+Each writer is a separate process, like a gunicorn worker, that imports the
+app with the chosen STORAGE_PROFILE and commits predictions through the ORM
+(so the analytics rollup upsert runs too) for a fixed time. Writers start
+together once all of them have loaded the app. The script reports
+committed predictions per second and the number of failed commits
+("database is locked") for 1, 4 and 16 writers under each profile.
+
+SQLite runs against a fresh database file per profile, because WAL mode
+persists in the file. Set BENCH_POSTGRES_URL to also run against
+PostgreSQL.
+
+Run from the repository root:
+    python -m benchmarks.bench_storage
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import subprocess
+
+WRITER_COUNTS = (1, 4, 16)
+DURATION_SECONDS = float(os.environ.get('BENCH_DURATION', 5))
+PROFILES = ('baseline', 'tuned')
+
+def writer(duration):
+    from sqlalchemy.exc import OperationalError
+
+    from app import app, db
+    from models import User, Prediction
+
+    rng = random.Random(os.getpid())
+    with app.app_context():
+        user_id = db.session.execute(db.select(User.id).limit(1)).scalar()
+        print('ready', flush=True)
+        sys.stdin.readline()
+
+        committed = failed = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            db.session.add(Prediction(
+                user_id=user_id, age=rng.randint(25, 85), gender=rng.choice(('male', 'female')),
+                height=rng.uniform(150, 195), weight=rng.uniform(50, 110),
+                systolic_bp=rng.randint(100, 170), diastolic_bp=rng.randint(60, 100),
+                cholesterol=rng.randint(1, 3), glucose=rng.randint(1, 3),
+                smoking=rng.random() < 0.2, alcohol=rng.random() < 0.3, physical_activity=rng.random() < 0.6,
+                prediction_result=rng.random(), prediction_label=False
+            ))
+            try:
+                db.session.commit()
+                committed += 1
+            except OperationalError:
+                db.session.rollback()
+                failed += 1
+    print(json.dumps({'committed': committed, 'failed': failed}), flush=True)
+
+def prepare(database_url, profile):
+    """Create the schema and one patient with the app itself."""
+    env = dict(os.environ, DATABASE_URL=database_url, STORAGE_PROFILE=profile)
+    code = (
+        "from app import app, db\n"
+        "from models import User\n"
+        "with app.app_context():\n"
+        "    if not db.session.execute(db.select(User.id).limit(1)).scalar():\n"
+        "        db.session.add(User(email='bench@example.com', username='bench', password_hash='x',"
+        " full_name='Bench'))\n"
+        "        db.session.commit()\n"
+    )
+    subprocess.run([sys.executable, '-c', code], env=env, check=True, stderr=subprocess.DEVNULL)
+
+def run(database_url, profile, n_writers):
+    env = dict(os.environ, DATABASE_URL=database_url, STORAGE_PROFILE=profile)
+    writers = [
+        subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_storage', '--writer', str(DURATION_SECONDS)],
+            env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        for _ in range(n_writers)
+    ]
+    for process in writers:
+        assert process.stdout.readline().strip() == 'ready'
+    started = time.perf_counter()
+    for process in writers:
+        process.stdin.write('go\n')
+        process.stdin.flush()
+    results = [json.loads(process.communicate()[0].strip().splitlines()[-1]) for process in writers]
+    elapsed = time.perf_counter() - started
+    committed = sum(result['committed'] for result in results)
+    failed = sum(result['failed'] for result in results)
+    return committed / elapsed, failed
+
+def bench(label, database_url_for):
+    print(f"\n{label}")
+    print(f"{'profile':<10} {'writers':>7} {'predictions/s':>14} {'failed commits':>15}")
+    for profile in PROFILES:
+        database_url = database_url_for(profile)
+        prepare(database_url, profile)
+        for n_writers in WRITER_COUNTS:
+            rate, failed = run(database_url, profile, n_writers)
+            print(f"{profile:<10} {n_writers:>7} {rate:>14.0f} {failed:>15}")
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3 and sys.argv[1] == '--writer':
+        writer(float(sys.argv[2]))
+        sys.exit(0)
+
+    directory = tempfile.mkdtemp()
+    bench('SQLite', lambda profile: f"sqlite:///{os.path.join(directory, profile + '.db')}")
+    if os.environ.get('BENCH_POSTGRES_URL'):
+        bench('PostgreSQL', lambda profile: os.environ['BENCH_POSTGRES_URL'])
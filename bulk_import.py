@@ -0,0 +1,435 @@
+"""
+Bulk import of users, doctors and appointments from CSV or NDJSON.
+
+Records are read in chunks. Emails and usernames are deduplicated in
+memory against one prefetch of the existing values, passwords are hashed
+on a process pool, and each chunk is written in one transaction with
+multi-row INSERT statements (COPY on PostgreSQL). If a chunk trips a
+constraint, typically a row registered through the API since the
+prefetch, it is retried one row per transaction so that exactly the
+offending rows are reported.
+
+Column names follow the models (full_name, experience_years, ...); the
+camelCase names used by the registration API are accepted too.
+Appointments reference patients and doctors either by id (user_id,
+doctor_id) or by email (patient_email, doctor_email).
+"""
+import io
+import os
+import csv
+import json
+import time
+import logging
+from datetime import date, datetime
+from itertools import islice
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from app import db
+from models import User, Doctor, Appointment
+import analytics
+from scheduling import schedule, parse_time, format_time
+from directory_cache import doctor_directory
+
+IMPORT_KINDS = ('users', 'doctors', 'appointments')
+DEFAULT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 5000))
+IMPORT_WORKERS = int(os.environ.get('IMPORT_WORKERS', 0)) or os.cpu_count() or 1
+# The HTTP endpoint is disabled unless a token is configured
+IMPORT_API_TOKEN = os.environ.get('IMPORT_API_TOKEN')
+
+# Bound parameters per INSERT; stays under SQLite's default limit of 32766
+MAX_BIND_PARAMETERS = 30000
+# Values per IN (...) lookup
+LOOKUP_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+# One validated input row, ready to write
+ImportRow = namedtuple('ImportRow', ['row_number', 'values', 'doctor_values', 'password'])
+
+class ImportReport:
+    """Counts and per-row errors of one import run."""
+
+    def __init__(self, kind, max_errors=MAX_REPORTED_ERRORS):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def fail(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'elapsed_seconds': round(time.perf_counter() - self.started, 3),
+        }
+
+def read_csv_records(f):
+    """Yield (row_number, record, error) from a CSV file; empty cells become None."""
+    for row_number, row in enumerate(csv.DictReader(f), start=1):
+        yield row_number, {key: (value if value != '' else None) for key, value in row.items()}, None
+
+def read_ndjson_records(f):
+    """Yield (row_number, record, error) from an NDJSON file, one object per line."""
+    for row_number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(record, dict):
+            yield row_number, None, 'Each line must be a JSON object'
+            continue
+        yield row_number, record, None
+
+def _field(record, *names, required=False):
+    for name in names:
+        value = record.get(name)
+        if value is not None:
+            return value.strip() if isinstance(value, str) else value
+    if required:
+        raise ValueError(f"Missing field: {names[0]}")
+    return None
+
+def _optional_int(value):
+    return int(value) if value is not None else None
+
+def _joined_list(value):
+    # NDJSON gives lists; CSV cells use ';' or ',' between items
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        value = value.replace(';', ',').split(',')
+    return ','.join(item.strip() for item in value if item and item.strip())
+
+def _in_batches(values):
+    values = list(values)
+    for start in range(0, len(values), LOOKUP_BATCH_SIZE):
+        yield values[start:start + LOOKUP_BATCH_SIZE]
+
+class BulkImporter:
+    """Imports one kind of record; see the module docstring for the pipeline."""
+
+    def __init__(self, kind, chunk_size=DEFAULT_CHUNK_SIZE, workers=IMPORT_WORKERS):
+        if kind not in IMPORT_KINDS:
+            raise ValueError(f"Unknown import kind '{kind}'; choose from {', '.join(IMPORT_KINDS)}")
+        self.kind = kind
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.report = ImportReport(kind)
+        self._pool = None
+        self._emails = set()
+        self._usernames = set()
+        self._doctor_ids = set()
+        self._booked_slots = set()
+
+    def run(self, records):
+        """
+        Import (row_number, record, error) tuples.
+
+        Returns:
+            dict: The import report
+        """
+        self._prefetch()
+        records = iter(records)
+        try:
+            while True:
+                chunk = list(islice(records, self.chunk_size))
+                if not chunk:
+                    break
+                self.report.rows += len(chunk)
+                self._import_chunk(chunk)
+                logging.info(
+                    f"Imported {self.report.inserted} {self.kind} "
+                    f"({self.report.failed} failed) after {self.report.rows} rows"
+                )
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown()
+        return self.report.to_dict()
+
+    def _prefetch(self):
+        if self.kind in ('users', 'doctors'):
+            # The only pass over existing identities; later chunks check these sets
+            for email, username in db.session.execute(
+                select(User.email, User.username).execution_options(yield_per=10000)
+            ):
+                self._emails.add(email)
+                self._usernames.add(username)
+        else:
+            self._doctor_ids = set(db.session.execute(select(Doctor.id)).scalars())
+        db.session.rollback()
+
+    def _hash_passwords(self, passwords):
+        if not passwords:
+            return []
+        if self.workers <= 1 or len(passwords) < 4:
+            return [generate_password_hash(password) for password in passwords]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        return list(self._pool.map(generate_password_hash, passwords, chunksize=chunksize))
+
+    def _import_chunk(self, chunk):
+        prepare = self._prepare_appointment if self.kind == 'appointments' else self._prepare_user
+        context = self._appointment_context(chunk) if self.kind == 'appointments' else None
+        prepared = []
+        for row_number, record, error in chunk:
+            if error:
+                self.report.fail(row_number, error)
+                continue
+            try:
+                row = prepare(row_number, record, context)
+            except (KeyError, TypeError, ValueError) as e:
+                self.report.fail(row_number, str(e))
+                continue
+            if row is not None:
+                prepared.append(row)
+        if not prepared:
+            return
+
+        if self.kind != 'appointments':
+            hashes = iter(self._hash_passwords([row.password for row in prepared if row.password is not None]))
+            for row in prepared:
+                if row.password is not None:
+                    row.values['password_hash'] = next(hashes)
+
+        try:
+            with db.engine.begin() as connection:
+                self._write(connection, prepared)
+            self.report.inserted += len(prepared)
+        except IntegrityError:
+            # Something changed since the prefetch; retry row by row to find the conflicting rows
+            for row in prepared:
+                try:
+                    with db.engine.begin() as connection:
+                        self._write(connection, [row])
+                    self.report.inserted += 1
+                except IntegrityError as e:
+                    self.report.fail(row.row_number, f"Conflicts with an existing record: {str(e.orig)}")
+
+        if self.kind == 'doctors':
+            doctor_directory.invalidate()
+        if self.kind in ('doctors', 'appointments'):
+            schedule.invalidate()
+
+    def _prepare_user(self, row_number, record, context):
+        email = _field(record, 'email', required=True)
+        username = _field(record, 'username', required=True)
+        if email in self._emails:
+            raise ValueError('Email already registered')
+        if username in self._usernames:
+            raise ValueError('Username already taken')
+
+        password = _field(record, 'password')
+        password_hash = _field(record, 'password_hash', 'passwordHash')
+        if password is None and password_hash is None:
+            raise ValueError('Missing field: password')
+
+        values = {
+            'email': email,
+            'username': username,
+            'password_hash': password_hash,
+            'full_name': _field(record, 'full_name', 'fullName', required=True),
+            'age': _optional_int(_field(record, 'age')),
+            'gender': _field(record, 'gender'),
+            'role': 'doctor' if self.kind == 'doctors' else (_field(record, 'role') or 'user'),
+            'created_at': datetime.utcnow(),
+        }
+        doctor_values = None
+        if self.kind == 'doctors':
+            doctor_values = {
+                'specialization': _field(record, 'specialization', required=True),
+                'experience_years': int(_field(record, 'experience_years', 'experienceYears', required=True)),
+                'bio': _field(record, 'bio') or '',
+                'available_days': _joined_list(_field(record, 'available_days', 'availableDays')),
+                'available_hours': _joined_list(_field(record, 'available_hours', 'availableHours')),
+            }
+
+        # Claimed only once the row is valid, so a rejected row does not block a later one
+        self._emails.add(email)
+        self._usernames.add(username)
+        return ImportRow(row_number, values, doctor_values, password if password_hash is None else None)
+
+    def _appointment_context(self, chunk):
+        """Resolve every patient and doctor email referenced by the chunk with batched lookups."""
+        patient_emails, doctor_emails, user_ids = set(), set(), set()
+        for _, record, error in chunk:
+            if error:
+                continue
+            if _field(record, 'patient_email', 'patientEmail'):
+                patient_emails.add(_field(record, 'patient_email', 'patientEmail'))
+            if _field(record, 'doctor_email', 'doctorEmail'):
+                doctor_emails.add(_field(record, 'doctor_email', 'doctorEmail'))
+            if _field(record, 'user_id', 'userId') is not None:
+                try:
+                    user_ids.add(int(_field(record, 'user_id', 'userId')))
+                except (TypeError, ValueError):
+                    pass
+
+        context = {'patients': {}, 'doctors': {}, 'user_ids': set()}
+        for batch in _in_batches(patient_emails):
+            context['patients'].update(db.session.execute(
+                select(User.email, User.id).where(User.email.in_(batch))
+            ).all())
+        for batch in _in_batches(doctor_emails):
+            context['doctors'].update(db.session.execute(
+                select(User.email, Doctor.id).join(Doctor, Doctor.user_id == User.id).where(User.email.in_(batch))
+            ).all())
+        for batch in _in_batches(user_ids):
+            context['user_ids'].update(db.session.execute(select(User.id).where(User.id.in_(batch))).scalars())
+        db.session.rollback()
+        return context
+
+    def _prepare_appointment(self, row_number, record, context):
+        patient_email = _field(record, 'patient_email', 'patientEmail')
+        if patient_email is not None:
+            if patient_email not in context['patients']:
+                raise ValueError(f"Unknown patient {patient_email}")
+            user_id = context['patients'][patient_email]
+        else:
+            user_id = int(_field(record, 'user_id', 'userId', required=True))
+            if user_id not in context['user_ids']:
+                raise ValueError(f"Unknown user {user_id}")
+
+        doctor_email = _field(record, 'doctor_email', 'doctorEmail')
+        if doctor_email is not None:
+            if doctor_email not in context['doctors']:
+                raise ValueError(f"Unknown doctor {doctor_email}")
+            doctor_id = context['doctors'][doctor_email]
+        else:
+            doctor_id = int(_field(record, 'doctor_id', 'doctorId', required=True))
+            if doctor_id not in self._doctor_ids:
+                raise ValueError(f"Unknown doctor {doctor_id}")
+
+        appointment_date = _field(record, 'appointment_date', 'appointmentDate', required=True)
+        if not isinstance(appointment_date, date):
+            appointment_date = date.fromisoformat(appointment_date)
+        appointment_time = format_time(parse_time(_field(record, 'appointment_time', 'appointmentTime', required=True)))
+        status = _field(record, 'status') or 'pending'
+
+        if status != 'cancelled':
+            slot = (doctor_id, appointment_date, appointment_time)
+            if slot in self._booked_slots:
+                raise ValueError('That time slot is already booked earlier in this import')
+            self._booked_slots.add(slot)
+
+        values = {
+            'user_id': user_id,
+            'doctor_id': doctor_id,
+            'appointment_date': appointment_date,
+            'appointment_time': appointment_time,
+            'reason': _field(record, 'reason') or '',
+            'status': status,
+            'notes': _field(record, 'notes') or '',
+            'payment_status': _field(record, 'payment_status', 'paymentStatus') or 'not_applicable',
+            'payment_method': _field(record, 'payment_method', 'paymentMethod'),
+            'payment_amount': float(_field(record, 'payment_amount', 'paymentAmount') or 0.0),
+            'payment_date': None,
+            'created_at': datetime.utcnow(),
+        }
+        return ImportRow(row_number, values, None, None)
+
+    def _write(self, connection, rows):
+        if self.kind == 'appointments':
+            insert_rows(connection, Appointment.__table__, [row.values for row in rows])
+            # Core inserts bypass the ORM flush hook, so roll these rows up explicitly
+            analytics.apply_appointment_deltas(connection, analytics.count_appointments(
+                (row.values['appointment_date'], row.values['doctor_id'], row.values['status']) for row in rows
+            ))
+            return
+
+        insert_rows(connection, User.__table__, [row.values for row in rows])
+        if self.kind == 'doctors':
+            emails = [row.values['email'] for row in rows]
+            user_ids = {}
+            for batch in _in_batches(emails):
+                user_ids.update(connection.execute(select(User.email, User.id).where(User.email.in_(batch))).all())
+            insert_rows(connection, Doctor.__table__, [
+                dict(row.doctor_values, user_id=user_ids[row.values['email']]) for row in rows
+            ])
+
+def _copy_rows(connection, table, rows):
+    """COPY rows into a PostgreSQL table through the raw psycopg connection."""
+    columns = list(rows[0])
+    preparer = connection.dialect.identifier_preparer
+    statement = (
+        f"COPY {preparer.format_table(table)} ({', '.join(preparer.quote(c) for c in columns)}) "
+        f"FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            '\\N' if row[c] is None else row[c].isoformat() if hasattr(row[c], 'isoformat') else row[c]
+            for c in columns
+        ])
+    buffer.seek(0)
+
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        if connection.dialect.driver == 'psycopg2':
+            cursor.copy_expert(statement, buffer)
+        else:
+            with cursor.copy(statement) as copy:
+                copy.write(buffer.getvalue())
+    finally:
+        cursor.close()
+
+def insert_rows(connection, table, rows):
+    """
+    Insert dicts sharing the same keys with as few statements as possible.
+
+    PostgreSQL via psycopg uses COPY; other databases get multi-row
+    INSERT ... VALUES statements sized to the bound-parameter limit.
+    """
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql' and connection.dialect.driver in ('psycopg2', 'psycopg'):
+        _copy_rows(connection, table, rows)
+        return
+    rows_per_statement = max(1, MAX_BIND_PARAMETERS // len(rows[0]))
+    for start in range(0, len(rows), rows_per_statement):
+        connection.execute(insert(table).values(rows[start:start + rows_per_statement]))
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    if explicit:
+        return explicit
+    if content_type and 'json' in content_type:
+        return 'ndjson'
+    if filename and filename.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+def import_records(kind, f, input_format='csv', chunk_size=DEFAULT_CHUNK_SIZE, workers=IMPORT_WORKERS):
+    """
+    Import a CSV or NDJSON text stream of the given kind.
+
+    Args:
+        kind (str): 'users', 'doctors' or 'appointments'
+        f: Text file object
+        input_format (str): 'csv' or 'ndjson'
+
+    Returns:
+        dict: Rows read, inserted and failed, with per-row errors
+    """
+    if input_format not in ('csv', 'ndjson'):
+        raise ValueError(f"Unknown import format '{input_format}'")
+    records = read_ndjson_records(f) if input_format == 'ndjson' else read_csv_records(f)
+    return BulkImporter(kind, chunk_size, workers).run(records)
@@ -0,0 +1,258 @@
+"""
+Offline bulk scoring of patient extracts against a published model.
+
+Streams CSV or NDJSON input in fixed-size chunks, scores the chunks on a
+process pool (each worker memory-maps the model once) and streams results
+to the output file in input order. Progress is checkpointed after every
+chunk so an interrupted run resumes where it stopped.
+
+Usage:
+    python bulk_score.py extract.csv scores.csv --chunk-size 50000 --workers 8
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import logging
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import model_registry
+from forest_engine import CompiledForest
+from feature_encoder import feature_encoder, parse_text_columns
+
+# Per-worker model, loaded once by the pool initializer
+_worker_forest = None
+
+def _init_worker(version, registry_dir):
+    global _worker_forest
+    manifest, arrays = model_registry.load_arrays(version, registry_dir)
+    if set(CompiledForest.ARRAY_NAMES) <= set(arrays):
+        _worker_forest = CompiledForest.from_arrays(arrays)
+    else:
+        model, _, _ = model_registry.load_model(version, registry_dir)
+        _worker_forest = CompiledForest.from_sklearn(model)
+
+def _score_chunk(columns, n_rows):
+    """Encode and score one chunk; returns (probabilities, errors) with NaN for failed rows."""
+    errors = {}
+    try:
+        features_matrix = feature_encoder.encode_columns(columns, n_rows)
+    except (TypeError, ValueError):
+        # Some row is malformed: encode row by row to report exactly which
+        features_matrix = feature_encoder.empty(n_rows)
+        valid = np.ones(n_rows, dtype=bool)
+        names = list(columns)
+        for index in range(n_rows):
+            try:
+                features_matrix[index] = feature_encoder.encode_row({name: columns[name][index] for name in names})
+            except (TypeError, ValueError) as e:
+                errors[index] = str(e)
+                valid[index] = False
+
+    probabilities = np.full(n_rows, np.nan)
+    if not errors:
+        probabilities[:] = _worker_forest.predict_proba(features_matrix)[:, -1]
+    elif valid.any():
+        probabilities[valid] = _worker_forest.predict_proba(features_matrix[valid])[:, -1]
+    return probabilities, errors
+
+def read_csv_chunks(f, chunk_size, id_column=None):
+    reader = csv.reader(f)
+    header = next(reader)
+    positions = {name: header.index(name) for name in feature_encoder.feature_names if name in header}
+    id_position = header.index(id_column) if id_column and id_column in header else None
+
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            return
+        columns = parse_text_columns({name: [row[i] for row in rows] for name, i in positions.items()})
+        ids = [row[id_position] for row in rows] if id_position is not None else None
+        yield len(rows), ids, columns
+
+def read_ndjson_chunks(f, chunk_size, id_column=None):
+    lines = (line for line in f if line.strip())
+    while True:
+        records = [json.loads(line) for line in islice(lines, chunk_size)]
+        if not records:
+            return
+        columns = {name: [record.get(name) for record in records] for name in feature_encoder.feature_names}
+        ids = [record.get(id_column) for record in records] if id_column else None
+        yield len(records), ids, columns
+
+class ResultWriter:
+    """Appends scored rows as CSV or NDJSON and reports the file offset for checkpoints."""
+
+    FIELDS = ['row', 'id', 'prediction_result', 'prediction_label', 'error']
+
+    def __init__(self, path, output_format, resume_offset=None):
+        self.output_format = output_format
+        if resume_offset is not None:
+            self.file = open(path, 'r+', newline='')
+            self.file.truncate(resume_offset)
+            self.file.seek(resume_offset)
+        else:
+            self.file = open(path, 'w', newline='')
+            if output_format == 'csv':
+                csv.writer(self.file).writerow(self.FIELDS)
+        self.csv_writer = csv.writer(self.file) if output_format == 'csv' else None
+
+    def write_chunk(self, first_row, ids, probabilities, errors):
+        labels = probabilities >= 0.5
+        for index, probability in enumerate(probabilities.tolist()):
+            error = errors.get(index)
+            values = [
+                first_row + index,
+                ids[index] if ids is not None else None,
+                None if error else probability,
+                None if error else bool(labels[index]),
+                error
+            ]
+            if self.csv_writer is not None:
+                self.csv_writer.writerow(['' if v is None else v for v in values])
+            else:
+                self.file.write(json.dumps(dict(zip(self.FIELDS, values))) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+def _detect_format(path, explicit):
+    if explicit:
+        return explicit
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+def _write_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def score_file(input_path, output_path, chunk_size=50000, workers=None, id_column=None,
+               model_version=None, registry_dir=None, checkpoint_path=None, restart=False,
+               input_format=None, output_format=None):
+    """
+    Score every row of input_path into output_path.
+
+    Returns:
+        dict: Final checkpoint state (rows scored, elapsed seconds, model version)
+    """
+    input_format = _detect_format(input_path, input_format)
+    output_format = _detect_format(output_path, output_format)
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    workers = workers or os.cpu_count() or 1
+
+    # Pin the version up front so every chunk uses the same model
+    model_version = model_version or model_registry.get_current_version(registry_dir)
+    if not model_version:
+        raise model_registry.ModelNotFoundError('No model has been published; run flask train-model')
+
+    state = None
+    if not restart and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            state = json.load(f)
+        if state['model_version'] != model_version:
+            raise ValueError(
+                f"Checkpoint was written with model {state['model_version']}, not {model_version}; "
+                f"use --restart to score from scratch"
+            )
+        # Resume with the original chunking so skipped chunks line up with the output
+        chunk_size = state['chunk_size']
+        logging.info(f"Resuming after row {state['rows_done']}")
+    else:
+        state = {'input': os.path.abspath(input_path), 'model_version': model_version,
+                 'chunk_size': chunk_size, 'rows_done': 0, 'output_bytes': None}
+
+    read_chunks = read_ndjson_chunks if input_format == 'ndjson' else read_csv_chunks
+    writer = ResultWriter(output_path, output_format, state['output_bytes'] if state['rows_done'] else None)
+    started = time.perf_counter()
+    rows_this_run = 0
+
+    with open(input_path, newline='') as f, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(model_version, registry_dir)
+    ) as pool:
+        chunks = read_chunks(f, chunk_size, id_column)
+        if state['rows_done']:
+            # Skip the chunks already scored
+            skipped = 0
+            while skipped < state['rows_done']:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise ValueError(
+                        f"Checkpoint {checkpoint_path} is at row {state['rows_done']}, but {input_path} "
+                        f"has only {skipped} rows; use --restart to score from scratch"
+                    )
+                skipped += chunk[0]
+
+        pending = deque()
+
+        def drain_one():
+            nonlocal rows_this_run
+            n_rows, ids, future = pending.popleft()
+            probabilities, errors = future.result()
+            state['output_bytes'] = writer.write_chunk(state['rows_done'], ids, probabilities, errors)
+            state['rows_done'] += n_rows
+            _write_checkpoint(checkpoint_path, state)
+
+            rows_this_run += n_rows
+            elapsed = time.perf_counter() - started
+            logging.info(
+                f"Scored {state['rows_done']} rows ({rows_this_run / elapsed:,.0f} rows/s, "
+                f"{len(errors)} errors in last chunk)"
+            )
+
+        # Keep a bounded number of chunks in flight so memory stays flat
+        for n_rows, ids, columns in chunks:
+            pending.append((n_rows, ids, pool.submit(_score_chunk, columns, n_rows)))
+            if len(pending) >= workers * 2:
+                drain_one()
+        while pending:
+            drain_one()
+
+    writer.close()
+    state['elapsed_seconds'] = time.perf_counter() - started
+    state['completed'] = True
+    _write_checkpoint(checkpoint_path, state)
+    return state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV or NDJSON patient extract in bulk.')
+    parser.add_argument('input', help='CSV or NDJSON file with one patient per row')
+    parser.add_argument('output', help='Destination CSV or NDJSON file')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Rows per scoring chunk')
+    parser.add_argument('--workers', type=int, default=None, help='Scoring processes (default: CPU count)')
+    parser.add_argument('--id-column', default=None, help='Input column copied to the output as id')
+    parser.add_argument('--model-version', default=None, help='Registry version (default: CURRENT)')
+    parser.add_argument('--registry-dir', default=None, help='Model registry directory')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: OUTPUT.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='Ignore any checkpoint and start over')
+    parser.add_argument('--input-format', choices=['csv', 'ndjson'], default=None)
+    parser.add_argument('--output-format', choices=['csv', 'ndjson'], default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    state = score_file(
+        args.input, args.output,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        id_column=args.id_column,
+        model_version=args.model_version,
+        registry_dir=args.registry_dir,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        input_format=args.input_format,
+        output_format=args.output_format
+    )
+    logging.info(f"Done: {state['rows_done']} rows with model {state['model_version']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
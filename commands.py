@@ -0,0 +1,242 @@
+import click
+from app import app, db
+import ml_model
+import model_registry
+
+# Flask CLI commands, run with `flask <command>`
+
+@app.cli.command('train-model')
+@click.option('--csv', 'csv_path', default=None, help='Labelled CSV to train on')
+@click.option('--label-column', default='cardio', show_default=True, help='CSV column holding the 0/1 label')
+@click.option('--from-predictions', is_flag=True, help='Train on the stored prediction table')
+@click.option('--chunk-size', default=100000, show_default=True, help='Rows loaded per chunk')
+@click.option('--n-jobs', default=-1, show_default=True, help='Parallel jobs used to fit the trees')
+def train_model_command(csv_path, label_column, from_predictions, chunk_size, n_jobs):
+    """Train the cardiovascular model and publish it to the registry."""
+    import training
+    if csv_path:
+        manifest = training.train_from_csv(csv_path, label_column, chunk_size, n_jobs)
+    elif from_predictions:
+        manifest = training.train_from_predictions(chunk_size, n_jobs)
+    else:
+        manifest = ml_model.train_and_publish()
+    if not manifest:
+        raise click.ClickException('Model training failed')
+    click.echo(f"Published model version {manifest['version']} (sha256 {manifest['sha256'][:12]})")
+    if 'fit_seconds' in manifest:
+        click.echo(
+            f"Fitted {manifest['n_samples']} rows in {manifest['fit_seconds']}s, "
+            f"peak RSS {manifest['peak_rss_mb']} MB"
+        )
+
+@app.cli.command('list-models')
+def list_models_command():
+    """List published model versions."""
+    current = model_registry.get_current_version()
+    for version in model_registry.list_versions():
+        marker = '*' if version == current else ' '
+        click.echo(f"{marker} {version}")
+
+@app.cli.command('use-model')
+@click.argument('version')
+def use_model_command(version):
+    """Point the registry at an already published model version."""
+    model_registry.set_current_version(version)
+    click.echo(f"Current model version is now {version}")
+
+@app.cli.command('rescore-predictions')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per keyset page')
+@click.option('--sleep', 'sleep_seconds', default=0.0, show_default=True, help='Seconds to pause between pages')
+@click.option('--max-rate', default=None, type=float, help='Maximum rows per second')
+@click.option('--start-after', default=None, type=int, help='Resume after this prediction id')
+@click.option('--checkpoint', default='rescore.checkpoint', show_default=True, help='Checkpoint file')
+@click.option('--all', 'include_current', is_flag=True, help='Also re-score rows already on the current model')
+@click.option('--limit', default=None, type=int, help='Stop after this many rows')
+def rescore_predictions_command(batch_size, sleep_seconds, max_rate, start_after, checkpoint, include_current, limit):
+    """Re-score stored predictions with the current model version."""
+    from rescoring import rescore_predictions
+    result = rescore_predictions(
+        batch_size=batch_size,
+        sleep_seconds=sleep_seconds,
+        max_rows_per_second=max_rate,
+        start_after_id=start_after,
+        checkpoint_path=checkpoint,
+        include_current=include_current,
+        limit=limit
+    )
+    click.echo(
+        f"Re-scored {result['updated']} predictions with model {result['model_version']} "
+        f"in {result['elapsed_seconds']:.1f}s (last id {result['last_id']})"
+    )
+
+@app.cli.command('db-upgrade')
+@click.option('--target', default=None, type=int, help='Stop at this migration version')
+def db_upgrade_command(target):
+    """Apply pending schema migrations."""
+    import migrations
+    applied = migrations.upgrade(target=target)
+    click.echo(f"Applied migrations: {', '.join(map(str, applied))}" if applied else 'Schema is up to date')
+
+@app.cli.command('db-version')
+def db_version_command():
+    """Show the applied schema version and any pending migrations."""
+    import migrations
+    with db.engine.begin() as connection:
+        version = migrations.current_version(connection)
+    click.echo(f"Schema version {version}")
+    for step_version, name, _ in migrations.MIGRATIONS:
+        if step_version > version:
+            click.echo(f"  pending: {step_version} {name}")
+
+@app.cli.command('check-indexes')
+@click.option('--verbose', is_flag=True, help='Print the full query plans')
+def check_indexes_command(verbose):
+    """EXPLAIN the list endpoint queries and fail unless each uses its index."""
+    import migrations
+    failed = False
+    for label, index_name, uses_index, plan in migrations.explain_list_queries():
+        click.echo(f"{'ok  ' if uses_index else 'FAIL'} {label} ({index_name})")
+        if verbose or not uses_index:
+            for line in plan:
+                click.echo(f"       {line}")
+        failed = failed or not uses_index
+    if failed:
+        raise click.ClickException('Some list queries do not use their index; run flask db-upgrade')
+
+@app.cli.command('rebuild-analytics')
+def rebuild_analytics_command():
+    """Recompute the prediction and appointment rollup tables from scratch."""
+    import analytics
+    with db.engine.begin() as connection:
+        counts = analytics.rebuild(connection)
+    for table, rows in counts.items():
+        click.echo(f"{table}: {rows} rows")
+
+@app.cli.command('check-analytics')
+def check_analytics_command():
+    """Compare the incrementally maintained rollups with a fresh recomputation."""
+    import analytics
+    with db.engine.connect() as connection:
+        mismatches = analytics.check(connection)
+    failed = False
+    for table, rows in mismatches.items():
+        click.echo(f"{'ok  ' if not rows else 'FAIL'} {table}")
+        for key, stored, expected in rows[:20]:
+            click.echo(f"       {key}: stored {stored}, recomputed {expected}")
+        failed = failed or bool(rows)
+    if failed:
+        raise click.ClickException('Rollups have drifted; run flask rebuild-analytics')
+
+@app.cli.command('import-records')
+@click.argument('kind', type=click.Choice(['users', 'doctors', 'appointments']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'ndjson']), default=None,
+              help='Input format; guessed from the file extension by default')
+@click.option('--chunk-size', default=None, type=int, help='Rows written per transaction')
+@click.option('--workers', default=None, type=int, help='Password hashing processes')
+def import_records_command(kind, path, input_format, chunk_size, workers):
+    """Bulk import users, doctors or appointments from a CSV or NDJSON file."""
+    import bulk_import
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        report = bulk_import.import_records(
+            kind, f, bulk_import.detect_format(path, explicit=input_format),
+            chunk_size=chunk_size or bulk_import.DEFAULT_CHUNK_SIZE,
+            workers=workers or bulk_import.IMPORT_WORKERS
+        )
+    click.echo(
+        f"Read {report['rows']} rows: {report['inserted']} inserted, {report['failed']} failed "
+        f"in {report['elapsed_seconds']:.1f}s"
+    )
+    for error in report['errors'][:50]:
+        click.echo(f"  row {error['row']}: {error['error']}")
+    if report['failed'] > 50:
+        click.echo(f"  ... and {report['failed'] - 50} more")
+
+@app.cli.command('storage-info')
+def storage_info_command():
+    """Show the storage profile and the settings the database reports for it."""
+    import storage
+    click.echo(f"Profile: {storage.get_profile().name} ({db.engine.dialect.name})")
+    with db.engine.connect() as connection:
+        for name, value in storage.describe(connection).items():
+            click.echo(f"  {name} = {value}")
+
+@app.cli.command('outbox-worker')
+@click.option('--workers', default=None, type=int, help='Delivery threads')
+@click.option('--once', is_flag=True, help='Deliver until the outbox has nothing due, then exit')
+def outbox_worker_command(workers, once):
+    """Drain the email outbox; run with EMAIL_OUTBOX_IN_PROCESS=0 on the web workers."""
+    import time
+    import outbox
+    pool = outbox.OutboxWorkerPool(n_workers=workers or outbox.OUTBOX_WORKERS)
+    if once:
+        while pool.run_once():
+            pass
+        click.echo(f"Sent {pool.sent}, retried {pool.retried}, dead-lettered {pool.dead}")
+        return
+    pool.start()
+    click.echo(f"Draining the email outbox with {pool.n_workers} workers; press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+            stats = outbox.queue_stats()
+            click.echo(f"pending {stats['pending']}, dead {stats['dead']}, lag {stats['lag_seconds']:.1f}s")
+    except KeyboardInterrupt:
+        pool.stop(timeout=outbox.OUTBOX_LEASE_SECONDS)
+
+@app.cli.command('outbox-status')
+def outbox_status_command():
+    """Show email outbox depth and queue lag."""
+    import outbox
+    for name, value in outbox.queue_stats().items():
+        click.echo(f"{name}: {value:.1f}" if isinstance(value, float) else f"{name}: {value}")
+
+@app.cli.command('outbox-retry-dead')
+def outbox_retry_dead_command():
+    """Move dead-lettered emails back to pending with a fresh attempt budget."""
+    import outbox
+    with db.engine.begin() as connection:
+        retried = outbox.retry_dead(connection)
+    click.echo(f"Requeued {retried} emails")
+
+@app.cli.command('outbox-purge')
+@click.option('--retention-hours', default=None, type=float, help='Keep sent emails this many hours')
+def outbox_purge_command(retention_hours):
+    """Delete sent emails older than the retention period."""
+    import outbox
+    retention_hours = outbox.OUTBOX_RETENTION_HOURS if retention_hours is None else retention_hours
+    click.echo(f"Purged {outbox.purge_sent(retention_hours)} sent emails older than {retention_hours:g} hours")
+
+@app.cli.command('send-reminders')
+@click.option('--once', is_flag=True, help='Run one scan, deliver what it queued, then exit')
+@click.option('--window-hours', default=None, type=float, help='Remind about appointments starting within this many hours')
+@click.option('--interval', default=None, type=float, help='Seconds between scans')
+@click.option('--page-size', default=None, type=int, help='Appointments read and queued per transaction')
+def send_reminders_command(once, window_hours, interval, page_size):
+    """Queue reminder emails for upcoming appointments on a fixed cadence."""
+    import reminders
+    import outbox
+    window_hours = window_hours or reminders.REMINDER_WINDOW_HOURS
+    page_size = page_size or reminders.REMINDER_PAGE_SIZE
+
+    def report(run):
+        click.echo(
+            f"Queued {run.queued} reminders ({run.scanned} scanned, {run.outside_window} outside the window, "
+            f"{run.pages} pages) in {run.elapsed_seconds:.2f}s: query {run.query_seconds:.2f}s, "
+            f"render {run.render_seconds:.2f}s, write {run.write_seconds:.2f}s"
+        )
+
+    if once:
+        report(reminders.queue_due_reminders(window_hours, page_size))
+        if outbox.OUTBOX_IN_PROCESS:
+            pool = outbox.OutboxWorkerPool()
+            while pool.run_once():
+                pass
+            click.echo(f"Sent {pool.sent}, retried {pool.retried}, dead-lettered {pool.dead}")
+        return
+    click.echo(f"Scanning for appointments in the next {window_hours:g} hours every "
+               f"{interval or reminders.REMINDER_INTERVAL_SECONDS:g}s; press Ctrl+C to stop")
+    try:
+        reminders.run_scheduler(interval or reminders.REMINDER_INTERVAL_SECONDS, window_hours, page_size, on_run=report)
+    except KeyboardInterrupt:
+        outbox.outbox_workers.stop(timeout=outbox.OUTBOX_LEASE_SECONDS)
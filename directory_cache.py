@@ -0,0 +1,185 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from sqlalchemy import event
+
+from app import db
+from models import Doctor, User
+
+# Directory cache configuration, overridable from the environment
+DIRECTORY_TTL_SECONDS = float(os.environ.get('DOCTOR_DIRECTORY_TTL', 300))
+DIRECTORY_SHARED_PATH = os.environ.get('DOCTOR_DIRECTORY_CACHE_PATH')
+
+def make_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+class SQLiteDirectoryBackend:
+    """
+    Directory version and body shared by every worker on the host through a local SQLite file.
+
+    Invalidation bumps the version and drops the body; the next worker to
+    serve the directory rebuilds it and stores it for the others.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS doctor_directory ('
+            'id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, body BLOB)'
+        )
+        connection.execute('INSERT OR IGNORE INTO doctor_directory VALUES (1, 0, NULL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def version(self):
+        return self._connection().execute('SELECT version FROM doctor_directory WHERE id = 1').fetchone()[0]
+
+    def get(self, version):
+        row = self._connection().execute(
+            'SELECT body FROM doctor_directory WHERE id = 1 AND version = ?', (version,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, version, body):
+        # Only store a body built for the version that is still current
+        self._connection().execute(
+            'UPDATE doctor_directory SET body = ? WHERE id = 1 AND version = ?', (body, version)
+        )
+
+    def bump(self):
+        self._connection().execute('UPDATE doctor_directory SET version = version + 1, body = NULL WHERE id = 1')
+
+class DoctorDirectoryCache:
+    """
+    Serialized doctor directory with its ETag, rebuilt only after an invalidation.
+
+    Each entry is tagged with a version. Invalidating bumps the version, and
+    also the shared version when a shared backend is configured, so every
+    worker rebuilds on its next request. The TTL bounds staleness for
+    workers that have no shared backend.
+    """
+
+    def __init__(self, ttl_seconds=DIRECTORY_TTL_SECONDS, shared=None):
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._lock = threading.Lock()
+        self._version = 0
+        self._entry = None  # (version, body, etag, expires_at)
+        self.hits = 0
+        self.shared_hits = 0
+        self.rebuilds = 0
+        self.invalidations = 0
+
+    def _current_version(self):
+        if self.shared is not None:
+            try:
+                return self.shared.version()
+            except sqlite3.Error as e:
+                logging.warning(f"Shared doctor directory read failed: {str(e)}")
+        return self._version
+
+    def get(self, build):
+        """
+        Return (body, etag) for the directory, calling build() for the JSON bytes on a miss.
+
+        Args:
+            build (callable): Serializes the directory as bytes
+        """
+        version = self._current_version()
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == version and entry[3] > time.monotonic():
+                self.hits += 1
+                return entry[1], entry[2]
+
+        body = None
+        if self.shared is not None:
+            try:
+                body = self.shared.get(version)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared doctor directory read failed: {str(e)}")
+        if body is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            body = build()
+            with self._lock:
+                self.rebuilds += 1
+            if self.shared is not None:
+                try:
+                    self.shared.put(version, body)
+                except sqlite3.Error as e:
+                    logging.warning(f"Shared doctor directory write failed: {str(e)}")
+
+        etag = make_etag(body)
+        with self._lock:
+            # An invalidation while building leaves the result uncached
+            if version == self._current_version():
+                self._entry = (version, body, etag, time.monotonic() + self.ttl_seconds)
+        return body, etag
+
+    def invalidate(self):
+        """Forget the cached directory; called after doctors or their users change."""
+        with self._lock:
+            self._version += 1
+            self._entry = None
+            self.invalidations += 1
+        if self.shared is not None:
+            try:
+                self.shared.bump()
+            except sqlite3.Error as e:
+                logging.warning(f"Shared doctor directory invalidation failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached': self._entry is not None,
+                'ttl_seconds': self.ttl_seconds,
+                'shared': self.shared.path if self.shared is not None else None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'rebuilds': self.rebuilds,
+                'invalidations': self.invalidations,
+            }
+
+def _create_default_cache():
+    shared = None
+    if DIRECTORY_SHARED_PATH:
+        try:
+            shared = SQLiteDirectoryBackend(DIRECTORY_SHARED_PATH)
+        except sqlite3.Error as e:
+            logging.error(f"Could not open shared doctor directory {DIRECTORY_SHARED_PATH}: {str(e)}")
+    return DoctorDirectoryCache(shared=shared)
+
+# Process-wide cache used by the /api/doctors route
+doctor_directory = _create_default_cache()
+
+def _touches_directory(instance):
+    return isinstance(instance, Doctor) or (isinstance(instance, User) and instance.role == 'doctor')
+
+@event.listens_for(db.session, 'before_flush')
+def _note_directory_changes(session, flush_context, instances):
+    if any(_touches_directory(instance) for instance in (*session.new, *session.dirty, *session.deleted)):
+        session.info['doctor_directory_changed'] = True
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('doctor_directory_changed', False):
+        doctor_directory.invalidate()
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('doctor_directory_changed', None)
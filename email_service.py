@@ -1,14 +1,205 @@
 import os
-import sys
+import json
+import queue
 import logging
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail, Email, To, Content
+import threading
+import time
+import http.client
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from metrics import EMAIL_SEND, EMAIL_MESSAGES
+from email_templates import (
+    APPOINTMENT_CONFIRMATION, APPOINTMENT_REMINDER, PREDICTION_RESULT,
+    recommendation_signature, recommendation_block
+)
 
 # Get SendGrid API key from environment variables
 sendgrid_key = os.environ.get('SENDGRID_API_KEY')
 if not sendgrid_key:
     logging.error("SENDGRID_API_KEY environment variable not set!")
 
+# Use a domain that's been verified in your SendGrid account
+VERIFIED_SENDER_EMAIL = os.environ.get('VERIFIED_SENDER_EMAIL', 'noreply@smarthealth.app')
+SENDGRID_API_URL = os.environ.get('SENDGRID_API_URL', 'https://api.sendgrid.com')
+SENDGRID_POOL_SIZE = int(os.environ.get('SENDGRID_POOL_SIZE', 4))
+SENDGRID_TIMEOUT = float(os.environ.get('SENDGRID_TIMEOUT', 10))
+
+# SendGrid accepts at most this many personalizations in one mail/send request
+MAX_PERSONALIZATIONS = 1000
+
+# One message for send_many(). The body and subject may contain substitution
+# tags (e.g. '-name-') that SendGrid replaces with this recipient's values.
+OutgoingEmail = namedtuple(
+    'OutgoingEmail', ['recipient', 'subject', 'body', 'substitutions', 'custom_args'], defaults=(None, None)
+)
+
+class SendGridClient:
+    """
+    Long-lived client for the SendGrid v3 mail/send API.
+
+    Keeps up to pool_size keep-alive connections open and reuses them across
+    requests and threads, so a send costs one round trip instead of a TCP and
+    TLS handshake. The pool is rebuilt after fork, since sockets must not be
+    shared between processes.
+    """
+
+    def __init__(self, api_key=None, base_url=SENDGRID_API_URL, pool_size=SENDGRID_POOL_SIZE,
+                 timeout=SENDGRID_TIMEOUT, sender=VERIFIED_SENDER_EMAIL):
+        self.api_key = api_key if api_key is not None else sendgrid_key
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = f"{url.path.rstrip('/')}/v3/mail/send"
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.sender = sender
+        self._lock = threading.Lock()
+        self._pool = queue.LifoQueue()
+        self._pid = os.getpid()
+
+        self.requests = 0
+        self.connections = 0
+
+    def _connect(self):
+        with self._lock:
+            self.connections += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._pool = queue.LifoQueue()
+                    self._pid = os.getpid()
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _release(self, connection):
+        if self._pid == os.getpid() and self._pool.qsize() < self.pool_size:
+            self._pool.put(connection)
+        else:
+            connection.close()
+
+    def post(self, payload):
+        """
+        POST one mail/send payload.
+
+        A pooled connection the server has closed since its last use is
+        replaced once; any other failure is raised.
+
+        Returns:
+            tuple: (status code, response body)
+        """
+        body = json.dumps(payload).encode()
+        headers = {
+            'Authorization': f"Bearer {self.api_key}",
+            'Content-Type': 'application/json',
+        }
+        connection, reused = self._acquire()
+        while True:
+            try:
+                connection.request('POST', self.path, body, headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                connection.close()
+                if not reused:
+                    raise
+                # Idle keep-alive connection timed out on the server; retry on a fresh one
+                connection, reused = self._connect(), False
+            except Exception:
+                connection.close()
+                raise
+        with self._lock:
+            self.requests += 1
+        if response.will_close:
+            connection.close()
+        else:
+            self._release(connection)
+        return response.status, data
+
+    def _payload(self, subject, body, personalizations):
+        return {
+            'from': {'email': self.sender},
+            'subject': subject,
+            'personalizations': personalizations,
+            'content': [{'type': 'text/plain', 'value': body}],
+        }
+
+    def send(self, to_email, subject, text_content):
+        """Send one plain-text email; returns True if SendGrid accepted it."""
+        status, data = self.post(self._payload(subject, text_content, [{'to': [{'email': to_email}]}]))
+        logging.info(f"Email sent to {to_email}. Status code: {status}")
+        if 200 <= status < 300:
+            return True
+        logging.error(f"Failed to send email. Status code: {status} {data[:200]!r}")
+        return False
+
+    def send_many(self, messages):
+        """
+        Send many emails with as few requests as possible.
+
+        Messages that share a subject and body (before substitution) become
+        personalizations of one request, up to MAX_PERSONALIZATIONS each.
+        SendGrid rejects a whole request with 400 when one personalization is
+        invalid, e.g. a malformed address. A rejected request is split in
+        halves and retried until the offending messages are isolated, so they
+        do not fail the rest of their group.
+
+        Args:
+            messages (list): OutgoingEmail tuples
+
+        Returns:
+            list: None for each accepted message, else the error, in input order
+        """
+        groups = {}
+        for i, message in enumerate(messages):
+            groups.setdefault((message.subject, message.body), []).append(i)
+
+        errors = [None] * len(messages)
+        for (subject, body), indexes in groups.items():
+            for start in range(0, len(indexes), MAX_PERSONALIZATIONS):
+                self._send_group(subject, body, messages, indexes[start:start + MAX_PERSONALIZATIONS], errors)
+        return errors
+
+    def _send_group(self, subject, body, messages, indexes, errors):
+        personalizations = []
+        for i in indexes:
+            personalization = {'to': [{'email': messages[i].recipient}]}
+            if messages[i].substitutions:
+                personalization['substitutions'] = messages[i].substitutions
+            if messages[i].custom_args:
+                personalization['custom_args'] = messages[i].custom_args
+            personalizations.append(personalization)
+        try:
+            status, data = self.post(self._payload(subject, body, personalizations))
+            error = None if 200 <= status < 300 else f"SendGrid returned {status}: {data[:200]!r}"
+        except (OSError, http.client.HTTPException) as e:
+            status, error = None, f"SendGrid request failed: {str(e)}"
+        if status == 400 and len(indexes) > 1:
+            middle = len(indexes) // 2
+            self._send_group(subject, body, messages, indexes[:middle], errors)
+            self._send_group(subject, body, messages, indexes[middle:], errors)
+            return
+        if error:
+            logging.error(f"Failed to send {len(indexes)} emails: {error}")
+        for i in indexes:
+            errors[i] = error
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'connections': self.connections, 'idle': self._pool.qsize()}
+
+# Process-wide client shared by every sender
+sendgrid_client = SendGridClient()
+
 def send_email(to_email, subject, text_content):
     """
     Generic function to send an email using SendGrid
@@ -25,37 +216,91 @@ def send_email(to_email, subject, text_content):
         logging.error("Cannot send email: SendGrid API key is missing")
         return False
         
+    started = time.perf_counter()
     try:
-        # Create SendGrid client
-        sg = SendGridAPIClient(sendgrid_key)
-        
-        # Set up the email
-        # Use a domain that's been verified in your SendGrid account
-        verified_sender = os.environ.get('VERIFIED_SENDER_EMAIL', 'noreply@smarthealth.app')
-        from_email = Email(verified_sender)
-        to_email = To(to_email)
-        content = Content("text/plain", text_content)
-        
-        # Enable detailed logging for debugging
-        logging.debug(f"Sending email from: {verified_sender} to: {to_email.email}")
-        mail = Mail(from_email, to_email, subject, content)
-        
-        # Send the email
-        response = sg.client.mail.send.post(request_body=mail.get())
-        
-        # Log the response
-        logging.info(f"Email sent to {to_email.email}. Status code: {response.status_code}")
-        
-        # Check if successful
-        if response.status_code >= 200 and response.status_code < 300:
-            return True
-        else:
-            logging.error(f"Failed to send email. Status code: {response.status_code}")
-            return False
-            
+        sent = sendgrid_client.send(to_email, subject, text_content)
     except Exception as e:
         logging.error(f"SendGrid error: {str(e)}")
-        return False
+        sent = False
+    EMAIL_SEND.observe(time.perf_counter() - started, ('single',))
+    EMAIL_MESSAGES.inc(('single', 'sent' if sent else 'failed'))
+    return sent
+
+def send_many(messages):
+    """
+    Send a batch of emails, grouping identical templates into shared requests.
+    
+    Args:
+        messages (list): OutgoingEmail tuples
+        
+    Returns:
+        list: None for each accepted message, else the error, in input order
+    """
+    if not sendgrid_key:
+        logging.error("Cannot send email: SendGrid API key is missing")
+        return ['SendGrid API key is missing'] * len(messages)
+    started = time.perf_counter()
+    errors = sendgrid_client.send_many(messages)
+    EMAIL_SEND.observe(time.perf_counter() - started, ('bulk',))
+    failed = sum(1 for error in errors if error)
+    EMAIL_MESSAGES.inc(('bulk', 'sent'), len(errors) - failed)
+    EMAIL_MESSAGES.inc(('bulk', 'failed'), failed)
+    return errors
+
+def _appointment_confirmation_values(appointment_details):
+    # Get priority-specific information
+    priority_text = ""
+    if 'priority' in appointment_details:
+        if appointment_details['priority'].lower() == 'urgent':
+            priority_text = "\nThis appointment has been marked as URGENT. Special priority will be given."
+        elif appointment_details['priority'].lower() == 'emergency':
+            priority_text = "\nThis appointment has been marked as EMERGENCY. Please contact us immediately if your condition worsens before the appointment date."
+    
+    # Get additional notes
+    notes_text = ""
+    if 'notes' in appointment_details and appointment_details['notes']:
+        notes_text = f"\nAdditional Notes: {appointment_details['notes']}"
+    
+    # Get follow-up information
+    follow_up_text = ""
+    if 'follow_up' in appointment_details and appointment_details['follow_up'] == 'Yes':
+        follow_up_text = "\nThis is scheduled as a follow-up appointment."
+    
+    # Get medical records information
+    records_text = ""
+    if 'medical_records' in appointment_details and appointment_details['medical_records'] == 'Yes':
+        records_text = "\nYou have indicated that you will bring your medical records to this appointment."
+    
+    return {
+        **appointment_details,
+        'priority_text': priority_text,
+        'follow_up_text': follow_up_text,
+        'notes_text': notes_text,
+        'records_text': records_text,
+    }
+
+def render_appointment_confirmation(appointment_details):
+    """
+    Subject and body of an appointment confirmation.
+    
+    Args:
+        appointment_details (dict): patient_name, doctor_name, specialization,
+            date, time, reason and optionally priority, notes, follow_up and
+            medical_records
+        
+    Returns:
+        tuple: (subject, body)
+    """
+    return APPOINTMENT_CONFIRMATION.render(_appointment_confirmation_values(appointment_details))
+
+def personalize_appointment_confirmation(appointment_details):
+    """
+    Appointment confirmation with the per-patient fields as substitution tags, for send_many().
+    
+    Returns:
+        tuple: (subject, body, substitutions)
+    """
+    return APPOINTMENT_CONFIRMATION.personalize(_appointment_confirmation_values(appointment_details))
 
 def send_appointment_confirmation_email(recipient, appointment_details):
     """
@@ -69,58 +314,7 @@ def send_appointment_confirmation_email(recipient, appointment_details):
         logging.info(f"Preparing to send confirmation email to {recipient}")
         logging.debug(f"Appointment details: {appointment_details}")
         
-        # Get priority-specific information
-        priority_text = ""
-        if 'priority' in appointment_details:
-            if appointment_details['priority'].lower() == 'urgent':
-                priority_text = "\nThis appointment has been marked as URGENT. Special priority will be given."
-            elif appointment_details['priority'].lower() == 'emergency':
-                priority_text = "\nThis appointment has been marked as EMERGENCY. Please contact us immediately if your condition worsens before the appointment date."
-        
-        # Get additional notes
-        notes_text = ""
-        if 'notes' in appointment_details and appointment_details['notes']:
-            notes_text = f"\nAdditional Notes: {appointment_details['notes']}"
-        
-        # Get follow-up information
-        follow_up_text = ""
-        if 'follow_up' in appointment_details and appointment_details['follow_up'] == 'Yes':
-            follow_up_text = "\nThis is scheduled as a follow-up appointment."
-        
-        # Get medical records information
-        records_text = ""
-        if 'medical_records' in appointment_details and appointment_details['medical_records'] == 'Yes':
-            records_text = "\nYou have indicated that you will bring your medical records to this appointment."
-
-        subject = "Appointment Confirmation - Smart Healthcare Ecosystem"
-        body = f"""
-Dear {appointment_details['patient_name']},
-
-Your appointment with Dr. {appointment_details['doctor_name']} ({appointment_details['specialization']}) has been confirmed.
-
-Appointment Details:
-Date: {appointment_details['date']}
-Time: {appointment_details['time']}
-Reason: {appointment_details['reason']}{priority_text}{follow_up_text}{notes_text}{records_text}
-
-Location: Smart Healthcare Center
-
-Preparation Instructions:
-- Arrive 15 minutes early to complete any necessary paperwork
-- Bring a list of current medications and dosages
-- Bring your insurance card and ID
-- Fast for 8 hours prior to appointment if lab work might be needed
-- Wear comfortable clothing that allows easy examination
-
-If you need to reschedule or cancel, please log in to your account or contact us.
-
-We've added this appointment to your personal health calendar in your user dashboard.
-
-Thank you for choosing Smart Healthcare Ecosystem!
-
-Best regards,
-The Smart Healthcare Team
-        """
+        subject, body = render_appointment_confirmation(appointment_details)
         
         # Use the generic send_email function
         email_sent = send_email(recipient, subject, body)
@@ -136,6 +330,34 @@ The Smart Healthcare Team
         logging.error(f"Exception in send_appointment_confirmation_email: {str(e)}")
         return False
 
+def render_appointment_reminder(appointment_details):
+    """
+    Subject and body of an appointment reminder.
+    
+    Args:
+        appointment_details (dict): patient_name, doctor_name, specialization,
+            date, time and optionally reason
+        
+    Returns:
+        tuple: (subject, body)
+    """
+    return APPOINTMENT_REMINDER.render({
+        **appointment_details,
+        'reason': appointment_details.get('reason', 'Not specified'),
+    })
+
+def personalize_appointment_reminder(appointment_details):
+    """
+    Appointment reminder with the per-patient fields as substitution tags, for send_many().
+    
+    Returns:
+        tuple: (subject, body, substitutions)
+    """
+    return APPOINTMENT_REMINDER.personalize({
+        **appointment_details,
+        'reason': appointment_details.get('reason', 'Not specified'),
+    })
+
 def send_appointment_reminder_email(recipient, appointment_details):
     """
     Send appointment reminder email to the user.
@@ -147,36 +369,7 @@ def send_appointment_reminder_email(recipient, appointment_details):
     try:
         logging.info(f"Preparing to send reminder email to {recipient}")
         
-        subject = "Appointment Reminder - Smart Healthcare Ecosystem"
-        body = f"""
-Dear {appointment_details['patient_name']},
-
-This is a friendly reminder for your upcoming appointment with Dr. {appointment_details['doctor_name']} ({appointment_details['specialization']}).
-
-Appointment Details:
-Date: {appointment_details['date']}
-Time: {appointment_details['time']}
-Reason: {appointment_details.get('reason', 'Not specified')}
-
-Location: Smart Healthcare Center
-
-Pre-appointment checklist:
-- Please bring any previous medical records related to your condition
-- Bring a list of current medications
-- Have your ID and insurance card ready (if applicable)
-- Complete any pre-appointment forms in your patient portal
-- Fast for 8 hours if your appointment includes lab work
-
-Please arrive 15 minutes before your scheduled appointment time.
-If you need to reschedule or cancel, please log in to your account or contact us at least 24 hours in advance.
-
-You can use our mobile app to get directions to our center and check in digitally when you arrive.
-
-Thank you for choosing Smart Healthcare Ecosystem!
-
-Best regards,
-The Smart Healthcare Team
-        """
+        subject, body = render_appointment_reminder(appointment_details)
         
         # Use the generic send_email function
         email_sent = send_email(recipient, subject, body)
@@ -192,6 +385,42 @@ The Smart Healthcare Team
         logging.error(f"Exception in send_appointment_reminder_email: {str(e)}")
         return False
 
+def _prediction_result_values(prediction_details):
+    return {
+        'patient_name': prediction_details['patient_name'],
+        'risk_level': "High" if prediction_details['prediction_label'] else "Low",
+        'risk_percentage': f"{prediction_details['prediction_result'] * 100:.1f}%",
+        'recommendations': recommendation_block(recommendation_signature(prediction_details)),
+    }
+
+def render_prediction_result(prediction_details):
+    """
+    Subject and body of a prediction result email.
+    
+    Only the rules are evaluated per message; the recommendation block is
+    cached per combination of triggered rules.
+    
+    Args:
+        prediction_details (dict): patient_name, prediction_label,
+            prediction_result and the health metrics the recommendations use
+        
+    Returns:
+        tuple: (subject, body)
+    """
+    return PREDICTION_RESULT.render(_prediction_result_values(prediction_details))
+
+def personalize_prediction_result(prediction_details):
+    """
+    Prediction result email with the per-patient fields as substitution tags, for send_many().
+    
+    Recipients whose details trigger the same recommendation rules get the
+    same subject and body.
+    
+    Returns:
+        tuple: (subject, body, substitutions)
+    """
+    return PREDICTION_RESULT.personalize(_prediction_result_values(prediction_details))
+
 def send_prediction_result_email(recipient, prediction_details):
     """
     Send prediction result email to the user.
@@ -203,43 +432,7 @@ def send_prediction_result_email(recipient, prediction_details):
     try:
         logging.info(f"Preparing to send prediction result email to {recipient}")
         
-        subject = "Your Smart Healthcare Cardiovascular Risk Assessment Results"
-        
-        risk_level = "High" if prediction_details['prediction_label'] else "Low"
-        risk_percentage = f"{prediction_details['prediction_result'] * 100:.1f}%"
-        
-        body = f"""
-Dear {prediction_details['patient_name']},
-
-Thank you for using our Smart Healthcare Ecosystem Prediction Service. Below are your cardiovascular risk assessment results:
-
-✱ Risk Assessment: {risk_level} Risk
-✱ Risk Percentage: {risk_percentage}
-
-{get_recommendation_text(prediction_details)}
-
-Next Steps:
-1. Schedule a consultation with one of our cardiologists to discuss your results
-2. Download our mobile app to track your health metrics daily
-3. Join our online support community for heart health tips and discussions
-4. Consider enrolling in our heart health wellness program
-
-Important Health Metrics to Monitor:
-- Blood Pressure: Target below 120/80 mmHg
-- Total Cholesterol: Target below 200 mg/dL
-- Resting Heart Rate: Target 60-100 BPM
-- BMI: Target 18.5-24.9
-
-Please note that this is an AI-based prediction and not a medical diagnosis. 
-We recommend consulting with a healthcare professional for a comprehensive evaluation.
-
-You can view your complete results and history by logging into your account dashboard.
-
-Stay healthy!
-
-Best regards,
-The Smart Healthcare Team
-        """
+        subject, body = render_prediction_result(prediction_details)
         
         # Use the generic send_email function
         email_sent = send_email(recipient, subject, body)
@@ -255,74 +448,22 @@ The Smart Healthcare Team
         logging.error(f"Exception in send_prediction_result_email: {str(e)}")
         return False
 
+def send_prediction_result_emails(results):
+    """
+    Send prediction result emails in bulk.
+    
+    Args:
+        results (list): (recipient, prediction_details) pairs
+        
+    Returns:
+        list: None for each accepted message, else the error, in input order
+    """
+    messages = []
+    for recipient, prediction_details in results:
+        subject, body, substitutions = personalize_prediction_result(prediction_details)
+        messages.append(OutgoingEmail(recipient, subject, body, substitutions))
+    return send_many(messages)
+
 def get_recommendation_text(prediction_details):
     """Generate personalized recommendations based on prediction details."""
-    recommendations = ["Based on your results, here are personalized recommendations for improving your heart health:"]
-    
-    # Blood pressure recommendations
-    if prediction_details.get('systolic_bp', 0) > 140 or prediction_details.get('diastolic_bp', 0) > 90:
-        recommendations.append("- Monitor your blood pressure daily and log readings in our mobile app")
-        recommendations.append("- Reduce sodium intake to less than 1,500mg per day")
-        recommendations.append("- Consider the DASH diet (Dietary Approaches to Stop Hypertension)")
-        recommendations.append("- Practice stress reduction techniques like meditation or deep breathing exercises")
-    
-    # Cholesterol recommendations
-    if prediction_details.get('cholesterol', 0) > 1:
-        recommendations.append("- Increase consumption of foods rich in omega-3 fatty acids (salmon, walnuts, flaxseeds)")
-        recommendations.append("- Add more soluble fiber to your diet (oats, beans, fruits)")
-        recommendations.append("- Limit saturated fats and eliminate trans fats from your diet")
-        recommendations.append("- Consider plant sterols/stanols supplements after consulting with your doctor")
-    
-    # Lifestyle recommendations
-    if prediction_details.get('smoking', False):
-        recommendations.append("- Join our smoking cessation program with personalized support")
-        recommendations.append("- Download our app's quit-smoking tracker to monitor your progress")
-        recommendations.append("- Consider nicotine replacement therapy or prescription medications (consult your doctor)")
-    
-    if prediction_details.get('alcohol', False):
-        recommendations.append("- Limit alcohol to no more than 1 drink per day for women or 2 for men")
-        recommendations.append("- Try alcohol-free days at least 3-4 days per week")
-        recommendations.append("- Replace alcoholic beverages with heart-healthy alternatives like unsweetened tea")
-    
-    if not prediction_details.get('physical_activity', True):
-        recommendations.append("- Start with 10-minute walks and gradually increase to 30 minutes daily")
-        recommendations.append("- Aim for 150 minutes of moderate aerobic activity or 75 minutes of vigorous activity weekly")
-        recommendations.append("- Add strength training exercises at least twice per week")
-        recommendations.append("- Join our virtual fitness classes designed for heart health")
-    
-    # Weight recommendations
-    if prediction_details.get('weight', 0) > 0 and prediction_details.get('height', 0) > 0:
-        height_m = prediction_details['height'] / 100  # convert cm to m
-        bmi = prediction_details['weight'] / (height_m * height_m)
-        if bmi > 30:
-            recommendations.append("- Consider our medically supervised weight management program")
-            recommendations.append("- Schedule a consultation with our nutritionist for a personalized meal plan")
-        elif bmi > 25:
-            recommendations.append("- Aim for a 5-10% weight reduction over 6 months through diet and exercise")
-            recommendations.append("- Use our meal planning tools in the mobile app to track calorie intake")
-            recommendations.append("- Consider joining our weekly support group for weight management")
-    
-    # Sleep recommendations
-    if prediction_details.get('sleep_hours', 0) < 7:
-        recommendations.append("- Aim for 7-9 hours of quality sleep per night")
-        recommendations.append("- Establish a regular sleep schedule and bedtime routine")
-        recommendations.append("- Use our sleep tracker to monitor your sleep patterns")
-    
-    # Stress management
-    if prediction_details.get('stress_level', 0) > 6:
-        recommendations.append("- Practice mindfulness meditation for 10-15 minutes daily")
-        recommendations.append("- Consider joining our stress management workshop")
-        recommendations.append("- Try progressive muscle relaxation techniques before bedtime")
-    
-    # Nutrition recommendations
-    if prediction_details.get('high_salt_diet', False) or prediction_details.get('high_fat_diet', False):
-        recommendations.append("- Follow a Mediterranean or DASH diet rich in fruits, vegetables, whole grains, and lean proteins")
-        recommendations.append("- Use our nutrition tracking feature to monitor your daily intake")
-        recommendations.append("- Download our heart-healthy recipe collection with meal prep guides")
-    
-    # Follow-up care
-    recommendations.append("- Schedule a follow-up with one of our cardiologists for a comprehensive evaluation")
-    recommendations.append("- Consider our Remote Patient Monitoring program for continuous cardiac care")
-    recommendations.append("- Join our monthly heart health webinars to stay informed about the latest advances")
-    
-    return "\n".join(recommendations)
+    return recommendation_block(recommendation_signature(prediction_details))
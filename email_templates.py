@@ -0,0 +1,288 @@
+"""
+Email templates compiled once at import.
+
+Templates use str.format placeholders. Each one is compiled into a
+function whose body is the equivalent f-string, so filling a template
+costs the same as the f-string it replaces, with no parsing per message.
+
+personalize() leaves the fields that differ per recipient (the template's
+personal fields) as SendGrid substitution tags such as '-patient_name-',
+and returns their values separately. Every recipient of a template then
+gets the same subject and body, so send_many() can put many of them in one
+request. apply_substitutions() fills the tags for transports that send
+each message themselves.
+
+The recommendation block of the prediction result email depends only on
+which of a handful of rules a patient triggers. recommendation_signature()
+reduces the details to those rule outcomes, and the block is built once per
+distinct signature; there are at most a few hundred of them.
+"""
+import re
+import string
+from functools import lru_cache
+from collections import namedtuple
+
+def substitution_tag(field):
+    """SendGrid substitution tag standing in for a personal field."""
+    return f"-{field}-"
+
+class EmailTemplate:
+    """Subject and body templates compiled into fill functions."""
+
+    def __init__(self, name, subject, body, personal=()):
+        self.name = name
+        self.personal = tuple(personal)
+        self._fill_subject = self._compile(subject)
+        self._fill_body = self._compile(body)
+        self._tags = {field: substitution_tag(field) for field in self.personal}
+
+    def _compile(self, text):
+        # Adjacent literals and f-strings compile into one f-string, so the
+        # fill function runs the same bytecode as a hand-written f-string
+        parts = []
+        variables = {}
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if literal:
+                parts.append(repr(literal))
+            if field is not None:
+                if conversion or '{' in spec:
+                    raise ValueError(f"Template '{self.name}' uses an unsupported replacement field '{field}'")
+                if spec and field in self.personal:
+                    raise ValueError(f"Personal field '{field}' of template '{self.name}' cannot have a format spec")
+                name = variables.setdefault(field, f'v{len(variables)}')
+                parts.append(f"f'{{{name}{':' + spec if spec else ''}}}'")
+        lines = ['def fill(values):']
+        lines += [f"    {name} = values[{field!r}]" for field, name in variables.items()]
+        lines.append(f"    return ({' '.join(parts) or repr('')})")
+        source = '\n'.join(lines)
+        namespace = {}
+        exec(compile(source, f'<email_template:{self.name}>', 'exec'), namespace)
+        return namespace['fill']
+
+    def render(self, values):
+        """
+        Fill the template.
+
+        Returns:
+            tuple: (subject, body)
+        """
+        return self._fill_subject(values), self._fill_body(values)
+
+    def personalize(self, values):
+        """
+        Fill the template, leaving personal fields as substitution tags.
+
+        Returns:
+            tuple: (subject, body, substitutions), where substitutions maps
+            each tag to this recipient's value
+        """
+        tagged = {**values, **self._tags}
+        substitutions = {tag: str(values[field]) for field, tag in self._tags.items()}
+        return self._fill_subject(tagged), self._fill_body(tagged), substitutions
+
+@lru_cache(maxsize=64)
+def _tag_pattern(tags):
+    # Longest first, so a tag that is a prefix of another does not win
+    return re.compile('|'.join(re.escape(tag) for tag in sorted(tags, key=len, reverse=True)))
+
+def apply_substitutions(text, substitutions):
+    """Replace substitution tags in one pass, so a value that looks like a tag is left alone."""
+    if not substitutions:
+        return text
+    return _tag_pattern(tuple(substitutions)).sub(lambda match: substitutions[match.group(0)], text)
+
+APPOINTMENT_CONFIRMATION = EmailTemplate('appointment_confirmation', "Appointment Confirmation - Smart Healthcare Ecosystem", """
+Dear {patient_name},
+
+Your appointment with Dr. {doctor_name} ({specialization}) has been confirmed.
+
+Appointment Details:
+Date: {date}
+Time: {time}
+Reason: {reason}{priority_text}{follow_up_text}{notes_text}{records_text}
+
+Location: Smart Healthcare Center
+
+Preparation Instructions:
+- Arrive 15 minutes early to complete any necessary paperwork
+- Bring a list of current medications and dosages
+- Bring your insurance card and ID
+- Fast for 8 hours prior to appointment if lab work might be needed
+- Wear comfortable clothing that allows easy examination
+
+If you need to reschedule or cancel, please log in to your account or contact us.
+
+We've added this appointment to your personal health calendar in your user dashboard.
+
+Thank you for choosing Smart Healthcare Ecosystem!
+
+Best regards,
+The Smart Healthcare Team
+        """, personal=('patient_name', 'doctor_name', 'specialization', 'date', 'time', 'reason', 'notes_text'))
+
+APPOINTMENT_REMINDER = EmailTemplate('appointment_reminder', "Appointment Reminder - Smart Healthcare Ecosystem", """
+Dear {patient_name},
+
+This is a friendly reminder for your upcoming appointment with Dr. {doctor_name} ({specialization}).
+
+Appointment Details:
+Date: {date}
+Time: {time}
+Reason: {reason}
+
+Location: Smart Healthcare Center
+
+Pre-appointment checklist:
+- Please bring any previous medical records related to your condition
+- Bring a list of current medications
+- Have your ID and insurance card ready (if applicable)
+- Complete any pre-appointment forms in your patient portal
+- Fast for 8 hours if your appointment includes lab work
+
+Please arrive 15 minutes before your scheduled appointment time.
+If you need to reschedule or cancel, please log in to your account or contact us at least 24 hours in advance.
+
+You can use our mobile app to get directions to our center and check in digitally when you arrive.
+
+Thank you for choosing Smart Healthcare Ecosystem!
+
+Best regards,
+The Smart Healthcare Team
+        """, personal=('patient_name', 'doctor_name', 'specialization', 'date', 'time', 'reason'))
+
+PREDICTION_RESULT = EmailTemplate('prediction_result', "Your Smart Healthcare Cardiovascular Risk Assessment Results", """
+Dear {patient_name},
+
+Thank you for using our Smart Healthcare Ecosystem Prediction Service. Below are your cardiovascular risk assessment results:
+
+✱ Risk Assessment: {risk_level} Risk
+✱ Risk Percentage: {risk_percentage}
+
+{recommendations}
+
+Next Steps:
+1. Schedule a consultation with one of our cardiologists to discuss your results
+2. Download our mobile app to track your health metrics daily
+3. Join our online support community for heart health tips and discussions
+4. Consider enrolling in our heart health wellness program
+
+Important Health Metrics to Monitor:
+- Blood Pressure: Target below 120/80 mmHg
+- Total Cholesterol: Target below 200 mg/dL
+- Resting Heart Rate: Target 60-100 BPM
+- BMI: Target 18.5-24.9
+
+Please note that this is an AI-based prediction and not a medical diagnosis. 
+We recommend consulting with a healthcare professional for a comprehensive evaluation.
+
+You can view your complete results and history by logging into your account dashboard.
+
+Stay healthy!
+
+Best regards,
+The Smart Healthcare Team
+        """, personal=('patient_name', 'risk_level', 'risk_percentage'))
+
+# Outcome of every recommendation rule; bmi_band is 0 (unknown or <= 25), 1 (overweight) or 2 (obese)
+RecommendationSignature = namedtuple('RecommendationSignature', [
+    'high_blood_pressure', 'high_cholesterol', 'smoking', 'alcohol', 'inactive',
+    'bmi_band', 'short_sleep', 'high_stress', 'unhealthy_diet',
+])
+
+def recommendation_signature(details):
+    """
+    Evaluate the recommendation rules against prediction details.
+
+    Returns a plain tuple in RecommendationSignature field order; it is the
+    cache key of recommendation_block() and is hashed once per recipient.
+    """
+    get = details.get
+    bmi_band = 0
+    weight, height = get('weight', 0), get('height', 0)
+    if weight > 0 and height > 0:
+        height_m = height / 100  # convert cm to m
+        bmi = weight / (height_m * height_m)
+        bmi_band = 2 if bmi > 30 else 1 if bmi > 25 else 0
+    return (
+        get('systolic_bp', 0) > 140 or get('diastolic_bp', 0) > 90,
+        get('cholesterol', 0) > 1,
+        not not get('smoking', False),
+        not not get('alcohol', False),
+        not get('physical_activity', True),
+        bmi_band,
+        get('sleep_hours', 0) < 7,
+        get('stress_level', 0) > 6,
+        not not (get('high_salt_diet', False) or get('high_fat_diet', False)),
+    )
+
+@lru_cache(maxsize=None)
+def recommendation_block(signature):
+    """Personalized recommendation text for one rule signature, built once per signature."""
+    signature = RecommendationSignature(*signature)
+    recommendations = ["Based on your results, here are personalized recommendations for improving your heart health:"]
+
+    # Blood pressure recommendations
+    if signature.high_blood_pressure:
+        recommendations.append("- Monitor your blood pressure daily and log readings in our mobile app")
+        recommendations.append("- Reduce sodium intake to less than 1,500mg per day")
+        recommendations.append("- Consider the DASH diet (Dietary Approaches to Stop Hypertension)")
+        recommendations.append("- Practice stress reduction techniques like meditation or deep breathing exercises")
+
+    # Cholesterol recommendations
+    if signature.high_cholesterol:
+        recommendations.append("- Increase consumption of foods rich in omega-3 fatty acids (salmon, walnuts, flaxseeds)")
+        recommendations.append("- Add more soluble fiber to your diet (oats, beans, fruits)")
+        recommendations.append("- Limit saturated fats and eliminate trans fats from your diet")
+        recommendations.append("- Consider plant sterols/stanols supplements after consulting with your doctor")
+
+    # Lifestyle recommendations
+    if signature.smoking:
+        recommendations.append("- Join our smoking cessation program with personalized support")
+        recommendations.append("- Download our app's quit-smoking tracker to monitor your progress")
+        recommendations.append("- Consider nicotine replacement therapy or prescription medications (consult your doctor)")
+
+    if signature.alcohol:
+        recommendations.append("- Limit alcohol to no more than 1 drink per day for women or 2 for men")
+        recommendations.append("- Try alcohol-free days at least 3-4 days per week")
+        recommendations.append("- Replace alcoholic beverages with heart-healthy alternatives like unsweetened tea")
+
+    if signature.inactive:
+        recommendations.append("- Start with 10-minute walks and gradually increase to 30 minutes daily")
+        recommendations.append("- Aim for 150 minutes of moderate aerobic activity or 75 minutes of vigorous activity weekly")
+        recommendations.append("- Add strength training exercises at least twice per week")
+        recommendations.append("- Join our virtual fitness classes designed for heart health")
+
+    # Weight recommendations
+    if signature.bmi_band == 2:
+        recommendations.append("- Consider our medically supervised weight management program")
+        recommendations.append("- Schedule a consultation with our nutritionist for a personalized meal plan")
+    elif signature.bmi_band == 1:
+        recommendations.append("- Aim for a 5-10% weight reduction over 6 months through diet and exercise")
+        recommendations.append("- Use our meal planning tools in the mobile app to track calorie intake")
+        recommendations.append("- Consider joining our weekly support group for weight management")
+
+    # Sleep recommendations
+    if signature.short_sleep:
+        recommendations.append("- Aim for 7-9 hours of quality sleep per night")
+        recommendations.append("- Establish a regular sleep schedule and bedtime routine")
+        recommendations.append("- Use our sleep tracker to monitor your sleep patterns")
+
+    # Stress management
+    if signature.high_stress:
+        recommendations.append("- Practice mindfulness meditation for 10-15 minutes daily")
+        recommendations.append("- Consider joining our stress management workshop")
+        recommendations.append("- Try progressive muscle relaxation techniques before bedtime")
+
+    # Nutrition recommendations
+    if signature.unhealthy_diet:
+        recommendations.append("- Follow a Mediterranean or DASH diet rich in fruits, vegetables, whole grains, and lean proteins")
+        recommendations.append("- Use our nutrition tracking feature to monitor your daily intake")
+        recommendations.append("- Download our heart-healthy recipe collection with meal prep guides")
+
+    # Follow-up care
+    recommendations.append("- Schedule a follow-up with one of our cardiologists for a comprehensive evaluation")
+    recommendations.append("- Consider our Remote Patient Monitoring program for continuous cardiac care")
+    recommendations.append("- Join our monthly heart health webinars to stay informed about the latest advances")
+
+    return "\n".join(recommendations)
+
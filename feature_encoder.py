@@ -0,0 +1,208 @@
+from collections import namedtuple
+
+import numpy as np
+
+# One model input column: where it goes in the matrix and how raw values are encoded
+FeatureSpec = namedtuple('FeatureSpec', ['name', 'column', 'dtype', 'default', 'encoder'])
+
+class NumberEncoder:
+    """Numeric measurement; missing or null values fall back to the default."""
+
+    def encode(self, value, default):
+        return float(default if value is None else value)
+
+    def expression(self, value, default):
+        return f"float({default} if {value} is None else {value})"
+
+    def encode_column(self, values, default):
+        values = np.asarray(values)
+        if values.dtype.kind in 'biuf':
+            return values
+        values = values.astype(object)
+        values[values == None] = default  # noqa: E711 - elementwise null check
+        return values.astype(np.float64)
+
+class FlagEncoder:
+    """Yes/no answer encoded as 1/0 by truthiness."""
+
+    def encode(self, value, default):
+        if value is None:
+            value = default
+        return 1.0 if value else 0.0
+
+    def expression(self, value, default):
+        return f"(1.0 if ({default} if {value} is None else {value}) else 0.0)"
+
+    def encode_column(self, values, default):
+        values = np.asarray(values)
+        if values.dtype.kind in 'biuf':
+            return values != 0
+        return np.fromiter(
+            (bool(default if v is None else v) for v in values.tolist()),
+            dtype=bool,
+            count=len(values)
+        )
+
+class CategoryEncoder:
+    """Binary category: 1 when the value matches `positive` case-insensitively."""
+
+    def __init__(self, positive):
+        self.positive = positive.lower()
+
+    def encode(self, value, default):
+        if value is None:
+            value = default
+        return 1.0 if str(value).lower() == self.positive else 0.0
+
+    def expression(self, value, default):
+        return f"(1.0 if str({default} if {value} is None else {value}).lower() == {self.positive!r} else 0.0)"
+
+    def encode_column(self, values, default):
+        values = np.asarray(values, dtype=object)
+        values[values == None] = default  # noqa: E711 - elementwise null check
+        return np.char.lower(values.astype(str)) == self.positive
+
+NUMBER = NumberEncoder()
+FLAG = FlagEncoder()
+
+# Column layout of the model's feature matrix
+FEATURE_SPEC = (
+    # Basic information
+    FeatureSpec('age', 0, np.float32, 50, NUMBER),
+    FeatureSpec('gender', 1, np.float32, '', CategoryEncoder('male')),
+    FeatureSpec('height', 2, np.float32, 170, NUMBER),
+    FeatureSpec('weight', 3, np.float32, 70, NUMBER),
+
+    # Category 1: Clinical Symptoms
+    FeatureSpec('chest_pain', 4, np.float32, 0, FLAG),
+    FeatureSpec('shortness_of_breath', 5, np.float32, 0, FLAG),
+    FeatureSpec('fatigue', 6, np.float32, 0, FLAG),
+    FeatureSpec('palpitations', 7, np.float32, 0, FLAG),
+    FeatureSpec('dizziness', 8, np.float32, 0, FLAG),
+
+    # Category 2: Physiological indicators
+    FeatureSpec('systolic_bp', 9, np.float32, 120, NUMBER),
+    FeatureSpec('diastolic_bp', 10, np.float32, 80, NUMBER),
+    FeatureSpec('cholesterol', 11, np.float32, 1, NUMBER),
+    FeatureSpec('glucose', 12, np.float32, 1, NUMBER),
+    FeatureSpec('heart_rate', 13, np.float32, 75, NUMBER),
+
+    # Category 3: Lifestyle factors
+    FeatureSpec('smoking', 14, np.float32, 0, FLAG),
+    FeatureSpec('alcohol', 15, np.float32, 0, FLAG),
+    FeatureSpec('physical_activity', 16, np.float32, 1, FLAG),
+    FeatureSpec('high_salt_diet', 17, np.float32, 0, FLAG),
+    FeatureSpec('high_fat_diet', 18, np.float32, 0, FLAG),
+
+    # Category 4: Genetic and family history
+    FeatureSpec('family_history', 19, np.float32, 0, FLAG),
+    FeatureSpec('genetic_disorders', 20, np.float32, 0, FLAG),
+    FeatureSpec('previous_heart_problems', 21, np.float32, 0, FLAG),
+
+    # Category 5: Additional conditions
+    FeatureSpec('diabetes', 22, np.float32, 0, FLAG),
+    FeatureSpec('hypertension', 23, np.float32, 0, FLAG),
+    FeatureSpec('kidney_disease', 24, np.float32, 0, FLAG),
+)
+
+class FeatureEncoder:
+    """
+    Encoder compiled once from a feature spec.
+
+    Row input goes through a generated function that reads every field and
+    returns the encoded tuple in column order, with each encoder's
+    expression and default inlined. Encoding a batch of dicts is then one
+    list comprehension plus a single assignment into a preallocated float32
+    matrix. Column input is encoded one whole column at a time.
+    """
+
+    def __init__(self, spec):
+        self.spec = tuple(sorted(spec, key=lambda feature: feature.column))
+        if [feature.column for feature in self.spec] != list(range(len(self.spec))):
+            raise ValueError('Feature spec columns must be contiguous and start at 0')
+
+        self.feature_names = [feature.name for feature in self.spec]
+        self.n_features = len(self.spec)
+        self.dtype = np.result_type(*(feature.dtype for feature in self.spec))
+        self.encode_row = self._compile_row_encoder()
+
+    def _compile_row_encoder(self):
+        namespace = {}
+        lines = ['def encode_row(record):', '    get = record.get']
+        values = []
+        for feature in self.spec:
+            value, default = f'value_{feature.column}', f'default_{feature.column}'
+            namespace[default] = feature.default
+            lines.append(f'    {value} = get({feature.name!r})')
+            values.append(feature.encoder.expression(value, default))
+        lines.append(f"    return ({', '.join(values)},)")
+        exec(compile('\n'.join(lines), '<feature_encoder>', 'exec'), namespace)
+        return namespace['encode_row']
+
+    def empty(self, n_rows):
+        """Allocate an uninitialized feature matrix for n_rows."""
+        return np.empty((n_rows, self.n_features), dtype=self.dtype)
+
+    def encode_records(self, records, out=None):
+        """
+        Encode a sequence of feature dictionaries.
+
+        Args:
+            records (list): Feature dictionaries
+            out (np.ndarray): Optional preallocated matrix with at least len(records) rows
+
+        Returns:
+            np.ndarray: (len(records), n_features) view of the encoded rows
+        """
+        n_rows = len(records)
+        if out is None:
+            out = self.empty(n_rows)
+        encode_row = self.encode_row
+        out[:n_rows] = [encode_row(record) for record in records]
+        return out[:n_rows]
+
+    def encode_record(self, record):
+        """Encode one feature dictionary as a (1, n_features) matrix."""
+        return self.encode_records((record,))
+
+    def encode_columns(self, columns, n_rows=None, out=None):
+        """
+        Encode column arrays keyed by feature name; missing columns take the default.
+
+        Args:
+            columns (dict): Feature name -> sequence of raw values
+            n_rows (int): Row count, required only if no spec column is present
+            out (np.ndarray): Optional preallocated matrix with at least n_rows rows
+
+        Returns:
+            np.ndarray: (n_rows, n_features) encoded matrix
+        """
+        if n_rows is None:
+            n_rows = next(len(columns[f.name]) for f in self.spec if f.name in columns)
+        if out is None:
+            out = self.empty(n_rows)
+        out = out[:n_rows]
+
+        for feature in self.spec:
+            values = columns.get(feature.name)
+            if values is None:
+                out[:, feature.column] = feature.encoder.encode(None, feature.default)
+            else:
+                out[:, feature.column] = feature.encoder.encode_column(values, feature.default)
+        return out
+
+# Shared encoder for the model's feature layout
+feature_encoder = FeatureEncoder(FEATURE_SPEC)
+
+TRUE_STRINGS = {'1', 'true', 't', 'yes', 'y', 'on'}
+
+def parse_text_columns(columns, encoder=feature_encoder):
+    """Turn text columns (e.g. from CSV) into the Python values the feature encoders expect."""
+    parsed = {}
+    specs = {feature.name: feature for feature in encoder.spec}
+    for name, values in columns.items():
+        if isinstance(specs[name].encoder, FlagEncoder):
+            parsed[name] = [None if v == '' else v.strip().lower() in TRUE_STRINGS for v in values]
+        else:
+            parsed[name] = [None if v == '' else v for v in values]
+    return parsed
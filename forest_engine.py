@@ -0,0 +1,138 @@
+import numpy as np
+
+class CompiledForest:
+    """
+    Random forest compiled into flat NumPy node arrays.
+
+    All trees are packed into one set of arrays indexed by a global node id.
+    Leaves point back at themselves with an infinite threshold, so a fixed
+    number of vectorized steps walks every row down every tree at once
+    without any per-tree Python calls.
+    """
+
+    ARRAY_NAMES = ('feature', 'threshold', 'children_left', 'children_right', 'value', 'roots')
+
+    def __init__(self, feature, threshold, children_left, children_right, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children_left = children_left
+        self.children_right = children_right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_trees = len(roots)
+        self.n_classes = value.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """Compile a fitted RandomForestClassifier (or any single-output tree ensemble)."""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(n_nodes, dtype=np.intp)
+
+            # Leaves loop onto themselves: feature 0 <= +inf always goes "left"
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.intp))
+            rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.intp))
+
+            # Store per-node class probabilities, as DecisionTreeClassifier.predict_proba does
+            node_values = tree.value[:, 0, :].astype(np.float64)
+            totals = node_values.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+            values.append(node_values / totals)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.intp),
+            max_depth
+        )
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from arrays produced by to_arrays(), e.g. memory-mapped registry files."""
+        return cls(
+            arrays['feature'],
+            arrays['threshold'],
+            arrays['children_left'],
+            arrays['children_right'],
+            arrays['value'],
+            arrays['roots'],
+            int(arrays['max_depth'][0])
+        )
+
+    def to_arrays(self):
+        """Return the packed arrays keyed by name, suitable for model_registry.save_model."""
+        arrays = {name: getattr(self, name) for name in self.ARRAY_NAMES}
+        arrays['max_depth'] = np.asarray([self.max_depth], dtype=np.intp)
+        return arrays
+
+    def apply(self, X):
+        """Return the leaf node id reached by each row in each tree, shape (n_rows, n_trees)."""
+        # sklearn compares float32 inputs against float64 thresholds; do the same
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+
+        # Gather through the flattened matrix; take() is much cheaper than 2-D fancy indexing
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            go_left = flat_X.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = np.where(go_left, self.children_left.take(nodes), self.children_right.take(nodes))
+        return nodes
+
+    def predict_proba(self, X):
+        """Average per-tree class probabilities, matching RandomForestClassifier.predict_proba."""
+        return self.value.take(self.apply(X), axis=0).mean(axis=1)
+
+    def contributions(self, X, class_index=1):
+        """
+        Decision-path attribution of each feature to the predicted probability.
+
+        Every split a row passes through moves its probability from the
+        parent node's value to the child's; that change is credited to the
+        split feature. Averaged over trees this gives, for every row,
+        bias + contributions.sum(axis=1) == predict_proba(X)[:, class_index].
+
+        Returns:
+            tuple: (bias, contributions) with shapes (n_rows,) and (n_rows, n_features)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        n_rows, n_features = X.shape
+
+        node_value = np.ascontiguousarray(self.value[:, class_index])
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_rows, self.n_trees)).copy()
+        totals = np.zeros(n_rows * n_features, dtype=np.float64)
+
+        for _ in range(self.max_depth):
+            split_slots = row_offsets + self.feature.take(nodes)
+            go_left = flat_X.take(split_slots) <= self.threshold.take(nodes)
+            children = np.where(go_left, self.children_left.take(nodes), self.children_right.take(nodes))
+            # Leaves point at themselves, so finished trees contribute a zero delta
+            deltas = node_value.take(children) - node_value.take(nodes)
+            totals += np.bincount(split_slots.ravel(), weights=deltas.ravel(), minlength=totals.size)
+            nodes = children
+
+        bias = np.full(n_rows, node_value.take(self.roots).mean())
+        return bias, totals.reshape(n_rows, n_features) / self.n_trees
@@ -0,0 +1,122 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+
+# Opt-in micro-batching configuration
+MICROBATCH_ENABLED = os.environ.get('INFERENCE_MICROBATCH', '').lower() in ('1', 'true', 'yes')
+MICROBATCH_MAX_SIZE = int(os.environ.get('INFERENCE_MAX_BATCH', 32))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 2))
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+class MicroBatchScheduler:
+    """
+    Coalesce concurrent single-row predictions into one model call.
+
+    Callers block in submit() while a background thread collects requests
+    until either max_batch_size rows are queued or max_wait_ms has passed
+    since the first one arrived, scores them with a single predict_fn call
+    and hands each caller back its own row of the result.
+
+    Each row carries the model state its caller snapshotted, and rows are
+    scored with predict_fn(matrix, state). A batch that spans a model swap
+    is therefore split into one call per state.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MICROBATCH_MAX_SIZE, max_wait_ms=MICROBATCH_MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self.batches = 0
+        self.rows = 0
+        self.batch_size_histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.batch_size_histogram['+Inf'] = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each gunicorn worker starts its own
+        if self._worker_pid == os.getpid() and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker_pid != os.getpid() or not self._worker.is_alive():
+                self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, name='inference-scheduler', daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def submit(self, features_row, state=None, timeout=None):
+        """Queue one encoded feature row and block until state's probabilities for it are ready."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((np.asarray(features_row, dtype=np.float64).reshape(-1), time.perf_counter(), future, state))
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = first[1] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            flushed_at = time.perf_counter()
+            by_state = {}
+            for item in batch:
+                by_state.setdefault(id(item[3]), []).append(item)
+            for items in by_state.values():
+                try:
+                    probabilities = self.predict_fn(np.vstack([row for row, _, _, _ in items]), items[0][3])
+                except Exception as e:
+                    logging.error(f"Micro-batch inference failed: {str(e)}")
+                    for _, _, future, _ in items:
+                        future.set_exception(e)
+                else:
+                    for index, (_, _, future, _) in enumerate(items):
+                        future.set_result(probabilities[index])
+            self._record(batch, flushed_at)
+
+    def _record(self, batch, flushed_at):
+        waits = [flushed_at - enqueued_at for _, enqueued_at, _, _ in batch]
+        size = len(batch)
+        with self._lock:
+            self.batches += 1
+            self.rows += size
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), '+Inf')
+            self.batch_size_histogram[bucket] += 1
+            self.wait_seconds_total += sum(waits)
+            self.wait_seconds_max = max(self.wait_seconds_max, max(waits))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in self.batch_size_histogram.items()},
+                'mean_added_wait_ms': self.wait_seconds_total / self.rows * 1000.0 if self.rows else 0.0,
+                'max_added_wait_ms': self.wait_seconds_max * 1000.0,
+            }
@@ -0,0 +1,328 @@
+"""
+Prometheus metrics for request latency, SQL, inference and email delivery.
+
+Recording is meant to stay on in production:
+- A counter or histogram keeps one shard per thread, so an observation is
+  a thread-local lookup and a few list updates, with no lock.
+- The shards are only summed when /metrics is scraped.
+- When a thread exits, its shard is folded into the metric's retired
+  totals. A server that starts a thread per request therefore keeps one
+  shard per live thread, not one per request ever served.
+
+Every gunicorn worker is its own process with its own metrics. When
+METRICS_DIR is set, each process writes a snapshot of its totals to
+<METRICS_DIR>/<pid>-<start time>.json:
+- at most every METRICS_FLUSH_SECONDS, after a request finishes
+- and when the process exits
+
+/metrics sums the live totals of the serving process with the snapshots of
+all the others. Snapshots of exited workers are kept, so counters do not
+go backwards when a worker is recycled. Empty the directory on deploy, as
+with prometheus_client's multiprocess mode. Without METRICS_DIR, each
+worker reports only its own totals.
+
+Request metrics are recorded when the view returns. Time spent streaming a
+response body afterwards is not included.
+"""
+import os
+import json
+import time
+import atexit
+import weakref
+import logging
+import threading
+import itertools
+from bisect import bisect_left
+from collections import deque
+
+from flask import request
+from sqlalchemy import event
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() in ('1', 'true', 'yes')
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Never reused, so a finalizer from before a reset cannot retire a newer shard
+_shard_tokens = itertools.count()
+
+class _ShardOwner:
+    """Held only by a thread's thread-local; collected when the thread exits."""
+    __slots__ = ('__weakref__',)
+
+class _Metric:
+    """Base for metrics sharded per thread; subclasses define the per-label value layout."""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._reset()
+        REGISTRY.append(self)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            owner = self._local.owner = _ShardOwner()
+            token = next(_shard_tokens)
+            # The only lock: taken once per thread and metric
+            with self._lock:
+                self._retire_exited()
+                self._shards[token] = shard
+            # deque.append is atomic, so the finalizer needs no lock wherever it runs
+            weakref.finalize(owner, self._exited.append, token)
+        return shard
+
+    def _retire_exited(self):
+        # Called with the lock held; exited threads no longer write to their shards
+        while self._exited:
+            shard = self._shards.pop(self._exited.popleft(), None)
+            if shard is not None:
+                _add_values(self._retired, shard)
+
+    def _reset(self):
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = {}
+        self._exited = deque()
+        self._lock = threading.Lock()
+
+    def collect(self):
+        """Label values -> values summed over every live thread's shard and the retired totals."""
+        with self._lock:
+            self._retire_exited()
+            shards = list(self._shards.values())
+            totals = {labels: list(values) for labels, values in self._retired.items()}
+        _add_values(totals, *shards)
+        return totals
+
+def _add_values(totals, *shards):
+    for shard in shards:
+        for labels, values in list(shard.items()):
+            total = totals.get(labels)
+            if total is None:
+                totals[labels] = list(values)
+            else:
+                for i, value in enumerate(values):
+                    total[i] += value
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+class Histogram(_Metric):
+    """Histogram with fixed upper bounds; values are per-bucket counts, the +Inf count and the sum."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        shard = self._shard()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+# Every metric created in this process, in creation order
+REGISTRY = []
+
+# Functions called at scrape time that return [(name, help, type, [(labels dict, value)])]; their
+# values describe shared state (e.g. the database), so they are reported once, not summed per worker
+COLLECTORS = []
+
+HTTP_REQUESTS = Counter('http_requests_total', 'Requests handled', ('route', 'method', 'status'))
+HTTP_LATENCY = Histogram('http_request_duration_seconds', 'Request latency', ('route', 'method'))
+HTTP_DB_STATEMENTS = Histogram(
+    'http_request_db_statements', 'SQL statements executed per request', ('route',), COUNT_BUCKETS
+)
+HTTP_DB_SECONDS = Histogram('http_request_db_seconds', 'Time spent in SQL per request', ('route',), FAST_BUCKETS)
+DB_STATEMENTS = Histogram('db_statement_duration_seconds', 'SQL statement execution time', (), FAST_BUCKETS)
+PREDICTION_STAGE = Histogram(
+    'prediction_stage_seconds', 'Time per stage of predict_cardio_disease', ('stage',), FAST_BUCKETS
+)
+PREDICTION_CACHE = Counter('prediction_cache_lookups_total', 'Prediction cache lookups', ('result',))
+EMAIL_SEND = Histogram('email_send_seconds', 'Time to hand email to the provider', ('operation',))
+EMAIL_MESSAGES = Counter('email_messages_total', 'Emails handed to the provider', ('operation', 'outcome'))
+
+_request_state = threading.local()
+
+def _reset_after_fork():
+    # A forked worker starts from zero; what the parent recorded is the parent's to report
+    for metric in REGISTRY:
+        metric._reset()
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_STATEMENTS.observe(elapsed)
+    state = getattr(_request_state, 'current', None)
+    if state is not None:
+        state[1] += 1
+        state[2] += elapsed
+
+def _request_started():
+    # [start time, SQL statements, SQL seconds]
+    _request_state.current = [time.perf_counter(), 0, 0.0]
+
+def _record_request(status):
+    state = getattr(_request_state, 'current', None)
+    if state is None:
+        return
+    _request_state.current = None
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    HTTP_LATENCY.observe(time.perf_counter() - state[0], (route, request.method))
+    HTTP_REQUESTS.inc((route, request.method, str(status)))
+    HTTP_DB_STATEMENTS.observe(state[1], (route,))
+    HTTP_DB_SECONDS.observe(state[2], (route,))
+    maybe_flush()
+
+def install(app, engine):
+    """Time every request and every SQL statement on engine; no-op when METRICS_ENABLED is off."""
+    if not METRICS_ENABLED:
+        return
+    event.listen(engine, 'before_cursor_execute', _sql_started)
+    event.listen(engine, 'after_cursor_execute', _sql_finished)
+    app.before_request(_request_started)
+
+    @app.after_request
+    def _after_request(response):
+        _record_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _teardown_request(exc):
+        # Only still pending when the view raised
+        _record_request(500)
+
+    if METRICS_DIR:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        atexit.register(flush)
+
+def snapshot():
+    """This process's totals as a JSON-serializable dict."""
+    return {
+        metric.name: [[list(labels), values] for labels, values in metric.collect().items()]
+        for metric in REGISTRY
+    }
+
+_flush_lock = threading.Lock()
+_last_flush = [0.0]
+_started_at = int(time.time())
+
+def _snapshot_path():
+    return os.path.join(METRICS_DIR, f"{os.getpid()}-{_started_at}.json")
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR."""
+    if not METRICS_DIR:
+        return
+    path = _snapshot_path()
+    try:
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        logging.error(f"Could not write metrics snapshot {path}: {str(e)}")
+
+def maybe_flush():
+    if not METRICS_DIR:
+        return
+    now = time.monotonic()
+    if now - _last_flush[0] < METRICS_FLUSH_SECONDS or not _flush_lock.acquire(blocking=False):
+        return
+    try:
+        _last_flush[0] = now
+        flush()
+    finally:
+        _flush_lock.release()
+
+def merged_snapshot():
+    """Live totals of this process plus the snapshots of every other process in METRICS_DIR."""
+    merged = {name: {tuple(labels): values for labels, values in samples} for name, samples in snapshot().items()}
+    if not METRICS_DIR:
+        return merged
+    own = os.path.basename(_snapshot_path())
+    for filename in os.listdir(METRICS_DIR):
+        if not filename.endswith('.json') or filename == own:
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, filename)) as f:
+                other = json.load(f)
+        except (OSError, ValueError):
+            continue  # being replaced, or from an incompatible version
+        for name, samples in other.items():
+            totals = merged.setdefault(name, {})
+            for labels, values in samples:
+                labels = tuple(labels)
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(values)
+                elif len(total) == len(values):
+                    for i, value in enumerate(values):
+                        total[i] += value
+    return merged
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _labels_text(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render():
+    """All metrics, merged across workers, in the Prometheus text exposition format."""
+    merged = merged_snapshot()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, values in sorted(merged.get(metric.name, {}).items()):
+            if metric.kind == 'counter':
+                lines.append(f"{metric.name}{_labels_text(metric.labelnames, labels)} {_number(values[0])}")
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, float('inf')), values[:-1]):
+                cumulative += count
+                bucket_labels = _labels_text(metric.labelnames, labels, [('le', _number(bound))])
+                lines.append(f"{metric.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{metric.name}_sum{_labels_text(metric.labelnames, labels)} {_number(values[-1])}")
+            lines.append(f"{metric.name}_count{_labels_text(metric.labelnames, labels)} {cumulative}")
+    for collector in COLLECTORS:
+        try:
+            families = collector()
+        except Exception as e:
+            logging.error(f"Metrics collector {collector.__name__} failed: {str(e)}")
+            continue
+        for name, documentation, kind, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels_text(labels.keys(), labels.values())} {_number(value)}")
+    return '\n'.join(lines) + '\n'
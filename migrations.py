@@ -0,0 +1,254 @@
+"""
+Versioned schema migrations for SQLite and PostgreSQL.
+
+Each step is a function run inside its own transaction; the versions
+applied so far are recorded in the schema_version table. Steps must be
+idempotent, because a database created by db.create_all() already has
+every table, column and index the current models declare.
+
+Add a step by appending to MIGRATIONS with the next version number.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, select, update, bindparam, func, text, inspect
+)
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+schema_version_table = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+def _add_missing_columns(connection):
+    """Add nullable columns introduced after a table was first created."""
+    inspector = inspect(connection)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+def _create_model_indexes(*index_names):
+    """Step creating indexes declared on the models, looked up by name."""
+    def create_indexes(connection):
+        indexes = {index.name: index for table in db.metadata.tables.values() for index in table.indexes}
+        for name in index_names:
+            indexes[name].create(connection, checkfirst=True)
+    return create_indexes
+
+def _resolve_slot_conflicts(connection):
+    """
+    Store every appointment_time in the canonical '09:00 AM' form and cancel double bookings.
+
+    Databases from before the unique slot index may spell one time several
+    ways ('9:00 am', '09:00 AM') and may hold two active bookings of a slot.
+    The oldest booking of a slot (lowest id) is kept; each later one is
+    cancelled and logged. Times that cannot be parsed are left as they are.
+    """
+    from scheduling import parse_time, format_time
+    table = db.metadata.tables['appointment']
+    rows = connection.execute(
+        select(table.c.id, table.c.doctor_id, table.c.appointment_date, table.c.appointment_time, table.c.status)
+        .order_by(table.c.id)
+    ).all()
+
+    retimed = []
+    cancelled = []
+    booked = set()
+    for appointment_id, doctor_id, appointment_date, appointment_time, status in rows:
+        try:
+            canonical = format_time(parse_time(appointment_time))
+        except ValueError:
+            canonical = appointment_time
+        if canonical != appointment_time:
+            retimed.append({'b_id': appointment_id, 'b_time': canonical})
+        # The index treats NULLs as distinct, so such rows never conflict
+        if status == 'cancelled' or doctor_id is None or appointment_date is None or canonical is None:
+            continue
+        slot = (doctor_id, appointment_date, canonical)
+        if slot in booked:
+            logging.warning(
+                f"Cancelling appointment {appointment_id}: doctor {doctor_id} is already booked "
+                f"on {appointment_date} at {canonical}"
+            )
+            cancelled.append(appointment_id)
+        else:
+            booked.add(slot)
+
+    # Cancel first, so no retimed row collides with an active one under the unique index
+    if cancelled:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id')).values(status='cancelled'),
+            [{'b_id': appointment_id} for appointment_id in cancelled]
+        )
+    if retimed:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id')).values(appointment_time=bindparam('b_time')),
+            retimed
+        )
+
+def _create_slot_unique_index(connection):
+    # The rollups are built from scratch by the next migration
+    _resolve_slot_conflicts(connection)
+    _create_model_indexes('uq_appointment_doctor_slot')(connection)
+
+def _build_analytics_rollups(connection):
+    import analytics
+    from models import PredictionRollup, AppointmentRollup
+    PredictionRollup.__table__.create(connection, checkfirst=True)
+    AppointmentRollup.__table__.create(connection, checkfirst=True)
+    analytics.rebuild(connection)
+
+def _pack_prediction_flags(connection):
+    """Move the per-flag boolean columns of prediction into the packed bitset columns."""
+    from prediction_flags import FLAG_CATEGORIES
+    existing = {column['name'] for column in inspect(connection).get_columns('prediction')}
+    for column, _ in FLAG_CATEGORIES:
+        if column not in existing:
+            connection.execute(text(f'ALTER TABLE prediction ADD COLUMN "{column}" INTEGER NOT NULL DEFAULT 0'))
+
+    # Sum of the set bits per category; NULL counts as unset
+    assignments = []
+    for column, names in FLAG_CATEGORIES:
+        terms = [f'CASE WHEN "{name}" THEN {1 << i} ELSE 0 END' for i, name in enumerate(names) if name in existing]
+        if terms:
+            assignments.append(f'"{column}" = {" + ".join(terms)}')
+    if assignments:
+        connection.execute(text(f"UPDATE prediction SET {', '.join(assignments)}"))
+
+    # SQLite >= 3.35 and PostgreSQL drop columns in place; the space is reclaimed by VACUUM
+    for _, names in FLAG_CATEGORIES:
+        for name in names:
+            if name in existing:
+                connection.execute(text(f'ALTER TABLE prediction DROP COLUMN "{name}"'))
+    _create_model_indexes('ix_prediction_symptom_flags', 'ix_prediction_condition_flags')(connection)
+
+def _create_email_outbox(connection):
+    from models import OutboxMessage
+    OutboxMessage.__table__.create(connection, checkfirst=True)
+
+def _add_reminder_tracking(connection):
+    _add_missing_columns(connection)
+    _create_model_indexes('ix_appointment_reminder_due')(connection)
+
+# (version, name, step) in the order they are applied
+MIGRATIONS = [
+    (1, 'add_missing_columns', _add_missing_columns),
+    (2, 'history_list_indexes', _create_model_indexes(
+        'ix_prediction_user_created', 'ix_appointment_user_date', 'ix_appointment_doctor_date', 'ix_doctor_user_id'
+    )),
+    (3, 'unique_appointment_slot', _create_slot_unique_index),
+    (4, 'analytics_rollups', _build_analytics_rollups),
+    (5, 'prediction_flag_bitsets', _pack_prediction_flags),
+    (6, 'email_outbox', _create_email_outbox),
+    (7, 'appointment_reminders', _add_reminder_tracking),
+]
+
+def current_version(connection):
+    """Highest applied migration version, 0 for an unversioned database."""
+    schema_version_table.create(connection, checkfirst=True)
+    return connection.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+
+def upgrade(engine=None, target=None):
+    """
+    Apply pending migrations up to target (default: latest).
+
+    Safe to run from several workers at once: a step whose version another
+    process recorded first is rolled back and skipped.
+
+    Returns:
+        list: Versions applied by this call
+    """
+    engine = engine or db.engine
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    applied = []
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version or (target is not None and step_version > target):
+            continue
+        step_done = False
+        try:
+            with engine.begin() as connection:
+                step(connection)
+                step_done = True
+                connection.execute(schema_version_table.insert().values(
+                    version=step_version, name=name, applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            if not step_done:
+                raise
+            logging.info(f"Migration {step_version} ({name}) was applied concurrently")
+            continue
+        logging.info(f"Applied migration {step_version} ({name})")
+        applied.append(step_version)
+    return applied
+
+def _list_query_checks():
+    from datetime import date
+    from models import Prediction, Appointment, Doctor
+    import reminders
+
+    # The statements the list endpoints issue for a first page (see pagination.list_response)
+    return [
+        (
+            'GET /api/users/<id>/predictions', 'ix_prediction_user_created',
+            Prediction.list_statement(Prediction.user_id == 1)
+            .order_by(Prediction.created_at.desc(), Prediction.id.desc()).limit(51)
+        ),
+        (
+            'GET /api/users/<id>/appointments', 'ix_appointment_user_date',
+            Appointment.list_statement(Appointment.user_id == 1)
+            .order_by(Appointment.appointment_date.desc(), Appointment.id.desc()).limit(51)
+        ),
+        (
+            'GET /api/doctors/<id>/appointments', 'ix_appointment_doctor_date',
+            Appointment.list_statement(Appointment.doctor_id == 1)
+            .order_by(Appointment.appointment_date.desc(), Appointment.id.desc()).limit(51)
+        ),
+        (
+            'doctor lookup by user', 'ix_doctor_user_id',
+            select(Doctor).where(Doctor.user_id == 1)
+        ),
+        (
+            'predictions with chest_pain and diabetes', 'ix_prediction_condition_flags',
+            select(Prediction.id).where(Prediction.has_flags('chest_pain', 'diabetes'))
+        ),
+        (
+            'reminder scan', 'ix_appointment_reminder_due',
+            reminders.page_statement(date(2025, 1, 1), date(2025, 1, 2), after=(date(2025, 1, 1), 1))
+        ),
+    ]
+
+def explain_list_queries(engine=None):
+    """
+    EXPLAIN each list endpoint's query and check it is served by its index.
+
+    On PostgreSQL sequential scans are disabled for the check so a small or
+    empty table does not hide a missing index behind a cheaper seq scan.
+
+    Returns:
+        list: (label, index name, uses index, plan lines) per query
+    """
+    engine = engine or db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    results = []
+    with engine.connect() as connection:
+        if postgres:
+            connection.execute(text('SET LOCAL enable_seqscan = off'))
+        for label, index_name, statement in _list_query_checks():
+            sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+            if postgres:
+                plan = [row[0] for row in connection.execute(text(f'EXPLAIN {sql}'))]
+            else:
+                plan = [row[-1] for row in connection.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+            results.append((label, index_name, any(index_name in line for line in plan), plan))
+        connection.rollback()
+    return results
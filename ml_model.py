@@ -1,103 +1,188 @@
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-import logging
+import model_registry
+from forest_engine import CompiledForest
+from feature_encoder import feature_encoder
+from prediction_cache import prediction_cache, make_key
+from inference_scheduler import MicroBatchScheduler, MICROBATCH_ENABLED
+from metrics import PREDICTION_STAGE, PREDICTION_CACHE
+
+# Column order of the feature matrix the model is fitted on
+FEATURE_NAMES = feature_encoder.feature_names
+
+# Hyperparameters shared by in-process training and the training pipeline
+MODEL_PARAMS = {
+    'n_estimators': 150,
+    'max_depth': 12,
+    'random_state': 42,
+    'class_weight': 'balanced'
+}
+
+# Seconds between checks of the registry for a newly published version (0 disables)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+
+# Everything a prediction needs from one model, published as a single reference
+ModelState = namedtuple('ModelState', ['model', 'compiled', 'version', 'manifest', 'feature_importances'])
+
+def build_model(n_jobs=None):
+    """Create an unfitted classifier with the project's hyperparameters."""
+    return RandomForestClassifier(n_jobs=n_jobs, **MODEL_PARAMS)
 
 # Initialize the model with more complex features
-model = RandomForestClassifier(
-    n_estimators=150,
-    max_depth=12,
-    random_state=42,
-    class_weight='balanced'
-)
+model = build_model()
+
+# Registry version of the loaded model (None when trained in-process)
+model_version = None
+
+# model_version stored with predictions scored by a model trained in-process
+LOCAL_MODEL_VERSION = 'local'
+model_manifest = None
+
+# Flat-array copy of the fitted forest used for low-latency inference
+compiled_model = None
+
+# Global importances of the current model as (feature_name, importance), most important first
+feature_importances = []
+
+# The state requests read; replaced wholesale so no request sees a half-swapped model
+active_model = ModelState(model, None, None, None, [])
+_swap_lock = threading.Lock()
+_watcher_pid = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+def sample_training_data():
+    """Return (features, target) for the built-in synthetic training set."""
+    # Format of training data:
+    # Basic: [age, gender, height, weight]
+    # Cat1: [chest_pain, shortness_of_breath, fatigue, palpitations, dizziness]
+    # Cat2: [systolic_bp, diastolic_bp, cholesterol, glucose, heart_rate]
+    # Cat3: [smoking, alcohol, physical_activity, high_salt_diet, high_fat_diet]
+    # Cat4: [family_history, genetic_disorders, previous_heart_problems]
+    # Cat5: [diabetes, hypertension, kidney_disease]
+    # Label: [cardio disease present]
+    
+    # Generate synthetic training data that captures medical relationships
+    X = np.array([
+        # Healthy young individual with good lifestyle
+        [28, 1, 175, 70, 0, 0, 0, 0, 0, 110, 70, 1, 1, 72, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with mild risk factors
+        [45, 1, 180, 82, 0, 0, 0, 0, 0, 120, 80, 1, 1, 75, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with some risk factors
+        [52, 0, 165, 75, 0, 0, 1, 0, 0, 135, 85, 2, 1, 76, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Older with multiple risk factors
+        [63, 1, 172, 88, 1, 1, 1, 0, 0, 142, 92, 2, 1, 82, 1, 1, 0, 1, 1, 1, 0, 0, 0, 1, 0, 1],
+        # Older with significant clinical symptoms
+        [68, 0, 160, 65, 1, 1, 1, 1, 1, 155, 95, 3, 2, 88, 0, 0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+        # Middle-aged with diabetes
+        [50, 1, 175, 95, 0, 0, 1, 0, 0, 130, 85, 2, 2, 78, 0, 0, 0, 1, 1, 0, 0, 0, 1, 0, 0, 0],
+        # Middle-aged with hypertension
+        [55, 0, 162, 70, 0, 1, 1, 0, 1, 160, 100, 2, 1, 80, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1, 0, 1],
+        # Young with family history
+        [35, 1, 178, 72, 0, 0, 0, 1, 0, 118, 78, 1, 1, 70, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0],
+        # Older with severe cardio symptoms
+        [72, 0, 155, 60, 1, 1, 1, 1, 1, 170, 105, 3, 2, 90, 1, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1],
+        # Middle-aged with kidney disease
+        [58, 1, 170, 85, 0, 0, 1, 0, 1, 145, 95, 2, 2, 82, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1],
+        # Older with multiple conditions
+        [65, 0, 160, 68, 1, 1, 1, 1, 0, 155, 98, 3, 2, 85, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 0, 1],
+        # Young with lifestyle issues
+        [32, 1, 182, 90, 0, 0, 0, 0, 0, 125, 80, 1, 1, 72, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with multiple symptoms
+        [48, 0, 165, 75, 1, 1, 0, 1, 0, 140, 90, 2, 1, 80, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1],
+        # Healthy older individual
+        [70, 1, 168, 72, 0, 0, 1, 0, 0, 130, 85, 1, 1, 75, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with genetic predisposition
+        [45, 0, 163, 68, 0, 0, 0, 0, 0, 125, 82, 1, 1, 74, 0, 0, 1, 0, 0, 1, 1, 0, 0, 0, 0, 0],
+        # Young adult with metabolic issues
+        [38, 1, 175, 105, 0, 0, 1, 0, 0, 135, 88, 2, 2, 78, 0, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1],
+        # Older with pain symptoms
+        [68, 0, 160, 65, 1, 0, 0, 0, 0, 150, 90, 2, 1, 82, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 1],
+        # Middle-aged with cardio symptoms and poor lifestyle
+        [52, 1, 175, 88, 1, 1, 1, 1, 1, 145, 95, 2, 2, 84, 1, 1, 0, 1, 1, 0, 0, 0, 0, 1, 0, 1],
+        # Young adult with anemia
+        [30, 0, 165, 55, 0, 0, 1, 0, 1, 110, 70, 1, 1, 85, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 0],
+        # Middle-aged with thyroid issues
+        [55, 0, 158, 80, 0, 0, 1, 0, 0, 130, 85, 2, 1, 76, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Elderly with autoimmune issues
+        [75, 1, 170, 68, 0, 1, 1, 0, 1, 148, 88, 2, 1, 78, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1],
+        # Young with normal health
+        [25, 0, 160, 55, 0, 0, 0, 0, 0, 110, 70, 1, 1, 68, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with kidney issues
+        [50, 1, 175, 82, 0, 0, 0, 0, 0, 140, 90, 2, 1, 76, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0],
+        # Older with diabetes and heart problems
+        [65, 0, 160, 70, 1, 1, 1, 1, 0, 150, 95, 2, 3, 82, 0, 0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
+        # Middle-aged with metabolic syndrome
+        [48, 1, 175, 95, 0, 0, 1, 0, 0, 140, 90, 2, 2, 78, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1],
+        # Elderly with multiple conditions
+        [78, 0, 158, 60, 1, 1, 1, 1, 1, 165, 100, 3, 2, 90, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1],
+        # Young with family history but good lifestyle
+        [32, 1, 180, 75, 0, 0, 0, 0, 0, 118, 76, 1, 1, 68, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0],
+        # Middle-aged with high stress
+        [45, 0, 165, 72, 0, 0, 1, 1, 0, 132, 88, 1, 1, 82, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Healthy elderly
+        [72, 1, 168, 70, 0, 0, 0, 0, 0, 128, 82, 1, 1, 72, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
+        # Young with poor lifestyle
+        [28, 1, 182, 98, 0, 0, 0, 0, 0, 125, 80, 1, 1, 75, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+    ])
+    
+    # Split into features and target
+    features = X[:, :-1]  # All columns except the last
+    target = X[:, -1]     # Last column is the target
+    return features, target
+
+def activate_model(fitted_model, compiled=None, manifest=None):
+    """
+    Make a fitted model the one used for predictions.
+
+    Per-version state (compiled arrays, sorted global importances) is built
+    first; the swap itself is a single assignment of active_model, so
+    concurrent requests see either the old model or the new one.
+    """
+    global active_model, model, compiled_model, model_version, model_manifest, feature_importances
+
+    if compiled is None:
+        compiled = CompiledForest.from_sklearn(fitted_model)
+    version = manifest['version'] if manifest else None
+
+    importances = getattr(fitted_model, 'feature_importances_', None)
+    sorted_importances = [] if importances is None else sorted(
+        zip(FEATURE_NAMES, (float(i) for i in importances)),
+        key=lambda x: x[1],
+        reverse=True
+    )
+    state = ModelState(fitted_model, compiled, version, manifest, sorted_importances)
+
+    with _swap_lock:
+        active_model = state
+        # Module-level aliases kept for callers that only need the latest values
+        model = fitted_model
+        compiled_model = compiled
+        model_version = version
+        model_manifest = manifest
+        feature_importances = sorted_importances
+
+    prediction_cache.invalidate(version)
+    top_factors = ', '.join(f"{name}: {importance:.4f}" for name, importance in sorted_importances[:5])
+    logging.info(f"Activated model version {version or 'local'}; top factors: {top_factors}")
+    return state
+
 def initialize_model():
     """Initialize and train the model with sample data."""
     try:
-        # Define feature columns for our enhanced dataset
-        # The sequence is based on 5 categories of features
-        
-        # Format of training data:
-        # Basic: [age, gender, height, weight]
-        # Cat1: [chest_pain, shortness_of_breath, fatigue, palpitations, dizziness]
-        # Cat2: [systolic_bp, diastolic_bp, cholesterol, glucose, heart_rate]
-        # Cat3: [smoking, alcohol, physical_activity, high_salt_diet, high_fat_diet]
-        # Cat4: [family_history, genetic_disorders, previous_heart_problems]
-        # Cat5: [diabetes, hypertension, kidney_disease]
-        # Label: [cardio disease present]
+        features, target = sample_training_data()
         
-        # Generate synthetic training data that captures medical relationships
-        X = np.array([
-            # Healthy young individual with good lifestyle
-            [28, 1, 175, 70, 0, 0, 0, 0, 0, 110, 70, 1, 1, 72, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with mild risk factors
-            [45, 1, 180, 82, 0, 0, 0, 0, 0, 120, 80, 1, 1, 75, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with some risk factors
-            [52, 0, 165, 75, 0, 0, 1, 0, 0, 135, 85, 2, 1, 76, 0, 1, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Older with multiple risk factors
-            [63, 1, 172, 88, 1, 1, 1, 0, 0, 142, 92, 2, 1, 82, 1, 1, 0, 1, 1, 1, 0, 0, 0, 1, 0, 1],
-            # Older with significant clinical symptoms
-            [68, 0, 160, 65, 1, 1, 1, 1, 1, 155, 95, 3, 2, 88, 0, 0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
-            # Middle-aged with diabetes
-            [50, 1, 175, 95, 0, 0, 1, 0, 0, 130, 85, 2, 2, 78, 0, 0, 0, 1, 1, 0, 0, 0, 1, 0, 0, 0],
-            # Middle-aged with hypertension
-            [55, 0, 162, 70, 0, 1, 1, 0, 1, 160, 100, 2, 1, 80, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1, 0, 1],
-            # Young with family history
-            [35, 1, 178, 72, 0, 0, 0, 1, 0, 118, 78, 1, 1, 70, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0],
-            # Older with severe cardio symptoms
-            [72, 0, 155, 60, 1, 1, 1, 1, 1, 170, 105, 3, 2, 90, 1, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1],
-            # Middle-aged with kidney disease
-            [58, 1, 170, 85, 0, 0, 1, 0, 1, 145, 95, 2, 2, 82, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1],
-            # Older with multiple conditions
-            [65, 0, 160, 68, 1, 1, 1, 1, 0, 155, 98, 3, 2, 85, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 0, 1],
-            # Young with lifestyle issues
-            [32, 1, 182, 90, 0, 0, 0, 0, 0, 125, 80, 1, 1, 72, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with multiple symptoms
-            [48, 0, 165, 75, 1, 1, 0, 1, 0, 140, 90, 2, 1, 80, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0, 1],
-            # Healthy older individual
-            [70, 1, 168, 72, 0, 0, 1, 0, 0, 130, 85, 1, 1, 75, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with genetic predisposition
-            [45, 0, 163, 68, 0, 0, 0, 0, 0, 125, 82, 1, 1, 74, 0, 0, 1, 0, 0, 1, 1, 0, 0, 0, 0, 0],
-            # Young adult with metabolic issues
-            [38, 1, 175, 105, 0, 0, 1, 0, 0, 135, 88, 2, 2, 78, 0, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1],
-            # Older with pain symptoms
-            [68, 0, 160, 65, 1, 0, 0, 0, 0, 150, 90, 2, 1, 82, 0, 0, 0, 0, 0, 1, 0, 0, 0, 1, 0, 1],
-            # Middle-aged with cardio symptoms and poor lifestyle
-            [52, 1, 175, 88, 1, 1, 1, 1, 1, 145, 95, 2, 2, 84, 1, 1, 0, 1, 1, 0, 0, 0, 0, 1, 0, 1],
-            # Young adult with anemia
-            [30, 0, 165, 55, 0, 0, 1, 0, 1, 110, 70, 1, 1, 85, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 1, 0],
-            # Middle-aged with thyroid issues
-            [55, 0, 158, 80, 0, 0, 1, 0, 0, 130, 85, 2, 1, 76, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Elderly with autoimmune issues
-            [75, 1, 170, 68, 0, 1, 1, 0, 1, 148, 88, 2, 1, 78, 0, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1],
-            # Young with normal health
-            [25, 0, 160, 55, 0, 0, 0, 0, 0, 110, 70, 1, 1, 68, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with kidney issues
-            [50, 1, 175, 82, 0, 0, 0, 0, 0, 140, 90, 2, 1, 76, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 0],
-            # Older with diabetes and heart problems
-            [65, 0, 160, 70, 1, 1, 1, 1, 0, 150, 95, 2, 3, 82, 0, 0, 0, 0, 0, 1, 0, 1, 1, 1, 0, 1],
-            # Middle-aged with metabolic syndrome
-            [48, 1, 175, 95, 0, 0, 1, 0, 0, 140, 90, 2, 2, 78, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 1],
-            # Elderly with multiple conditions
-            [78, 0, 158, 60, 1, 1, 1, 1, 1, 165, 100, 3, 2, 90, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1],
-            # Young with family history but good lifestyle
-            [32, 1, 180, 75, 0, 0, 0, 0, 0, 118, 76, 1, 1, 68, 0, 0, 1, 0, 0, 1, 0, 0, 0, 0, 0, 0],
-            # Middle-aged with high stress
-            [45, 0, 165, 72, 0, 0, 1, 1, 0, 132, 88, 1, 1, 82, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Healthy elderly
-            [72, 1, 168, 70, 0, 0, 0, 0, 0, 128, 82, 1, 1, 72, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            # Young with poor lifestyle
-            [28, 1, 182, 98, 0, 0, 0, 0, 0, 125, 80, 1, 1, 75, 1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0]
-        ])
-        
-        # Split into features and target
-        features = X[:, :-1]  # All columns except the last
-        target = X[:, -1]     # Last column is the target
-        
-        # Train the model
-        model.fit(features, target)
+        # Train a fresh model so the active one is never mutated in place
+        new_model = build_model()
+        new_model.fit(features, target)
+        activate_model(new_model)
         logging.info("Enhanced cardiovascular prediction model initialized successfully")
         return True
     
@@ -105,95 +190,147 @@ def initialize_model():
         logging.error(f"Error initializing enhanced model: {str(e)}")
         return False
 
+def load_model(version=None):
+    """Load a published model from the registry without training."""
+    try:
+        loaded_model, manifest, arrays = model_registry.load_model(version)
+    except model_registry.ModelNotFoundError as e:
+        logging.warning(f"{str(e)}; run 'flask train-model' to publish one")
+        return False
+    except Exception as e:
+        logging.error(f"Error loading model from registry: {str(e)}")
+        return False
+
+    if manifest['feature_names'] != FEATURE_NAMES:
+        logging.error(f"Model version {manifest['version']} was fitted with a different feature order")
+        return False
+
+    # Prefer the memory-mapped compiled arrays so workers share them
+    if set(CompiledForest.ARRAY_NAMES) <= set(arrays):
+        compiled = CompiledForest.from_arrays(arrays)
+    else:
+        compiled = CompiledForest.from_sklearn(loaded_model)
+    activate_model(loaded_model, compiled, manifest)
+    return True
+
+def publish_model(fitted_model, metadata=None, activate=True):
+    """Save a fitted model to the registry as the CURRENT version, optionally activating it here."""
+    compiled = CompiledForest.from_sklearn(fitted_model)
+    manifest = model_registry.save_model(
+        fitted_model,
+        FEATURE_NAMES,
+        arrays=compiled.to_arrays(),
+        metadata=dict({
+            'n_estimators': fitted_model.n_estimators,
+            'max_depth': fitted_model.max_depth,
+        }, **(metadata or {}))
+    )
+    if activate:
+        activate_model(fitted_model, compiled, manifest)
+    return manifest
+
+def train_and_publish():
+    """Train the model on the sample data and publish it to the registry as a new version."""
+    try:
+        features, target = sample_training_data()
+        new_model = build_model()
+        new_model.fit(features, target)
+    except Exception as e:
+        logging.error(f"Error training model: {str(e)}")
+        return None
+    return publish_model(new_model, metadata={'training_source': 'sample'})
+
+def reload_if_changed():
+    """Activate the registry's CURRENT version if it differs from the active one."""
+    current = model_registry.get_current_version()
+    if current and current != active_model.version:
+        logging.info(f"Model registry now points at {current}; hot-swapping")
+        return load_model(current)
+    return False
+
+def _watch_registry(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_if_changed()
+        except Exception as e:
+            logging.error(f"Model reload check failed: {str(e)}")
+
+def ensure_model_watcher():
+    """Start the per-process registry watcher; threads do not survive fork, so check the pid."""
+    global _watcher_pid
+    if MODEL_RELOAD_INTERVAL <= 0 or _watcher_pid == os.getpid():
+        return
+    with _swap_lock:
+        if _watcher_pid != os.getpid():
+            threading.Thread(
+                target=_watch_registry, args=(MODEL_RELOAD_INTERVAL,), name='model-watcher', daemon=True
+            ).start()
+            _watcher_pid = os.getpid()
+
+def _ready_state():
+    """Return the active model state, training in-process if nothing has been published."""
+    ensure_model_watcher()
+    state = active_model
+    if state.compiled is None and not hasattr(state.model, 'classes_'):
+        initialize_model()
+        state = active_model
+    return state
+
+def predict_proba(features_matrix, state=None):
+    """Return class probabilities for an encoded (N, 25) feature matrix."""
+    state = state or active_model
+    if state.compiled is not None:
+        return state.compiled.predict_proba(features_matrix)
+    return state.model.predict_proba(features_matrix)
+
+# Opt-in coalescing of concurrent single-row predictions (INFERENCE_MICROBATCH=1)
+inference_scheduler = MicroBatchScheduler(predict_proba) if MICROBATCH_ENABLED else None
+
 def preprocess_features(features_dict):
-    """Convert the features dictionary to a numpy array for prediction."""
+    """Convert the features dictionary to a (1, 25) float32 array for prediction."""
     try:
-        # Convert gender to binary (1 for male, 0 for female)
-        gender_binary = 1 if features_dict.get('gender', '').lower() == 'male' else 0
-        
-        # Process optional fields with defaults
-        # Define default values for features that might not be present
-        defaults = {
-            # Basic info
-            'age': 50, 'height': 170, 'weight': 70,
-            
-            # Category 1: Clinical Symptoms (convert to 0/1)
-            'chest_pain': 0, 'shortness_of_breath': 0, 'fatigue': 0, 
-            'palpitations': 0, 'dizziness': 0,
-            
-            # Category 2: Physiological indicators
-            'systolic_bp': 120, 'diastolic_bp': 80, 
-            'cholesterol': 1, 'glucose': 1, 'heart_rate': 75,
-            
-            # Category 3: Lifestyle factors (convert to 0/1)
-            'smoking': 0, 'alcohol': 0, 'physical_activity': 1,
-            'high_salt_diet': 0, 'high_fat_diet': 0,
-            
-            # Category 4: Genetic and family history (convert to 0/1)
-            'family_history': 0, 'genetic_disorders': 0, 'previous_heart_problems': 0,
-            
-            # Category 5: Additional conditions (convert to 0/1)
-            'diabetes': 0, 'hypertension': 0, 'kidney_disease': 0
-        }
-        
-        # Create feature array in the correct order
-        features_array = np.array([
-            # Basic information
-            features_dict.get('age', defaults['age']),
-            gender_binary,
-            features_dict.get('height', defaults['height']),
-            features_dict.get('weight', defaults['weight']),
-            
-            # Category 1: Clinical Symptoms
-            1 if features_dict.get('chest_pain', defaults['chest_pain']) else 0,
-            1 if features_dict.get('shortness_of_breath', defaults['shortness_of_breath']) else 0,
-            1 if features_dict.get('fatigue', defaults['fatigue']) else 0,
-            1 if features_dict.get('palpitations', defaults['palpitations']) else 0,
-            1 if features_dict.get('dizziness', defaults['dizziness']) else 0,
-            
-            # Category 2: Physiological indicators
-            features_dict.get('systolic_bp', defaults['systolic_bp']),
-            features_dict.get('diastolic_bp', defaults['diastolic_bp']),
-            features_dict.get('cholesterol', defaults['cholesterol']),
-            features_dict.get('glucose', defaults['glucose']),
-            features_dict.get('heart_rate', defaults['heart_rate']),
-            
-            # Category 3: Lifestyle factors
-            1 if features_dict.get('smoking', defaults['smoking']) else 0,
-            1 if features_dict.get('alcohol', defaults['alcohol']) else 0,
-            1 if features_dict.get('physical_activity', defaults['physical_activity']) else 0,
-            1 if features_dict.get('high_salt_diet', defaults['high_salt_diet']) else 0,
-            1 if features_dict.get('high_fat_diet', defaults['high_fat_diet']) else 0,
-            
-            # Category 4: Genetic and family history
-            1 if features_dict.get('family_history', defaults['family_history']) else 0,
-            1 if features_dict.get('genetic_disorders', defaults['genetic_disorders']) else 0,
-            1 if features_dict.get('previous_heart_problems', defaults['previous_heart_problems']) else 0,
-            
-            # Category 5: Additional conditions
-            1 if features_dict.get('diabetes', defaults['diabetes']) else 0,
-            1 if features_dict.get('hypertension', defaults['hypertension']) else 0,
-            1 if features_dict.get('kidney_disease', defaults['kidney_disease']) else 0
-        ]).reshape(1, -1)
-        
-        return features_array
-    
+        return feature_encoder.encode_record(features_dict)
     except Exception as e:
         logging.error(f"Error preprocessing features: {str(e)}")
         raise
 
+def version_tag(state):
+    """model_version to store with predictions scored by state."""
+    return state.version or LOCAL_MODEL_VERSION
+
 def predict_cardio_disease(features_dict):
-    """Predict the probability of cardiovascular disease based on comprehensive symptoms."""
+    """
+    Predict the probability of cardiovascular disease based on comprehensive symptoms.
+
+    Returns:
+        tuple: (probability, label, model_version), where model_version tags
+        the model that produced the score; None if the prediction failed
+    """
     try:
-        # Make sure model is initialized
-        if not hasattr(model, 'classes_'):
-            initialize_model()
+        # Snapshot the active model so one request never mixes two versions
+        state = _ready_state()
         
         # Preprocess features with enhanced categories
+        started = time.perf_counter()
         features_array = preprocess_features(features_dict)
+        PREDICTION_STAGE.observe(time.perf_counter() - started, ('encode',))
         
-        # Get prediction probabilities
-        probabilities = model.predict_proba(features_array)[0]
+        # Identical encoded forms under the same model version share one result
+        cache_key = make_key(state.version, features_array)
+        cached = prediction_cache.get(cache_key)
+        if cached is not None:
+            PREDICTION_CACHE.inc(('hit',))
+            return (*cached, version_tag(state))
+        PREDICTION_CACHE.inc(('miss',))
+        
+        # Get prediction probabilities; with the scheduler this includes the wait for a batch
+        started = time.perf_counter()
+        if inference_scheduler is not None:
+            probabilities = inference_scheduler.submit(features_array, state)
+        else:
+            probabilities = predict_proba(features_array, state)[0]
+        PREDICTION_STAGE.observe(time.perf_counter() - started, ('inference',))
         
         # Get the probability for positive class (has cardio disease)
         positive_probability = probabilities[1] if len(probabilities) > 1 else probabilities[0]
@@ -201,36 +338,117 @@ def predict_cardio_disease(features_dict):
         # Get prediction label (0: no disease, 1: disease)
         prediction_label = 1 if positive_probability >= 0.5 else 0
         
-        # Get feature importances to provide insights
-        if hasattr(model, 'feature_importances_'):
-            # Log the top 5 influential factors for this prediction
-            feature_names = [
-                'age', 'gender', 'height', 'weight',
-                'chest_pain', 'shortness_of_breath', 'fatigue', 'palpitations', 'dizziness',
-                'systolic_bp', 'diastolic_bp', 'cholesterol', 'glucose', 'heart_rate',
-                'smoking', 'alcohol', 'physical_activity', 'high_salt_diet', 'high_fat_diet',
-                'family_history', 'genetic_disorders', 'previous_heart_problems',
-                'diabetes', 'hypertension', 'kidney_disease'
-            ]
-            
-            # Get feature importances from the model
-            importances = model.feature_importances_
-            
-            # Create tuples of (feature_name, importance) and sort by importance
-            feature_importance = [(feature_names[i], importances[i]) for i in range(len(feature_names))]
-            feature_importance.sort(key=lambda x: x[1], reverse=True)
-            
-            # Log top influential factors
-            logging.info(f"Top factors for this prediction:")
-            for feature, importance in feature_importance[:5]:
-                logging.info(f"- {feature}: {importance:.4f}")
-        
-        return float(positive_probability), bool(prediction_label)
+        result = (float(positive_probability), bool(prediction_label))
+        prediction_cache.put(cache_key, result)
+        return (*result, version_tag(state))
     
     except Exception as e:
         logging.error(f"Error predicting cardio disease: {str(e)}")
         # Return default values in case of error
-        return 0.0, False
+        return 0.0, False, None
+
+def explain_predictions(features_matrix, top_n=5, state=None):
+    """
+    Return the top risk drivers for each row of an encoded feature matrix.
+
+    Args:
+        features_matrix (np.ndarray): Encoded (N, 25) feature matrix
+        top_n (int): Number of drivers to return per row
+
+    Returns:
+        list: Per row, a list of {'feature', 'value', 'contribution'} dicts
+        ordered by how much the feature raised the predicted risk
+    """
+    compiled = (state or active_model).compiled
+    if compiled is None:
+        return [[] for _ in range(len(features_matrix))]
+
+    features_matrix = np.asarray(features_matrix).reshape(-1, len(FEATURE_NAMES))
+    positive_class = 1 if compiled.n_classes > 1 else 0
+    _, contributions = compiled.contributions(features_matrix, positive_class)
+
+    # Largest positive contributions first, selected for all rows at once
+    order = np.argsort(-contributions, axis=1)[:, :top_n]
+    top_values = np.take_along_axis(contributions, order, axis=1)
+
+    drivers = []
+    for row, columns, values in zip(features_matrix, order, top_values):
+        drivers.append([
+            {
+                'feature': FEATURE_NAMES[column],
+                'value': float(row[column]),
+                'contribution': float(value)
+            }
+            for column, value in zip(columns, values) if value > 0
+        ])
+    return drivers
+
+def explain_prediction(features_dict, top_n=5):
+    """Return the top risk drivers for a single patient."""
+    try:
+        state = _ready_state()
+        features_array = preprocess_features(features_dict)
+        return explain_predictions(features_array, top_n, state)[0]
+    except Exception as e:
+        logging.error(f"Error explaining prediction: {str(e)}")
+        return []
+
+def predict_cardio_disease_batch(features_list, explain=False):
+    """Predict cardiovascular disease for many patients with a single model call.
+
+    Args:
+        features_list (list): Feature dictionaries, one per patient
+        explain (bool): Also attach each row's top 'risk_drivers'
+
+    Returns:
+        list: One dict per input row, in input order. Scored rows carry
+        'prediction_result', 'prediction_label' and the 'model_version' of
+        the model that scored them; rows that could not be encoded carry an
+        'error' message instead.
+    """
+    results = [None] * len(features_list)
+    if not features_list:
+        return results
+
+    # Snapshot the active model so the whole batch is scored by one version
+    state = _ready_state()
+
+    # Encode the whole batch at once, retrying row by row only if some row is malformed
+    try:
+        features_matrix = feature_encoder.encode_records(features_list)
+        row_positions = list(range(len(features_list)))
+    except Exception:
+        features_matrix = feature_encoder.empty(len(features_list))
+        row_positions = []
+        for position, features_dict in enumerate(features_list):
+            try:
+                features_matrix[len(row_positions)] = feature_encoder.encode_row(features_dict)
+                row_positions.append(position)
+            except Exception as e:
+                results[position] = {'error': f"Invalid features: {str(e)}"}
+        features_matrix = features_matrix[:len(row_positions)]
+
+    if row_positions:
+        try:
+            # Score the whole (N, 25) matrix with one predict_proba call
+            probabilities = predict_proba(features_matrix, state)
+            positive_column = 1 if probabilities.shape[1] > 1 else 0
+            model_version = version_tag(state)
+            for position, positive_probability in zip(row_positions, probabilities[:, positive_column]):
+                results[position] = {
+                    'prediction_result': float(positive_probability),
+                    'prediction_label': bool(positive_probability >= 0.5),
+                    'model_version': model_version
+                }
+            if explain:
+                for position, drivers in zip(row_positions, explain_predictions(features_matrix, state=state)):
+                    results[position]['risk_drivers'] = drivers
+        except Exception as e:
+            logging.error(f"Error predicting cardio disease batch: {str(e)}")
+            for position in row_positions:
+                results[position] = {'error': 'Prediction failed'}
+
+    return results
 
-# Initialize the enhanced model when this module is imported
-initialize_model()
+# Load the published model when this module is imported; training is done by 'flask train-model'
+load_model()
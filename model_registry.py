@@ -0,0 +1,183 @@
+import os
+import json
+import hashlib
+import logging
+import shutil
+from datetime import datetime
+
+import joblib
+import numpy as np
+
+# Directory holding one sub-directory per published model version
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'model_registry')
+
+ARTIFACT_FILENAME = 'model.joblib'
+MANIFEST_FILENAME = 'manifest.json'
+CURRENT_FILENAME = 'CURRENT'
+
+class ModelNotFoundError(Exception):
+    """Raised when the registry has no artifact for the requested version."""
+
+def _registry_dir(registry_dir=None):
+    return registry_dir or REGISTRY_DIR
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def save_model(model, feature_names, metadata=None, arrays=None, registry_dir=None, make_current=True):
+    """
+    Serialize a fitted model into a new versioned registry entry.
+
+    Args:
+        model: Fitted scikit-learn estimator
+        feature_names (list): Column order the model was fitted with
+        metadata (dict): Extra fields to record in the manifest
+        arrays (dict): Named numpy arrays stored as .npy files next to the model
+        registry_dir (str): Registry location, defaults to MODEL_REGISTRY_DIR
+        make_current (bool): Point CURRENT at the new version
+
+    Returns:
+        dict: The manifest written for the new version
+    """
+    registry_dir = _registry_dir(registry_dir)
+    os.makedirs(registry_dir, exist_ok=True)
+
+    version = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
+    staging_dir = os.path.join(registry_dir, f".staging-{version}")
+    os.makedirs(staging_dir)
+
+    try:
+        # Uncompressed so numpy arrays can be memory-mapped on load
+        artifact_path = os.path.join(staging_dir, ARTIFACT_FILENAME)
+        joblib.dump(model, artifact_path)
+
+        array_files = {}
+        for name, array in (arrays or {}).items():
+            filename = f"{name}.npy"
+            np.save(os.path.join(staging_dir, filename), np.ascontiguousarray(array))
+            array_files[name] = filename
+
+        manifest = {
+            'version': version,
+            'sha256': _sha256(artifact_path),
+            'feature_names': list(feature_names),
+            'model_class': type(model).__name__,
+            'arrays': array_files,
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        manifest.update(metadata or {})
+        _write_atomic(os.path.join(staging_dir, MANIFEST_FILENAME), json.dumps(manifest, indent=2))
+
+        # Publishing is a single rename, so readers never see a partial version
+        os.rename(staging_dir, os.path.join(registry_dir, version))
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    if make_current:
+        set_current_version(version, registry_dir)
+
+    logging.info(f"Saved model version {version} to {registry_dir}")
+    return manifest
+
+def set_current_version(version, registry_dir=None):
+    """Point the registry's CURRENT marker at an existing version."""
+    registry_dir = _registry_dir(registry_dir)
+    if not os.path.isfile(os.path.join(registry_dir, version, MANIFEST_FILENAME)):
+        raise ModelNotFoundError(f"Model version {version} not found in {registry_dir}")
+    _write_atomic(os.path.join(registry_dir, CURRENT_FILENAME), version)
+
+def get_current_version(registry_dir=None):
+    """Return the version CURRENT points at, or None for an empty registry."""
+    path = os.path.join(_registry_dir(registry_dir), CURRENT_FILENAME)
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def list_versions(registry_dir=None):
+    """Return all published versions, oldest first."""
+    registry_dir = _registry_dir(registry_dir)
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.isfile(os.path.join(registry_dir, name, MANIFEST_FILENAME))
+    )
+
+def read_manifest(version, registry_dir=None):
+    path = os.path.join(_registry_dir(registry_dir), version, MANIFEST_FILENAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise ModelNotFoundError(f"Model version {version} not found")
+
+def _load_arrays(version_dir, manifest, mmap_mode):
+    return {
+        name: np.load(os.path.join(version_dir, filename), mmap_mode=mmap_mode)
+        for name, filename in manifest.get('arrays', {}).items()
+    }
+
+def load_model(version=None, registry_dir=None, mmap=True, verify=True):
+    """
+    Load a model artifact from the registry.
+
+    Args:
+        version (str): Version to load, defaults to CURRENT
+        registry_dir (str): Registry location, defaults to MODEL_REGISTRY_DIR
+        mmap (bool): Memory-map numpy arrays read-only so forked workers share pages
+        verify (bool): Check the artifact against the manifest's content hash
+
+    Returns:
+        tuple: (model, manifest, arrays) where arrays maps names to numpy arrays
+    """
+    registry_dir = _registry_dir(registry_dir)
+    version = version or get_current_version(registry_dir)
+    if not version:
+        raise ModelNotFoundError(f"No model has been published to {registry_dir}")
+
+    manifest = read_manifest(version, registry_dir)
+    version_dir = os.path.join(registry_dir, version)
+    artifact_path = os.path.join(version_dir, ARTIFACT_FILENAME)
+
+    if verify and _sha256(artifact_path) != manifest['sha256']:
+        raise ValueError(f"Model artifact {artifact_path} does not match its manifest hash")
+
+    mmap_mode = 'r' if mmap else None
+    model = joblib.load(artifact_path, mmap_mode=mmap_mode)
+    arrays = _load_arrays(version_dir, manifest, mmap_mode)
+
+    return model, manifest, arrays
+
+def load_arrays(version=None, registry_dir=None):
+    """
+    Load only the named numpy arrays of a version, memory-mapped read-only.
+
+    Cheaper than load_model() for processes that never touch the estimator,
+    such as offline scoring workers.
+
+    Returns:
+        tuple: (manifest, arrays)
+    """
+    registry_dir = _registry_dir(registry_dir)
+    version = version or get_current_version(registry_dir)
+    if not version:
+        raise ModelNotFoundError(f"No model has been published to {registry_dir}")
+
+    manifest = read_manifest(version, registry_dir)
+    arrays = _load_arrays(os.path.join(registry_dir, version), manifest, 'r')
+    return manifest, arrays
@@ -1,7 +1,11 @@
 from app import db
+from sqlalchemy import event, select, text, and_
+from sqlalchemy.ext.hybrid import hybrid_property
 from flask_login import UserMixin
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from prediction_flags import FLAG_BITS, flag_values, required_masks, superset_values
+from serializers import RowSerializer, Field, VALUE, CSV_LIST
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -45,16 +49,37 @@ class Doctor(db.Model):
     available_days = db.Column(db.String(100), nullable=True)  # Comma-separated days
     available_hours = db.Column(db.String(100), nullable=True)  # Comma-separated hours
     
+    __table_args__ = (
+        db.Index('ix_doctor_user_id', 'user_id'),
+    )
+    
     # Define relationships
     appointments = db.relationship('Appointment', backref='doctor', lazy=True)
+    user = db.relationship('User', lazy=True)
     
-    def to_dict(self):
-        user = User.query.get(self.user_id)
+    @classmethod
+    def serialize_list(cls, *criteria):
+        """
+        Serialize doctors matching criteria with their user's name and email
+        in one Core query, as to_dict() would.
+        """
+        rows = db.session.execute(
+            select(*DOCTOR_SERIALIZER.columns)
+            .outerjoin(User, User.id == cls.user_id)
+            .where(*criteria)
+            .order_by(cls.id)
+        )
+        return list(DOCTOR_SERIALIZER.serialize_rows(rows))
+    
+    def to_dict(self, full_name=None, email=None):
+        # Callers that already fetched the user's columns pass them in; otherwise use the relationship
+        if full_name is None and email is None and self.user is not None:
+            full_name, email = self.user.full_name, self.user.email
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'full_name': user.full_name if user else None,
-            'email': user.email if user else None,
+            'full_name': full_name,
+            'email': email,
             'specialization': self.specialization,
             'experience_years': self.experience_years,
             'bio': self.bio,
@@ -62,6 +87,22 @@ class Doctor(db.Model):
             'available_hours': self.available_hours.split(',') if self.available_hours else []
         }
 
+def flag_property(name):
+    """Boolean attribute stored as one bit of a packed flag column (see prediction_flags)."""
+    column, bit = FLAG_BITS[name]
+
+    def get_flag(self):
+        return bool((getattr(self, column) or 0) & bit)
+
+    def set_flag(self, value):
+        current = getattr(self, column) or 0
+        setattr(self, column, current | bit if value else current & ~bit)
+
+    def flag_expression(cls):
+        return getattr(cls, column).op('&')(bit) != 0
+
+    return hybrid_property(get_flag, set_flag, expr=flag_expression)
+
 class Prediction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -73,16 +114,16 @@ class Prediction(db.Model):
     weight = db.Column(db.Float, nullable=False)  # in kg
     
     # Category 1: Clinical Symptoms
-    chest_pain = db.Column(db.Boolean, default=False)
-    shortness_of_breath = db.Column(db.Boolean, default=False)
-    fatigue = db.Column(db.Boolean, default=False)
-    palpitations = db.Column(db.Boolean, default=False)
-    dizziness = db.Column(db.Boolean, default=False)
-    swelling = db.Column(db.Boolean, default=False)
-    nausea = db.Column(db.Boolean, default=False)
-    cold_sweats = db.Column(db.Boolean, default=False)
-    pain_jaw_neck_back = db.Column(db.Boolean, default=False)
-    left_arm_pain = db.Column(db.Boolean, default=False)
+    chest_pain = flag_property('chest_pain')
+    shortness_of_breath = flag_property('shortness_of_breath')
+    fatigue = flag_property('fatigue')
+    palpitations = flag_property('palpitations')
+    dizziness = flag_property('dizziness')
+    swelling = flag_property('swelling')
+    nausea = flag_property('nausea')
+    cold_sweats = flag_property('cold_sweats')
+    pain_jaw_neck_back = flag_property('pain_jaw_neck_back')
+    left_arm_pain = flag_property('left_arm_pain')
     
     # Category 2: Physiological and Medical Indicators
     systolic_bp = db.Column(db.Integer, nullable=False)  # upper blood pressure
@@ -97,34 +138,75 @@ class Prediction(db.Model):
     c_reactive_protein = db.Column(db.Float, nullable=True)
     
     # Category 3: Lifestyle and Behavioral Risk Factors
-    smoking = db.Column(db.Boolean, nullable=False)
-    alcohol = db.Column(db.Boolean, nullable=False)
-    physical_activity = db.Column(db.Boolean, nullable=False)
-    high_salt_diet = db.Column(db.Boolean, default=False)
-    high_fat_diet = db.Column(db.Boolean, default=False)
+    smoking = flag_property('smoking')
+    alcohol = flag_property('alcohol')
+    physical_activity = flag_property('physical_activity')
+    high_salt_diet = flag_property('high_salt_diet')
+    high_fat_diet = flag_property('high_fat_diet')
     sleep_hours = db.Column(db.Float, nullable=True)  # hours per day
     stress_level = db.Column(db.Integer, nullable=True)  # 1-10 scale
     work_hours = db.Column(db.Integer, nullable=True)  # hours per week
     
     # Category 4: Genetic and Family History
-    family_history = db.Column(db.Boolean, default=False)
-    genetic_disorders = db.Column(db.Boolean, default=False)
-    previous_heart_problems = db.Column(db.Boolean, default=False)
+    family_history = flag_property('family_history')
+    genetic_disorders = flag_property('genetic_disorders')
+    previous_heart_problems = flag_property('previous_heart_problems')
     
     # Category 5: Additional Risk Conditions
-    diabetes = db.Column(db.Boolean, default=False)
-    hypertension = db.Column(db.Boolean, default=False)
-    kidney_disease = db.Column(db.Boolean, default=False)
-    thyroid_disorders = db.Column(db.Boolean, default=False)
-    anemia = db.Column(db.Boolean, default=False)
-    autoimmune_disorders = db.Column(db.Boolean, default=False)
-    metabolic_syndrome = db.Column(db.Boolean, default=False)
+    diabetes = flag_property('diabetes')
+    hypertension = flag_property('hypertension')
+    kidney_disease = flag_property('kidney_disease')
+    thyroid_disorders = flag_property('thyroid_disorders')
+    anemia = flag_property('anemia')
+    autoimmune_disorders = flag_property('autoimmune_disorders')
+    metabolic_syndrome = flag_property('metabolic_syndrome')
+    
+    # Flag storage: one bitset per category, bit order in prediction_flags.FLAG_CATEGORIES
+    symptom_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    lifestyle_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    history_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    condition_flags = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Prediction Results
     prediction_result = db.Column(db.Float, nullable=False)  # Probability of cardio disease
     prediction_label = db.Column(db.Boolean, nullable=False)  # 0: no disease, 1: disease
+    model_version = db.Column(db.String(40), nullable=True)  # registry version that scored this row
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Prediction history is listed per user, newest first, paged on (created_at, id)
+    __table_args__ = (
+        db.Index('ix_prediction_user_created', 'user_id', 'created_at', 'id'),
+        # Cohort filters on the two largest categories, see has_flags()
+        db.Index('ix_prediction_symptom_flags', 'symptom_flags'),
+        db.Index('ix_prediction_condition_flags', 'condition_flags'),
+    )
+    
+    @classmethod
+    def list_statement(cls, *criteria):
+        """Core SELECT of plain prediction columns; rows are consumed by serialize_rows()."""
+        return select(*PREDICTION_SERIALIZER.columns).where(*criteria)
+    
+    @staticmethod
+    def serialize_rows(rows):
+        """Yield to_dict() output for rows of list_statement(), without loading instances."""
+        return PREDICTION_SERIALIZER.serialize_rows(rows)
+    
+    @classmethod
+    def has_flags(cls, *names):
+        """
+        Criterion for predictions with every named flag set, e.g.
+        has_flags('chest_pain', 'diabetes').
+
+        Each category is matched with IN over the column values that contain
+        its required bits (at most 512, for one of the ten symptom flags),
+        so the flag column indexes answer it with index seeks rather than a
+        bitwise test on every row.
+        """
+        return and_(*(
+            getattr(cls, column).in_(superset_values(column, mask))
+            for column, mask in required_masks(names).items()
+        ))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -137,16 +219,7 @@ class Prediction(db.Model):
             'weight': self.weight,
             
             # Category 1: Clinical Symptoms
-            'chest_pain': self.chest_pain,
-            'shortness_of_breath': self.shortness_of_breath,
-            'fatigue': self.fatigue,
-            'palpitations': self.palpitations,
-            'dizziness': self.dizziness,
-            'swelling': self.swelling,
-            'nausea': self.nausea,
-            'cold_sweats': self.cold_sweats,
-            'pain_jaw_neck_back': self.pain_jaw_neck_back,
-            'left_arm_pain': self.left_arm_pain,
+            **flag_values('symptom_flags', self.symptom_flags),
             
             # Category 2: Physiological and Medical Indicators
             'systolic_bp': self.systolic_bp,
@@ -161,32 +234,21 @@ class Prediction(db.Model):
             'c_reactive_protein': self.c_reactive_protein,
             
             # Category 3: Lifestyle and Behavioral Risk Factors
-            'smoking': self.smoking,
-            'alcohol': self.alcohol,
-            'physical_activity': self.physical_activity,
-            'high_salt_diet': self.high_salt_diet,
-            'high_fat_diet': self.high_fat_diet,
+            **flag_values('lifestyle_flags', self.lifestyle_flags),
             'sleep_hours': self.sleep_hours,
             'stress_level': self.stress_level,
             'work_hours': self.work_hours,
             
             # Category 4: Genetic and Family History
-            'family_history': self.family_history,
-            'genetic_disorders': self.genetic_disorders,
-            'previous_heart_problems': self.previous_heart_problems,
+            **flag_values('history_flags', self.history_flags),
             
             # Category 5: Additional Risk Conditions
-            'diabetes': self.diabetes,
-            'hypertension': self.hypertension,
-            'kidney_disease': self.kidney_disease,
-            'thyroid_disorders': self.thyroid_disorders,
-            'anemia': self.anemia,
-            'autoimmune_disorders': self.autoimmune_disorders,
-            'metabolic_syndrome': self.metabolic_syndrome,
+            **flag_values('condition_flags', self.condition_flags),
             
             # Prediction Results
             'prediction_result': self.prediction_result,
             'prediction_label': self.prediction_label,
+            'model_version': self.model_version,
             'created_at': self.created_at.isoformat()
         }
 
@@ -204,19 +266,63 @@ class Appointment(db.Model):
     payment_amount = db.Column(db.Float, default=0.0)
     payment_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reminder_sent_at = db.Column(db.DateTime, nullable=True)  # when reminders.py queued its reminder
     
-    def to_dict(self):
-        user = User.query.get(self.user_id)
-        doctor_model = Doctor.query.get(self.doctor_id)
-        doctor_user = User.query.get(doctor_model.user_id) if doctor_model else None
+    # Patient and doctor schedules are listed newest first, paged on (appointment_date, id)
+    __table_args__ = (
+        db.Index('ix_appointment_user_date', 'user_id', 'appointment_date', 'id'),
+        db.Index('ix_appointment_doctor_date', 'doctor_id', 'appointment_date', 'id'),
+        # At most one active appointment per doctor and slot; enforced by the database so
+        # concurrent bookings of the same slot cannot both commit
+        db.Index(
+            'uq_appointment_doctor_slot', 'doctor_id', 'appointment_date', 'appointment_time',
+            unique=True,
+            sqlite_where=text("status IS NULL OR status != 'cancelled'"),
+            postgresql_where=text("status IS NULL OR status != 'cancelled'")
+        ),
+        # Upcoming appointments still owed a reminder, scanned by date; shrinks as reminders go out
+        db.Index(
+            'ix_appointment_reminder_due', 'appointment_date', 'id', 'status',
+            sqlite_where=text('reminder_sent_at IS NULL'),
+            postgresql_where=text('reminder_sent_at IS NULL')
+        ),
+    )
+    
+    @classmethod
+    def list_statement(cls, *criteria):
+        """
+        Core SELECT for appointments matching criteria, with patient name,
+        doctor name and specialization projected through joins instead of
+        being looked up per row. Rows are consumed by serialize_rows().
+        """
+        return (
+            select(*APPOINTMENT_SERIALIZER.columns)
+            .outerjoin(_patient, _patient.c.id == cls.user_id)
+            .outerjoin(Doctor, Doctor.id == cls.doctor_id)
+            .outerjoin(_doctor_user, _doctor_user.c.id == Doctor.user_id)
+            .where(*criteria)
+        )
+    
+    @staticmethod
+    def serialize_rows(rows):
+        """Yield to_dict() output for rows of list_statement(), without loading instances."""
+        return APPOINTMENT_SERIALIZER.serialize_rows(rows)
+    
+    def to_dict(self, patient_name=None, doctor_name=None, specialization=None):
+        # Single-object callers fall back to the (lazy) relationships
+        if patient_name is None and self.user is not None:
+            patient_name = self.user.full_name
+        if specialization is None and self.doctor is not None:
+            specialization = self.doctor.specialization
+            doctor_name = self.doctor.user.full_name if self.doctor.user else None
         
         return {
             'id': self.id,
             'user_id': self.user_id,
             'doctor_id': self.doctor_id,
-            'patient_name': user.full_name if user else None,
-            'doctor_name': doctor_user.full_name if doctor_user else None,
-            'specialization': doctor_model.specialization if doctor_model else None,
+            'patient_name': patient_name,
+            'doctor_name': doctor_name,
+            'specialization': specialization,
             'appointment_date': self.appointment_date.isoformat() if self.appointment_date else None,
             'appointment_time': self.appointment_time,
             'reason': self.reason,
@@ -228,3 +334,73 @@ class Appointment(db.Model):
             'payment_date': self.payment_date.isoformat() if self.payment_date else None,
             'created_at': self.created_at.isoformat()
         }
+
+@event.listens_for(Appointment.appointment_date, 'set')
+@event.listens_for(Appointment.appointment_time, 'set')
+def _reset_reminder(target, value, oldvalue, initiator):
+    # A rescheduled appointment re-enters ix_appointment_reminder_due and is reminded of its new slot
+    if value != oldvalue:
+        target.reminder_sent_at = None
+
+class PredictionRollup(db.Model):
+    """Risk-score histogram counts per day, age band and gender, maintained by analytics.py."""
+    day = db.Column(db.Date, primary_key=True)
+    age_band = db.Column(db.Integer, primary_key=True)  # lower bound of a 10-year band, 80 means 80+
+    gender = db.Column(db.String(10), primary_key=True)
+    risk_bucket = db.Column(db.Integer, primary_key=True)  # 0-9, tenths of prediction_result
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class AppointmentRollup(db.Model):
+    """Appointment counts per appointment day, doctor and status, maintained by analytics.py."""
+    day = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class OutboxMessage(db.Model):
+    """Email written in the same transaction as the change that triggers it, delivered by outbox.py."""
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(200), unique=True, nullable=False)
+    kind = db.Column(db.String(50), nullable=False, default='email')
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    substitutions = db.Column(db.Text, nullable=True)  # JSON {tag: value} for the tags in subject and body
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)  # lease of the worker currently sending it
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    # Workers claim due messages in next_attempt_at order
+    __table_args__ = (
+        db.Index('ix_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+# Row serializers for the Core list queries above; keys and values match each to_dict()
+PREDICTION_SERIALIZER = RowSerializer.for_table(Prediction.__table__)
+
+_patient = User.__table__.alias('patient')
+_doctor_user = User.__table__.alias('doctor_user')
+APPOINTMENT_SERIALIZER = RowSerializer.for_table(Appointment.__table__, [
+    Field('patient_name', _patient.c.full_name, VALUE),
+    Field('doctor_name', _doctor_user.c.full_name, VALUE),
+    Field('specialization', Doctor.__table__.c.specialization, VALUE),
+], exclude=('reminder_sent_at',))
+
+_doctor = Doctor.__table__
+DOCTOR_SERIALIZER = RowSerializer([
+    Field('id', _doctor.c.id, VALUE),
+    Field('user_id', _doctor.c.user_id, VALUE),
+    Field('full_name', User.__table__.c.full_name, VALUE),
+    Field('email', User.__table__.c.email, VALUE),
+    Field('specialization', _doctor.c.specialization, VALUE),
+    Field('experience_years', _doctor.c.experience_years, VALUE),
+    Field('bio', _doctor.c.bio, VALUE),
+    Field('available_days', _doctor.c.available_days, CSV_LIST),
+    Field('available_hours', _doctor.c.available_hours, CSV_LIST),
+])
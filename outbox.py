@@ -0,0 +1,523 @@
+"""
+Transactional email outbox.
+
+Requests never talk to the email provider. enqueue_email() adds a row to
+email_outbox through the caller's session, so the message commits or
+rolls back with the change that triggered it. A key that is already
+queued is ignored, which makes enqueueing idempotent.
+
+A message may keep its per-recipient values as substitution tags (see
+email_templates.personalize()) with the values stored alongside. The
+SendGrid transport then sends every message of a batch that shares a
+subject and body in one request. The other transports fill the tags in
+before sending.
+
+A pool of background workers drains the outbox:
+- A worker claims a batch of due messages by moving them to 'sending'
+  under a lease. On PostgreSQL, SKIP LOCKED lets several processes drain
+  in parallel.
+- The batch is handed to the configured transport.
+- Each message is then marked sent, or rescheduled with exponential
+  backoff and jitter. After EMAIL_MAX_ATTEMPTS it moves to 'dead'.
+- If a worker dies mid-batch, its lease expires and the messages are
+  claimed again.
+
+Delivery is at-least-once. Transports receive the idempotency key so the
+receiving side can drop duplicates.
+
+Sent messages are deleted EMAIL_OUTBOX_RETENTION_HOURS after delivery, so
+the table holds the backlog and recent history rather than every email
+ever sent. A key can be queued again once its row is purged.
+
+EMAIL_TRANSPORT selects the transport:
+- sendgrid (default): the production provider
+- file: writes each message as JSON under EMAIL_OUTBOX_DIR
+- smtp: any SMTP server, e.g. a local debugging server in tests
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import smtplib
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+from sqlalchemy import event, select, update, func, and_, or_, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import app, db
+from models import OutboxMessage
+from email_templates import apply_substitutions
+import metrics
+
+# Outbox configuration, overridable from the environment
+EMAIL_TRANSPORT = os.environ.get('EMAIL_TRANSPORT', 'sendgrid')
+OUTBOX_IN_PROCESS = os.environ.get('EMAIL_OUTBOX_IN_PROCESS', '1').lower() in ('1', 'true', 'yes')
+OUTBOX_WORKERS = int(os.environ.get('EMAIL_OUTBOX_WORKERS', 2))
+OUTBOX_BATCH_SIZE = int(os.environ.get('EMAIL_OUTBOX_BATCH_SIZE', 50))
+OUTBOX_POLL_INTERVAL = float(os.environ.get('EMAIL_OUTBOX_POLL_INTERVAL', 1.0))
+OUTBOX_LEASE_SECONDS = float(os.environ.get('EMAIL_OUTBOX_LEASE_SECONDS', 60))
+MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 8))
+RETRY_BASE_SECONDS = float(os.environ.get('EMAIL_RETRY_BASE_SECONDS', 5))
+RETRY_MAX_SECONDS = float(os.environ.get('EMAIL_RETRY_MAX_SECONDS', 3600))
+OUTBOX_RETENTION_HOURS = float(os.environ.get('EMAIL_OUTBOX_RETENTION_HOURS', 168))
+
+# How often a worker pool purges old sent messages
+PURGE_INTERVAL_SECONDS = 3600
+
+# One claimed message as handed to a transport
+OutboundEmail = namedtuple(
+    'OutboundEmail', ['id', 'idempotency_key', 'recipient', 'subject', 'body', 'substitutions', 'attempts']
+)
+
+def _key_digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+class SendGridTransport:
+    """Deliver through the pooled SendGrid client; identical messages share one request."""
+
+    def send_batch(self, messages):
+        from email_service import OutgoingEmail, send_many
+        return send_many([
+            OutgoingEmail(m.recipient, m.subject, m.body, m.substitutions, {'idempotency_key': m.idempotency_key})
+            for m in messages
+        ])
+
+class FileTransport:
+    """Write each message to <directory>/<key digest>.json; resending a key overwrites the same file."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get('EMAIL_OUTBOX_DIR', 'outbox_mail')
+        os.makedirs(self.directory, exist_ok=True)
+
+    def send_batch(self, messages):
+        errors = []
+        for message in messages:
+            path = os.path.join(self.directory, f"{_key_digest(message.idempotency_key)}.json")
+            try:
+                with open(f"{path}.tmp", 'w') as f:
+                    json.dump({
+                        'idempotency_key': message.idempotency_key,
+                        'to': message.recipient,
+                        'subject': apply_substitutions(message.subject, message.substitutions),
+                        'body': apply_substitutions(message.body, message.substitutions),
+                    }, f)
+                os.replace(f"{path}.tmp", path)
+                errors.append(None)
+            except OSError as e:
+                errors.append(str(e))
+        return errors
+
+class SMTPTransport:
+    """Deliver through an SMTP server over one connection per batch."""
+
+    def __init__(self, host=None, port=None, username=None, password=None, starttls=None, sender=None):
+        self.host = host or os.environ.get('SMTP_HOST', 'localhost')
+        self.port = int(port or os.environ.get('SMTP_PORT', 25))
+        self.username = username or os.environ.get('SMTP_USERNAME')
+        self.password = password or os.environ.get('SMTP_PASSWORD')
+        self.starttls = starttls if starttls is not None else os.environ.get('SMTP_STARTTLS', '').lower() in ('1', 'true', 'yes')
+        self.sender = sender or os.environ.get('VERIFIED_SENDER_EMAIL', 'noreply@smarthealth.app')
+
+    def _message(self, message):
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = message.recipient
+        email['Subject'] = apply_substitutions(message.subject, message.substitutions)
+        # A stable Message-ID lets mail servers and clients collapse redeliveries
+        email['Message-ID'] = f"<{_key_digest(message.idempotency_key)}@{self.sender.split('@')[-1]}>"
+        email['X-Idempotency-Key'] = message.idempotency_key
+        email.set_content(apply_substitutions(message.body, message.substitutions))
+        return email
+
+    def send_batch(self, messages):
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=30) as server:
+                if self.starttls:
+                    server.starttls()
+                if self.username:
+                    server.login(self.username, self.password)
+                errors = []
+                for message in messages:
+                    try:
+                        server.send_message(self._message(message))
+                        errors.append(None)
+                    except smtplib.SMTPException as e:
+                        errors.append(str(e))
+                return errors
+        except (OSError, smtplib.SMTPException) as e:
+            return [str(e)] * len(messages)
+
+# Transport name -> factory; register others with TRANSPORTS['name'] = factory
+TRANSPORTS = {
+    'sendgrid': SendGridTransport,
+    'file': FileTransport,
+    'smtp': SMTPTransport,
+}
+
+def transport_from_env(name=None):
+    name = name or EMAIL_TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown email transport '{name}'; choose from {', '.join(TRANSPORTS)}")
+    return TRANSPORTS[name]()
+
+def _insert_ignoring_duplicates(connection):
+    table = OutboxMessage.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing(index_elements=['idempotency_key'])
+    raise NotImplementedError(f"The email outbox does not support the {dialect} dialect")
+
+def enqueue_email(recipient, subject, body, idempotency_key=None, kind='email', session=None, substitutions=None):
+    """
+    Queue an email in the caller's transaction.
+
+    Args:
+        idempotency_key (str): Messages with a key already in the outbox are
+            dropped; defaults to a digest of recipient, subject, body and substitutions
+        kind (str): Label for monitoring, e.g. 'appointment_confirmation'
+        substitutions (dict): Values of the substitution tags in subject and body
+
+    Returns:
+        str: The idempotency key
+    """
+    session = session or db.session
+    if idempotency_key is None:
+        content = f"{recipient}|{subject}|{body}|{json.dumps(substitutions, sort_keys=True)}"
+        idempotency_key = f"{kind}:{hashlib.sha256(content.encode()).hexdigest()}"
+    enqueue_emails(session.connection(), [(idempotency_key, recipient, subject, body, substitutions)], kind)
+    session.info['outbox_enqueued'] = True
+    return idempotency_key
+
+def enqueue_emails(connection, messages, kind='email'):
+    """
+    Queue many emails with one statement on a Core connection, in its transaction.
+
+    Callers that bypass the session wake the worker pool themselves after committing.
+
+    Args:
+        messages (list): (idempotency key, recipient, subject, body, substitutions)
+            tuples; substitutions may be None. Keys already in the outbox are skipped
+    """
+    if not messages:
+        return
+    now = datetime.utcnow()
+    connection.execute(_insert_ignoring_duplicates(connection), [
+        {
+            'idempotency_key': key, 'kind': kind, 'recipient': recipient, 'subject': subject, 'body': body,
+            'substitutions': json.dumps(substitutions) if substitutions else None,
+            'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now
+        }
+        for key, recipient, subject, body, substitutions in messages
+    ])
+
+def backoff_seconds(attempts):
+    """Delay before the next attempt after `attempts` failures, with jitter in [50%, 100%]."""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def _claimable(table, now):
+    return or_(
+        and_(table.c.status == 'pending', table.c.next_attempt_at <= now),
+        # Lease ran out: the worker sending it died or hung
+        and_(table.c.status == 'sending', table.c.locked_until < now),
+    )
+
+def claim_batch(connection, batch_size=OUTBOX_BATCH_SIZE, lease_seconds=OUTBOX_LEASE_SECONDS):
+    """Move up to batch_size due messages to 'sending' under a lease and return them."""
+    table = OutboxMessage.__table__
+    now = datetime.utcnow()
+    due = select(table.c.id).where(_claimable(table, now)).order_by(table.c.next_attempt_at).limit(batch_size)
+    if connection.dialect.name == 'postgresql':
+        due = due.with_for_update(skip_locked=True)
+    # The claimable condition is re-checked so two workers never claim the same row
+    rows = connection.execute(
+        update(table)
+        .where(table.c.id.in_(due.scalar_subquery()), _claimable(table, now))
+        .values(status='sending', locked_until=now + timedelta(seconds=lease_seconds), attempts=table.c.attempts + 1)
+        .returning(
+            table.c.id, table.c.idempotency_key, table.c.recipient, table.c.subject, table.c.body,
+            table.c.substitutions, table.c.attempts
+        )
+    ).all()
+    return [
+        OutboundEmail(row_id, key, recipient, subject, body, json.loads(substitutions) if substitutions else None, attempts)
+        for row_id, key, recipient, subject, body, substitutions, attempts in rows
+    ]
+
+def record_results(connection, messages, errors):
+    """
+    Mark delivered messages sent and reschedule or dead-letter the rest.
+
+    Returns:
+        tuple: (sent, retried, dead) counts
+    """
+    table = OutboxMessage.__table__
+    now = datetime.utcnow()
+    sent, retries, dead = [], [], []
+    for message, error in zip(messages, errors):
+        if error is None:
+            sent.append({'b_id': message.id})
+        elif message.attempts >= MAX_ATTEMPTS:
+            dead.append({'b_id': message.id, 'b_error': error})
+        else:
+            retries.append({
+                'b_id': message.id, 'b_error': error,
+                'b_next': now + timedelta(seconds=backoff_seconds(message.attempts))
+            })
+    if sent:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id'))
+            .values(status='sent', sent_at=now, locked_until=None, last_error=None),
+            sent
+        )
+    if retries:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id'))
+            .values(status='pending', next_attempt_at=bindparam('b_next'), locked_until=None,
+                    last_error=bindparam('b_error')),
+            retries
+        )
+    if dead:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('b_id'))
+            .values(status='dead', locked_until=None, last_error=bindparam('b_error')),
+            dead
+        )
+        for row in dead:
+            logging.error(f"Email outbox message {row['b_id']} dead-lettered after {MAX_ATTEMPTS} attempts: {row['b_error']}")
+    return len(sent), len(retries), len(dead)
+
+def deliver_batch(transport, batch_size=OUTBOX_BATCH_SIZE):
+    """
+    Claim, send and record one batch.
+
+    Claiming and recording are separate short transactions, so no lock is
+    held while the transport talks to the provider.
+
+    Returns:
+        tuple: (claimed, sent, retried, dead) counts
+    """
+    with db.engine.begin() as connection:
+        messages = claim_batch(connection, batch_size)
+    if not messages:
+        return 0, 0, 0, 0
+    try:
+        errors = transport.send_batch(messages)
+    except Exception as e:
+        logging.error(f"Email transport error: {str(e)}")
+        errors = [str(e)] * len(messages)
+    with db.engine.begin() as connection:
+        return (len(messages), *record_results(connection, messages, errors))
+
+def retry_dead(connection):
+    """Give every dead-lettered message a fresh attempt budget; returns how many were requeued."""
+    table = OutboxMessage.__table__
+    return connection.execute(
+        update(table).where(table.c.status == 'dead')
+        .values(status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+    ).rowcount
+
+def purge_sent(retention_hours=OUTBOX_RETENTION_HOURS, chunk_size=1000, engine=None):
+    """
+    Delete messages sent more than retention_hours ago, chunk_size rows per transaction.
+
+    Returns:
+        int: Messages deleted
+    """
+    engine = engine or db.engine
+    table = OutboxMessage.__table__
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    expired = (
+        select(table.c.id)
+        .where(table.c.status == 'sent', table.c.sent_at < cutoff)
+        .limit(chunk_size)
+        .scalar_subquery()
+    )
+    deleted = 0
+    while True:
+        with engine.begin() as connection:
+            count = connection.execute(table.delete().where(table.c.id.in_(expired))).rowcount
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+def queue_stats(connection=None):
+    """
+    Outbox depth and lag from the database, across all workers.
+
+    lag_seconds is how long the oldest due message has been waiting for a worker.
+    """
+    table = OutboxMessage.__table__
+    now = datetime.utcnow()
+
+    def collect(connection):
+        counts = dict(connection.execute(select(table.c.status, func.count()).group_by(table.c.status)).all())
+        oldest_due = connection.execute(
+            select(func.min(table.c.next_attempt_at)).where(table.c.status == 'pending', table.c.next_attempt_at <= now)
+        ).scalar()
+        oldest_unsent = connection.execute(
+            select(func.min(table.c.created_at)).where(table.c.status.in_(('pending', 'sending')))
+        ).scalar()
+        return {
+            'pending': counts.get('pending', 0),
+            'sending': counts.get('sending', 0),
+            'sent': counts.get('sent', 0),
+            'dead': counts.get('dead', 0),
+            'lag_seconds': (now - oldest_due).total_seconds() if oldest_due else 0.0,
+            'oldest_unsent_seconds': (now - oldest_unsent).total_seconds() if oldest_unsent else 0.0,
+        }
+
+    if connection is not None:
+        return collect(connection)
+    with db.engine.connect() as connection:
+        return collect(connection)
+
+class OutboxWorkerPool:
+    """
+    Background threads draining the outbox.
+
+    Each worker delivers batches back to back while there are full ones,
+    then sleeps until woken by a commit that enqueued mail or until the
+    poll interval passes. While idle, one worker purges old sent messages
+    every PURGE_INTERVAL_SECONDS. Threads do not survive fork, so each
+    process starts its own pool on first use.
+    """
+
+    def __init__(self, n_workers=OUTBOX_WORKERS, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL, transport=None):
+        self.n_workers = max(1, n_workers)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.transport = transport
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._last_purge = None
+
+        self.batches = 0
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.errors = 0
+        self.purged = 0
+
+    def start(self):
+        if self._pid == os.getpid() and any(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and any(thread.is_alive() for thread in self._threads):
+                return
+            if self.transport is None:
+                self.transport = transport_from_env()
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"email-outbox-{i}", daemon=True)
+                for i in range(self.n_workers)
+            ]
+            self._pid = os.getpid()
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        """Start the pool if needed and have an idle worker poll now."""
+        self.start()
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_once(self):
+        """Deliver one batch on the calling thread; returns the number of messages claimed."""
+        if self.transport is None:
+            self.transport = transport_from_env()
+        claimed, sent, retried, dead = deliver_batch(self.transport, self.batch_size)
+        with self._lock:
+            if claimed:
+                self.batches += 1
+            self.sent += sent
+            self.retried += retried
+            self.dead += dead
+        return claimed
+
+    def _run(self):
+        with app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    claimed = self.run_once()
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    logging.error(f"Email outbox worker error: {str(e)}")
+                    claimed = 0
+                if claimed < self.batch_size:
+                    self._purge_if_due()
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+
+    def _purge_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if self._last_purge is not None and now - self._last_purge < PURGE_INTERVAL_SECONDS:
+                return
+            self._last_purge = now
+        try:
+            purged = purge_sent()
+        except Exception as e:
+            logging.error(f"Email outbox purge error: {str(e)}")
+            return
+        with self._lock:
+            self.purged += purged
+        if purged:
+            logging.info(f"Purged {purged} sent emails older than {OUTBOX_RETENTION_HOURS:g} hours")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': sum(1 for thread in self._threads if thread.is_alive()) if self._pid == os.getpid() else 0,
+                'batches': self.batches,
+                'sent': self.sent,
+                'retried': self.retried,
+                'dead_lettered': self.dead,
+                'errors': self.errors,
+                'purged': self.purged,
+            }
+
+# Process-wide pool; started by the first request or commit that enqueues mail
+outbox_workers = OutboxWorkerPool()
+
+@app.before_request
+def _start_outbox_workers():
+    # Messages left pending by a restart are delivered without waiting for new mail
+    if OUTBOX_IN_PROCESS:
+        outbox_workers.start()
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_outbox(session):
+    if session.info.pop('outbox_enqueued', False) and OUTBOX_IN_PROCESS:
+        outbox_workers.wake()
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_outbox(session):
+    session.info.pop('outbox_enqueued', None)
+
+def _outbox_metrics():
+    stats = queue_stats()
+    return [
+        ('email_outbox_messages', 'Email outbox messages by status', 'gauge',
+         [({'status': status}, stats[status]) for status in ('pending', 'sending', 'sent', 'dead')]),
+        ('email_outbox_lag_seconds', 'Age of the oldest due outbox message', 'gauge', [({}, stats['lag_seconds'])]),
+    ]
+
+metrics.COLLECTORS.append(_outbox_metrics)
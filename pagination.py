@@ -0,0 +1,119 @@
+import os
+import json
+import base64
+
+from flask import request, jsonify, Response, stream_with_context
+from sqlalchemy import or_, and_
+
+from app import db
+from serializers import dumps, json_response
+
+# Page sizes for ?limit=; requests above the maximum are clamped
+DEFAULT_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+
+# Rows fetched per round trip and serialized per chunk when streaming
+STREAM_BATCH_SIZE = int(os.environ.get('API_STREAM_BATCH_SIZE', 500))
+
+STREAM_MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+def encode_cursor(sort_value, row_id):
+    """Opaque cursor for the position after a row, from its serialized sort value and id."""
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token, parse_value):
+    """Return (sort_value, row_id) from a cursor, with the sort value parsed by parse_value."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        return parse_value(sort_value), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('Invalid pagination cursor') from e
+
+def _page_size():
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def _stream(statement, serialize_rows, stream_format):
+    def generate():
+        # yield_per fetches through a server-side cursor where the driver supports one
+        result = db.session.execute(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+        try:
+            chunk = []
+            first = True
+            if stream_format == 'json':
+                yield b'['
+            for item in serialize_rows(result):
+                if stream_format == 'ndjson':
+                    chunk.append(dumps(item) + b'\n')
+                else:
+                    chunk.append(dumps(item) if first else b',' + dumps(item))
+                    first = False
+                if len(chunk) >= STREAM_BATCH_SIZE:
+                    yield b''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield b''.join(chunk)
+            if stream_format == 'json':
+                yield b']'
+        finally:
+            result.close()
+
+    return Response(stream_with_context(generate()), mimetype=STREAM_MIMETYPES[stream_format])
+
+def list_response(statement, sort_column, id_column, parse_value, serialize_rows):
+    """
+    Respond with a newest-first history list in one of three modes.
+
+    - Default: the whole list as a JSON array, as before.
+    - ?limit=N and/or ?cursor=C: one keyset page on (sort_column, id_column),
+      returned as {'items': [...], 'next_cursor': C or null}.
+    - ?stream=json|ndjson: the list (from ?cursor= if given) streamed
+      incrementally, so response memory does not grow with its length.
+
+    Args:
+        statement: Filtered SELECT without ORDER BY
+        sort_column: Column ordered descending, tie-broken by id_column
+        id_column: Primary key column
+        parse_value (callable): Turns the serialized sort value back into a column value
+        serialize_rows (callable): Maps a result to an iterable of dicts containing
+            sort_column.key and 'id'
+    """
+    statement = statement.order_by(sort_column.desc(), id_column.desc())
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            sort_value, row_id = decode_cursor(cursor, parse_value)
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+        statement = statement.where(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        ))
+
+    stream_format = request.args.get('stream')
+    if stream_format:
+        if stream_format not in STREAM_MIMETYPES:
+            return jsonify({'error': f"stream must be one of {', '.join(STREAM_MIMETYPES)}"}), 400
+        return _stream(statement, serialize_rows, stream_format)
+
+    if not cursor and 'limit' not in request.args:
+        return json_response(list(serialize_rows(db.session.execute(statement))))
+
+    # Fetch one extra row to learn whether another page follows
+    limit = _page_size()
+    items = list(serialize_rows(db.session.execute(statement.limit(limit + 1))))
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1][sort_column.key], items[-1]['id'])
+
+    return json_response({'items': items, 'next_cursor': next_cursor})
@@ -0,0 +1,175 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+# Cache configuration, overridable from the environment
+CACHE_MAX_ENTRIES = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+CACHE_SHARED_PATH = os.environ.get('PREDICTION_CACHE_PATH')
+
+def make_key(model_version, features_vector):
+    """Build a cache key from the model version and the encoded feature vector."""
+    digest = hashlib.blake2b(features_vector.tobytes(), digest_size=16).hexdigest()
+    return f"{model_version or 'local'}:{digest}"
+
+class SQLiteCacheBackend:
+    """
+    Prediction cache shared by every worker on the host through a local SQLite file.
+
+    Each thread keeps its own connection; WAL mode lets readers proceed while
+    another worker writes.
+    """
+
+    def __init__(self, path, ttl_seconds):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS prediction_cache ('
+            'key TEXT PRIMARY KEY, model_version TEXT, '
+            'prediction_result REAL NOT NULL, prediction_label INTEGER NOT NULL, '
+            'expires_at REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT prediction_result, prediction_label FROM prediction_cache '
+            'WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        return float(row[0]), bool(row[1])
+
+    def put(self, key, value):
+        model_version = key.split(':', 1)[0]
+        self._connection().execute(
+            'INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?)',
+            (key, model_version, value[0], int(value[1]), time.time() + self.ttl_seconds)
+        )
+
+    def retain_version(self, model_version):
+        """Drop entries written for any other model version, and expired ones."""
+        self._connection().execute(
+            'DELETE FROM prediction_cache WHERE model_version != ? OR expires_at <= ?',
+            (model_version or 'local', time.time())
+        )
+
+class PredictionCache:
+    """
+    Bounded LRU cache of (probability, label) results with per-entry TTL.
+
+    An optional shared backend is consulted on local misses so that all
+    gunicorn workers benefit from each other's results.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS, shared=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared prediction cache read failed: {str(e)}")
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._store(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared prediction cache write failed: {str(e)}")
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model_version=None):
+        """Forget every cached result; called whenever the model is retrained or swapped."""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+        if self.shared is not None:
+            try:
+                self.shared.retain_version(model_version)
+            except sqlite3.Error as e:
+                logging.warning(f"Shared prediction cache cleanup failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'shared': self.shared.path if self.shared is not None else None,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'hit_ratio': (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+def _create_default_cache():
+    shared = None
+    if CACHE_SHARED_PATH:
+        try:
+            shared = SQLiteCacheBackend(CACHE_SHARED_PATH, CACHE_TTL_SECONDS)
+        except sqlite3.Error as e:
+            logging.error(f"Could not open shared prediction cache {CACHE_SHARED_PATH}: {str(e)}")
+    return PredictionCache(shared=shared)
+
+# Process-wide cache used by ml_model.predict_cardio_disease
+prediction_cache = _create_default_cache()
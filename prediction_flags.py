@@ -0,0 +1,146 @@
+"""
+Bitset storage for the yes/no answers on a prediction.
+
+Each category of flags is packed into one integer column. Bit i of the
+column is the i-th name in the category. Prediction exposes every flag as a
+hybrid attribute, so `prediction.chest_pain` and `Prediction.chest_pain ==
+True` keep working. Bulk readers and writers (batch insert, re-scoring,
+training) use the vectorized pack/unpack helpers below instead.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+# (storage column, flag names in bit order); append new flags at the end of a category
+FLAG_CATEGORIES = (
+    ('symptom_flags', (
+        'chest_pain', 'shortness_of_breath', 'fatigue', 'palpitations', 'dizziness',
+        'swelling', 'nausea', 'cold_sweats', 'pain_jaw_neck_back', 'left_arm_pain',
+    )),
+    ('lifestyle_flags', ('smoking', 'alcohol', 'physical_activity', 'high_salt_diet', 'high_fat_diet')),
+    ('history_flags', ('family_history', 'genetic_disorders', 'previous_heart_problems')),
+    ('condition_flags', (
+        'diabetes', 'hypertension', 'kidney_disease', 'thyroid_disorders', 'anemia',
+        'autoimmune_disorders', 'metabolic_syndrome',
+    )),
+)
+
+FLAG_COLUMNS = tuple(column for column, _ in FLAG_CATEGORIES)
+FLAG_NAMES = tuple(name for _, names in FLAG_CATEGORIES for name in names)
+# Flag name -> (storage column, bit value)
+FLAG_BITS = {name: (column, 1 << i) for column, names in FLAG_CATEGORIES for i, name in enumerate(names)}
+CATEGORY_NAMES = dict(FLAG_CATEGORIES)
+
+def pack_record(record):
+    """
+    Copy of a feature dictionary with its flags replaced by the packed columns.
+
+    Missing and null flags pack as 0.
+    """
+    packed = {key: value for key, value in record.items() if key not in FLAG_BITS}
+    for column, names in FLAG_CATEGORIES:
+        value = 0
+        for i, name in enumerate(names):
+            if record.get(name):
+                value |= 1 << i
+        packed[column] = value
+    return packed
+
+@lru_cache(maxsize=None)
+def decode_table(column):
+    """Name -> bool dicts for every value of a packed column, indexed by value."""
+    names = CATEGORY_NAMES[column]
+    return tuple(
+        {name: bool(value >> i & 1) for i, name in enumerate(names)}
+        for value in range(1 << len(names))
+    )
+
+def flag_values(column, value):
+    """
+    Name -> bool for one packed column value, from a precomputed table.
+
+    The dict is shared; callers copy it (e.g. with ** unpacking) before changing it.
+    """
+    return decode_table(column)[value or 0]
+
+def pack_columns(columns, n_rows):
+    """
+    Pack flag columns (name -> sequence of truthy values) into storage columns.
+
+    Returns:
+        dict: Storage column -> int64 array; absent flags pack as 0
+    """
+    packed = {}
+    for column, names in FLAG_CATEGORIES:
+        values = np.zeros(n_rows, dtype=np.int64)
+        for i, name in enumerate(names):
+            if name in columns:
+                flags = np.fromiter((bool(v) for v in columns[name]), dtype=bool, count=n_rows)
+                values |= flags.astype(np.int64) << i
+        packed[column] = values
+    return packed
+
+def unpack_columns(columns):
+    """
+    Unpack storage columns (column -> sequence of ints) into boolean flag columns.
+
+    Returns:
+        dict: Flag name -> bool array, for every flag of the given columns
+    """
+    unpacked = {}
+    for column, values in columns.items():
+        names = CATEGORY_NAMES[column]
+        values = np.asarray([v or 0 for v in values], dtype=np.int64)
+        bits = (values[:, None] >> np.arange(len(names))) & 1
+        for i, name in enumerate(names):
+            unpacked[name] = bits[:, i].astype(bool)
+    return unpacked
+
+def split_names(names):
+    """
+    Split feature names into plain column names and the flag columns holding the rest.
+
+    Returns:
+        tuple: (plain column names, storage columns needed for the flags)
+    """
+    plain = [name for name in names if name not in FLAG_BITS]
+    needed = {FLAG_BITS[name][0] for name in names if name in FLAG_BITS}
+    return plain, [column for column in FLAG_COLUMNS if column in needed]
+
+def read_columns(rows, offset, plain, flag_columns):
+    """
+    Feature columns from rows selected as (..., *plain, *flag_columns).
+
+    Args:
+        rows (list): Result rows
+        offset (int): Position of the first feature column in each row
+
+    Returns:
+        dict: Feature name -> values, with flags unpacked to bool arrays
+    """
+    columns = {name: [row[offset + i] for row in rows] for i, name in enumerate(plain)}
+    flag_offset = offset + len(plain)
+    columns.update(unpack_columns({
+        column: [row[flag_offset + i] for row in rows] for i, column in enumerate(flag_columns)
+    }))
+    return columns
+
+def required_masks(names):
+    """
+    Bits that must be set per storage column for all the given flags.
+
+    Raises:
+        ValueError: For an unknown flag name
+    """
+    masks = {}
+    for name in names:
+        if name not in FLAG_BITS:
+            raise ValueError(f"Unknown flag '{name}'; choose from {', '.join(FLAG_NAMES)}")
+        column, bit = FLAG_BITS[name]
+        masks[column] = masks.get(column, 0) | bit
+    return masks
+
+@lru_cache(maxsize=1024)
+def superset_values(column, mask):
+    """Every value of a storage column that has all bits of mask set."""
+    return tuple(value for value in range(1 << len(CATEGORY_NAMES[column])) if value & mask == mask)
@@ -0,0 +1,178 @@
+"""
+Appointment reminder scheduler.
+
+Each run finds the active appointments that start within the next
+REMINDER_WINDOW_HOURS and have no reminder yet, and queues a reminder for
+each one in the email outbox. The outbox workers then deliver the
+reminders concurrently.
+
+The scan pages through the partial index ix_appointment_reminder_due on
+(appointment_date, id). Each page of at most REMINDER_PAGE_SIZE rows is
+handled in its own transaction:
+- the reminders are rendered
+- they are inserted into the outbox with a single statement
+- the page's appointments are stamped with reminder_sent_at
+
+Memory therefore stays bounded however many appointments are due. Each
+stamped appointment drops out of the index, so a rerun does not revisit
+it. Outbox keys are derived from the appointment and its slot, so two
+schedulers racing on the same rows still queue one reminder each.
+"""
+import os
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, and_, or_
+
+from app import db
+from models import User, Doctor, Appointment
+from email_service import personalize_appointment_reminder
+from scheduling import parse_time
+import outbox
+
+REMINDER_WINDOW_HOURS = float(os.environ.get('REMINDER_WINDOW_HOURS', 24))
+REMINDER_INTERVAL_SECONDS = float(os.environ.get('REMINDER_INTERVAL_SECONDS', 300))
+REMINDER_PAGE_SIZE = int(os.environ.get('REMINDER_PAGE_SIZE', 1000))
+
+# Appointments in these states get reminders
+REMINDER_STATUSES = ('pending', 'confirmed')
+
+ReminderRun = namedtuple('ReminderRun', [
+    'pages', 'scanned', 'queued', 'outside_window', 'elapsed_seconds',
+    'query_seconds', 'render_seconds', 'write_seconds',
+])
+
+_patient = User.__table__.alias('reminder_patient')
+_doctor_user = User.__table__.alias('reminder_doctor_user')
+
+def page_statement(start_date, end_date, after=None, limit=REMINDER_PAGE_SIZE):
+    """
+    One page of appointments owed a reminder between two dates, in index order.
+
+    Args:
+        after (tuple): (appointment_date, id) of the last row of the previous page
+    """
+    table = Appointment.__table__
+    doctor = Doctor.__table__
+    statement = (
+        select(
+            table.c.id, table.c.appointment_date, table.c.appointment_time, table.c.reason,
+            _patient.c.email, _patient.c.full_name, _doctor_user.c.full_name, doctor.c.specialization
+        )
+        .join(_patient, _patient.c.id == table.c.user_id)
+        .outerjoin(doctor, doctor.c.id == table.c.doctor_id)
+        .outerjoin(_doctor_user, _doctor_user.c.id == doctor.c.user_id)
+        .where(
+            # Matches the partial index predicate
+            table.c.reminder_sent_at.is_(None),
+            table.c.appointment_date >= start_date,
+            table.c.appointment_date <= end_date,
+            table.c.status.in_(REMINDER_STATUSES),
+        )
+        .order_by(table.c.appointment_date, table.c.id)
+        .limit(limit)
+    )
+    if after is not None:
+        last_date, last_id = after
+        statement = statement.where(or_(
+            table.c.appointment_date > last_date,
+            and_(table.c.appointment_date == last_date, table.c.id > last_id)
+        ))
+    return statement
+
+def reminder_key(appointment_id, appointment_date, appointment_time):
+    # A rescheduled appointment gets a new reminder for its new slot
+    return f"appointment-reminder:{appointment_id}:{appointment_date.isoformat()}:{appointment_time}"
+
+def queue_due_reminders(window_hours=REMINDER_WINDOW_HOURS, page_size=REMINDER_PAGE_SIZE, now=None, engine=None):
+    """
+    Queue reminders for every appointment starting in the next window_hours.
+
+    Returns:
+        ReminderRun: Counts and per-phase timings for the run
+    """
+    engine = engine or db.engine
+    now = now or datetime.now()
+    window_end = now + timedelta(hours=window_hours)
+    table = Appointment.__table__
+
+    started = time.perf_counter()
+    pages = scanned = queued = outside_window = 0
+    query_seconds = render_seconds = write_seconds = 0.0
+    after = None
+    while True:
+        phase = time.perf_counter()
+        with engine.connect() as connection:
+            rows = connection.execute(page_statement(now.date(), window_end.date(), after, page_size)).all()
+        query_seconds += time.perf_counter() - phase
+        if not rows:
+            break
+        pages += 1
+        scanned += len(rows)
+        after = (rows[-1].appointment_date, rows[-1].id)
+
+        phase = time.perf_counter()
+        messages = []
+        ids = []
+        for appointment_id, appointment_date, appointment_time, reason, email, patient_name, doctor_name, specialization in rows:
+            try:
+                starts_at = datetime.combine(appointment_date, datetime.min.time()) + timedelta(minutes=parse_time(appointment_time))
+            except ValueError:
+                logging.warning(f"Appointment {appointment_id} has an unreadable time '{appointment_time}'; no reminder sent")
+                continue
+            # The date range is coarse; the exact window is applied here
+            if not now <= starts_at <= window_end:
+                outside_window += 1
+                continue
+            # Per-patient fields stay tags, so the outbox sends a whole batch of reminders in one request
+            subject, body, substitutions = personalize_appointment_reminder({
+                'patient_name': patient_name,
+                'doctor_name': doctor_name,
+                'specialization': specialization,
+                'date': appointment_date.strftime('%A, %B %d, %Y'),
+                'time': appointment_time,
+                'reason': reason or 'Not specified',
+            })
+            key = reminder_key(appointment_id, appointment_date, appointment_time)
+            messages.append((key, email, subject, body, substitutions))
+            ids.append(appointment_id)
+        render_seconds += time.perf_counter() - phase
+
+        phase = time.perf_counter()
+        if ids:
+            with engine.begin() as connection:
+                outbox.enqueue_emails(connection, messages, kind='appointment_reminder')
+                connection.execute(update(table).where(table.c.id.in_(ids)).values(reminder_sent_at=datetime.utcnow()))
+        write_seconds += time.perf_counter() - phase
+        queued += len(ids)
+
+        if len(rows) < page_size:
+            break
+
+    run = ReminderRun(
+        pages=pages, scanned=scanned, queued=queued, outside_window=outside_window,
+        elapsed_seconds=time.perf_counter() - started,
+        query_seconds=query_seconds, render_seconds=render_seconds, write_seconds=write_seconds,
+    )
+    logging.info(
+        f"Queued {queued} appointment reminders from {scanned} candidates in {pages} pages "
+        f"({run.elapsed_seconds:.2f}s: query {query_seconds:.2f}s, render {render_seconds:.2f}s, write {write_seconds:.2f}s)"
+    )
+    return run
+
+def run_scheduler(interval_seconds=REMINDER_INTERVAL_SECONDS, window_hours=REMINDER_WINDOW_HOURS,
+                  page_size=REMINDER_PAGE_SIZE, on_run=None):
+    """Queue due reminders every interval_seconds until interrupted, waking the outbox after each run."""
+    while True:
+        started = time.monotonic()
+        try:
+            run = queue_due_reminders(window_hours, page_size)
+            if run.queued and outbox.OUTBOX_IN_PROCESS:
+                outbox.outbox_workers.wake()
+            if on_run is not None:
+                on_run(run)
+        except Exception as e:
+            logging.error(f"Reminder scheduler error: {str(e)}")
+        time.sleep(max(0.0, interval_seconds - (time.monotonic() - started)))
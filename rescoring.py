@@ -0,0 +1,136 @@
+import os
+import json
+import time
+import logging
+
+from sqlalchemy import select, update, bindparam, or_
+
+from app import db
+from models import Prediction
+import ml_model
+import analytics
+from feature_encoder import feature_encoder
+import prediction_flags
+
+def _read_checkpoint(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return None
+
+def _write_checkpoint(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def rescore_predictions(batch_size=1000, sleep_seconds=0.0, max_rows_per_second=None,
+                        start_after_id=None, checkpoint_path=None, include_current=False, limit=None):
+    """
+    Re-score stored predictions with the current model, one keyset page at a time.
+
+    Pages are read with `id > last_id ORDER BY id LIMIT batch_size`, encoded
+    straight from the row columns, scored with one vectorized call and
+    written back with a single executemany UPDATE. Each page commits on its
+    own so locks are held only briefly and live traffic keeps flowing.
+
+    Args:
+        batch_size (int): Rows per page
+        sleep_seconds (float): Pause between pages
+        max_rows_per_second (float): Optional throughput ceiling
+        start_after_id (int): Resume after this id, overriding the checkpoint
+        checkpoint_path (str): File recording the last committed id
+        include_current (bool): Also re-score rows already tagged with the current version
+        limit (int): Stop after this many rows
+
+    Returns:
+        dict: Model version, rows updated, last id and elapsed seconds
+    """
+    # Pin one model for the whole run even if a new version is hot-swapped in meanwhile
+    state = ml_model.active_model
+    if state.compiled is None:
+        raise RuntimeError("No model is loaded; run 'flask train-model' first")
+    version = ml_model.version_tag(state)
+
+    checkpoint = _read_checkpoint(checkpoint_path)
+    if start_after_id is not None:
+        last_id = start_after_id
+    elif checkpoint and checkpoint.get('model_version') == version:
+        last_id = checkpoint['last_id']
+        logging.info(f"Resuming re-scoring after prediction id {last_id}")
+    else:
+        last_id = 0
+
+    table = Prediction.__table__
+    # Flags are read as their packed columns and unpacked per page
+    plain_names, flag_columns = prediction_flags.split_names(feature_encoder.feature_names)
+    page_query = (
+        select(
+            table.c.id, table.c.created_at, table.c.prediction_result,
+            *(table.c[name] for name in plain_names), *(table.c[column] for column in flag_columns)
+        )
+        .order_by(table.c.id)
+        .limit(batch_size)
+    )
+    if not include_current:
+        page_query = page_query.where(or_(table.c.model_version.is_(None), table.c.model_version != version))
+
+    update_statement = (
+        update(table)
+        .where(table.c.id == bindparam('b_id'))
+        .values(
+            prediction_result=bindparam('b_result'),
+            prediction_label=bindparam('b_label'),
+            model_version=bindparam('b_version')
+        )
+    )
+
+    started = time.perf_counter()
+    updated = 0
+    while limit is None or updated < limit:
+        rows = db.session.execute(page_query.where(table.c.id > last_id)).all()
+        if not rows:
+            break
+        if limit is not None:
+            rows = rows[:limit - updated]
+
+        # Column-wise encoding of the page, then one model call
+        ids = [row[0] for row in rows]
+        columns = prediction_flags.read_columns(rows, 3, plain_names, flag_columns)
+        probabilities = ml_model.predict_proba(feature_encoder.encode_columns(columns, len(rows)), state)[:, -1]
+
+        db.session.execute(update_statement, [
+            {'b_id': row_id, 'b_result': float(p), 'b_label': bool(p >= 0.5), 'b_version': version}
+            for row_id, p in zip(ids, probabilities.tolist())
+        ])
+        # Move each row to its new risk bucket in the rollup, in the same transaction
+        deltas = analytics.count_predictions(
+            ((row.created_at, row.age, row.gender, row.prediction_result) for row in rows), sign=-1
+        )
+        deltas.update(analytics.count_predictions(
+            (row.created_at, row.age, row.gender, p) for row, p in zip(rows, probabilities.tolist())
+        ))
+        analytics.apply_prediction_deltas(db.session.connection(), deltas)
+        db.session.commit()
+
+        last_id = ids[-1]
+        updated += len(ids)
+        if checkpoint_path:
+            _write_checkpoint(checkpoint_path, {'model_version': version, 'last_id': last_id, 'updated': updated})
+
+        elapsed = time.perf_counter() - started
+        logging.info(f"Re-scored {updated} predictions up to id {last_id} ({updated / elapsed:,.0f} rows/s)")
+
+        # Throttle so the backfill does not starve live requests
+        pause = sleep_seconds
+        if max_rows_per_second:
+            pause = max(pause, updated / max_rows_per_second - elapsed)
+        if pause > 0:
+            time.sleep(pause)
+
+    return {
+        'model_version': version,
+        'updated': updated,
+        'last_id': last_id,
+        'elapsed_seconds': time.perf_counter() - started
+    }
@@ -1,12 +1,27 @@
-from flask import jsonify, request, render_template
+from flask import jsonify, request, render_template, Response
 from app import app, db
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from models import User, Doctor, Prediction, Appointment
-from ml_model import predict_cardio_disease
+from pagination import list_response
+import serializers
+import metrics
+from prediction_flags import pack_record
+import analytics
+import bulk_import
+import ml_model
+from ml_model import predict_cardio_disease, predict_cardio_disease_batch, explain_prediction
+from prediction_cache import prediction_cache
+from directory_cache import doctor_directory
+from scheduling import schedule, parse_time, format_time, slot_key, now_key, BOOKING_HORIZON_DAYS
 import logging
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from werkzeug.security import generate_password_hash
+import io
+import csv
+import hmac
 import json
-from email_service import send_email
+from outbox import enqueue_email, outbox_workers, queue_stats
 
 # Serve main React app
 @app.route('/')
@@ -88,14 +103,61 @@ def get_user(user_id):
 
 @app.route('/api/doctors', methods=['GET'])
 def get_doctors():
-    doctors = Doctor.query.all()
-    doctors_list = []
+    # The directory only changes when doctors register or are updated, so it is served from cache
+    body, etag = doctor_directory.get(lambda: serializers.dumps(Doctor.serialize_list()))
     
-    for doctor in doctors:
-        doctor_dict = doctor.to_dict()
-        doctors_list.append(doctor_dict)
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/doctors/<int:doctor_id>/slots', methods=['GET'])
+def get_doctor_slots(doctor_id):
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else date.today()
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else start + timedelta(days=13)
+    except ValueError:
+        return jsonify({'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    if end < start or (end - start).days >= BOOKING_HORIZON_DAYS:
+        return jsonify({'error': f"The date range must span 1 to {BOOKING_HORIZON_DAYS} days"}), 400
+    
+    index = schedule.ensure_doctor(doctor_id)
+    if not index.has_doctor(doctor_id):
+        return jsonify({'error': 'Doctor not found'}), 404
     
-    return jsonify(doctors_list), 200
+    slots = index.free_slots(doctor_id, start, end, not_before=now_key())
+    return jsonify({
+        'doctor_id': doctor_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'slots': [{'date': day.isoformat(), 'time': format_time(minutes)} for day, minutes in slots]
+    }), 200
+
+@app.route('/api/doctors/first-available', methods=['GET'])
+def get_first_available_doctor():
+    specialization = request.args.get('specialization')
+    if not specialization:
+        return jsonify({'error': 'specialization is required'}), 400
+    try:
+        after = datetime.fromisoformat(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'after must be an ISO date or datetime'}), 400
+    
+    not_before = slot_key(after.date(), after.hour * 60 + after.minute) if after else now_key()
+    found = schedule.current().first_available(specialization, max(not_before, now_key()))
+    if found is None:
+        return jsonify({'error': f"No {specialization} doctor has a free slot in the next {BOOKING_HORIZON_DAYS} days"}), 404
+    
+    doctor_id, day, minutes = found
+    doctors = Doctor.serialize_list(Doctor.id == doctor_id)
+    return jsonify({
+        'doctor': doctors[0] if doctors else {'id': doctor_id},
+        'date': day.isoformat(),
+        'time': format_time(minutes)
+    }), 200
 
 @app.route('/api/doctors/<int:doctor_id>', methods=['GET'])
 def get_doctor(doctor_id):
@@ -105,13 +167,9 @@ def get_doctor(doctor_id):
     
     return jsonify(doctor.to_dict()), 200
 
-@app.route('/api/predict', methods=['POST'])
-def predict():
-    data = request.get_json()
-    user_id = data['userId']
-    
-    # Extract prediction features
-    features = {
+# Helper to map the camelCase prediction form onto model feature names
+def extract_prediction_features(data):
+    return {
         'age': data['age'],
         'gender': data['gender'],
         'height': data['height'],
@@ -124,58 +182,238 @@ def predict():
         'alcohol': data['alcohol'],
         'physical_activity': data['physicalActivity']
     }
+
+@app.route('/api/predict', methods=['POST'])
+def predict():
+    data = request.get_json()
+    user_id = data['userId']
+    
+    # Extract prediction features
+    features = extract_prediction_features(data)
     
     # Get prediction from ML model
-    prediction_result, prediction_label = predict_cardio_disease(features)
+    # The version comes from the same model snapshot that produced the score
+    prediction_result, prediction_label, model_version = predict_cardio_disease(features)
     
     # Create new prediction record
     prediction = Prediction(
         user_id=user_id,
-        age=features['age'],
-        gender=features['gender'],
-        height=features['height'],
-        weight=features['weight'],
-        systolic_bp=features['systolic_bp'],
-        diastolic_bp=features['diastolic_bp'],
-        cholesterol=features['cholesterol'],
-        glucose=features['glucose'],
-        smoking=features['smoking'],
-        alcohol=features['alcohol'],
-        physical_activity=features['physical_activity'],
         prediction_result=prediction_result,
-        prediction_label=prediction_label
+        prediction_label=prediction_label,
+        model_version=model_version,
+        **features
     )
     
     db.session.add(prediction)
     
     try:
         db.session.commit()
-        return jsonify({
+        response = {
             'message': 'Prediction successful',
             'prediction': prediction.to_dict()
-        }), 201
+        }
+        if data.get('explain'):
+            response['risk_drivers'] = explain_prediction(features)
+        return jsonify(response), 201
     except Exception as e:
         db.session.rollback()
         logging.error(f"Prediction error: {str(e)}")
         return jsonify({'error': 'Prediction failed'}), 500
 
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    data = request.get_json()
+    
+    # Accept either a bare list of forms or {'userId': ..., 'predictions': [...]}
+    if isinstance(data, list):
+        records, default_user_id = data, None
+    else:
+        records, default_user_id = data.get('predictions', []), data.get('userId')
+    
+    if not isinstance(records, list) or not records:
+        return jsonify({'error': 'No predictions supplied'}), 400
+    
+    results = [None] * len(records)
+    features_list = []
+    positions = []
+    
+    # Extract features row by row so a missing field only fails that row
+    for index, record in enumerate(records):
+        try:
+            user_id = record.get('userId', default_user_id)
+            if user_id is None:
+                raise KeyError('userId')
+            features = extract_prediction_features(record)
+        except (KeyError, AttributeError) as e:
+            results[index] = {'index': index, 'error': f"Missing field: {str(e)}"}
+            continue
+        features['user_id'] = user_id
+        features_list.append(features)
+        positions.append(index)
+    
+    # Score all valid rows with one vectorized model call
+    explain = bool(data.get('explain')) if isinstance(data, dict) else False
+    scores = predict_cardio_disease_batch(features_list, explain=explain)
+    
+    rows = []
+    row_positions = []
+    risk_drivers = {}
+    for index, features, score in zip(positions, features_list, scores):
+        if 'error' in score:
+            results[index] = {'index': index, 'error': score['error']}
+            continue
+        if 'risk_drivers' in score:
+            risk_drivers[index] = score.pop('risk_drivers')
+        # Flags go in as the packed bitset columns, since Core inserts bypass the hybrid attributes;
+        # the score carries the version of the model that produced it
+        rows.append(pack_record(dict(features, **score)))
+        row_positions.append(index)
+    
+    try:
+        if rows:
+            # Insert every scored row with one bulk INSERT statement
+            created = db.session.execute(
+                insert(Prediction).returning(
+                    Prediction.id, Prediction.created_at, sort_by_parameter_order=True
+                ),
+                rows
+            ).all()
+            # Core inserts bypass the ORM flush hook, so roll these rows up explicitly
+            analytics.apply_prediction_deltas(db.session.connection(), analytics.count_predictions(
+                (created_at, row['age'], row['gender'], row['prediction_result'])
+                for row, (_, created_at) in zip(rows, created)
+            ))
+            db.session.commit()
+            
+            for index, row, (prediction_id, created_at) in zip(row_positions, rows, created):
+                results[index] = {
+                    'index': index,
+                    'id': prediction_id,
+                    'user_id': row['user_id'],
+                    'prediction_result': row['prediction_result'],
+                    'prediction_label': row['prediction_label'],
+                    'created_at': created_at.isoformat() if created_at else None
+                }
+                if index in risk_drivers:
+                    results[index]['risk_drivers'] = risk_drivers[index]
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Batch prediction error: {str(e)}")
+        return jsonify({'error': 'Batch prediction failed'}), 500
+    
+    failed = sum(1 for result in results if 'error' in result)
+    return jsonify({
+        'message': 'Batch prediction completed',
+        'succeeded': len(results) - failed,
+        'failed': failed,
+        'results': results
+    }), 201 if failed < len(results) else 400
+
+@app.route('/api/model/status', methods=['GET'])
+def get_model_status():
+    state = ml_model.active_model
+    return jsonify({
+        'model_version': state.version,
+        'feature_importances': [
+            {'feature': name, 'importance': importance}
+            for name, importance in state.feature_importances
+        ],
+        'prediction_cache': prediction_cache.stats(),
+        'inference_scheduler': ml_model.inference_scheduler.stats() if ml_model.inference_scheduler else None
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not metrics.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/outbox/status', methods=['GET'])
+def get_outbox_status():
+    return jsonify({
+        'queue': queue_stats(),
+        'workers': outbox_workers.stats()
+    }), 200
+
+@app.route('/api/analytics/risk', methods=['GET'])
+def get_risk_analytics():
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+        return jsonify(analytics.risk_histograms(start, end, request.args.get('by', 'age_band,gender'))), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/analytics/appointments', methods=['GET'])
+def get_appointment_analytics():
+    try:
+        start = date.fromisoformat(request.args['from']) if 'from' in request.args else None
+        end = date.fromisoformat(request.args['to']) if 'to' in request.args else None
+        groups = analytics.appointment_counts(
+            start, end, request.args.get('by', 'doctor_id,status'), request.args.get('doctor_id', type=int)
+        )
+        return jsonify({'groups': groups}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/import/<kind>', methods=['POST'])
+def bulk_import_records(kind):
+    token = request.headers.get('X-Import-Token', '')
+    if not bulk_import.IMPORT_API_TOKEN or not hmac.compare_digest(token, bulk_import.IMPORT_API_TOKEN):
+        return jsonify({'error': 'Bulk import is not permitted'}), 403
+    if kind not in bulk_import.IMPORT_KINDS:
+        return jsonify({'error': f"Unknown import kind '{kind}'"}), 404
+    
+    # Either a multipart upload in 'file' or the raw request body
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    input_format = bulk_import.detect_format(
+        upload.filename if upload else None,
+        upload.mimetype if upload else request.mimetype,
+        request.args.get('format')
+    )
+    try:
+        report = bulk_import.import_records(
+            kind, io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''), input_format,
+            chunk_size=request.args.get('chunk_size', bulk_import.DEFAULT_CHUNK_SIZE, type=int)
+        )
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(report), 200 if report['inserted'] or not report['failed'] else 400
+
 @app.route('/api/users/<int:user_id>/predictions', methods=['GET'])
 def get_user_predictions(user_id):
-    predictions = Prediction.query.filter_by(user_id=user_id).order_by(Prediction.created_at.desc()).all()
-    predictions_list = [prediction.to_dict() for prediction in predictions]
-    
-    return jsonify(predictions_list), 200
+    return list_response(
+        Prediction.list_statement(Prediction.user_id == user_id),
+        Prediction.created_at, Prediction.id, datetime.fromisoformat,
+        Prediction.serialize_rows
+    )
 
 @app.route('/api/appointments', methods=['POST'])
 def create_appointment():
     data = request.get_json()
     
-    # Create new appointment without payment info
+    try:
+        doctor_id = int(data['doctorId'])
+        appointment_date = datetime.strptime(data['appointmentDate'], '%Y-%m-%d').date()
+        slot_minutes = parse_time(data['appointmentTime'])
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    index = schedule.ensure_doctor(doctor_id)
+    if not index.has_doctor(doctor_id):
+        return jsonify({'error': 'Doctor not found'}), 404
+    if not index.offers(doctor_id, appointment_date, slot_minutes):
+        return jsonify({'error': 'The doctor is not available at that time'}), 400
+    
+    # Create new appointment without payment info; the time is stored in canonical form
+    # so the unique slot index sees '9:00 am' and '09:00 AM' as the same slot
     appointment = Appointment(
         user_id=data['userId'],
-        doctor_id=data['doctorId'],
-        appointment_date=datetime.strptime(data['appointmentDate'], '%Y-%m-%d').date(),
-        appointment_time=data['appointmentTime'],
+        doctor_id=doctor_id,
+        appointment_date=appointment_date,
+        appointment_time=format_time(slot_minutes),
         reason=data.get('reason', ''),
         status=data.get('status', 'confirmed'),
         notes=data.get('notes', '')
@@ -190,44 +428,26 @@ def create_appointment():
     db.session.add(appointment)
     
     try:
-        db.session.commit()
+        # Flush first so the slot conflict surfaces before any mail is queued
+        db.session.flush()
         
-        # Send confirmation email
-        user = User.query.get(data['userId'])
-        doctor_model = Doctor.query.get(data['doctorId'])
-        doctor_user = User.query.get(doctor_model.user_id)
+        # Queue the confirmation in the same transaction; it is sent only if the booking commits
+        user = db.session.get(User, appointment.user_id)
+        doctor_model = db.session.get(Doctor, doctor_id)
+        doctor_user = db.session.get(User, doctor_model.user_id)
+        if user is not None:
+            queue_appointment_confirmation(appointment, user, doctor_user.full_name, doctor_model.specialization)
         
-        # Extract priority and other new fields if present
-        priority = data.get('priority', 'regular')
-        follow_up = data.get('followUp', False)
-        medical_records = data.get('medicalRecords', False)
-        
-        # Prepare appointment details for email with enhanced information
-        appointment_details = {
-            'patient_name': user.full_name,
-            'doctor_name': doctor_user.full_name,
-            'specialization': doctor_model.specialization,
-            'date': appointment.appointment_date.strftime('%A, %B %d, %Y'),
-            'time': appointment.appointment_time,
-            'reason': appointment.reason,
-            'notes': appointment.notes,
-            'priority': priority.title(),
-            'follow_up': 'Yes' if follow_up else 'No',
-            'medical_records': 'Yes' if medical_records else 'No'
-        }
-        
-        # Use the email service function with improved logging
-        try:
-            logging.info(f"Attempting to send confirmation email to {user.email}")
-            send_appointment_confirmation(user.email, user.full_name, doctor_user.full_name, doctor_model.specialization, appointment.appointment_date, appointment.appointment_time)
-        except Exception as email_error:
-            logging.error(f"Exception when sending email: {str(email_error)}")
-            # Don't fail the appointment creation if email fails
+        db.session.commit()
         
         return jsonify({
             'message': 'Appointment created successfully',
             'appointment': appointment.to_dict()
         }), 201
+    except IntegrityError:
+        # Another request booked this slot first
+        db.session.rollback()
+        return jsonify({'error': 'That time slot is already booked'}), 409
     except Exception as e:
         db.session.rollback()
         logging.error(f"Appointment creation error: {str(e)}")
@@ -235,17 +455,19 @@ def create_appointment():
 
 @app.route('/api/users/<int:user_id>/appointments', methods=['GET'])
 def get_user_appointments(user_id):
-    appointments = Appointment.query.filter_by(user_id=user_id).order_by(Appointment.appointment_date.desc()).all()
-    appointments_list = [appointment.to_dict() for appointment in appointments]
-    
-    return jsonify(appointments_list), 200
+    return list_response(
+        Appointment.list_statement(Appointment.user_id == user_id),
+        Appointment.appointment_date, Appointment.id, date.fromisoformat,
+        Appointment.serialize_rows
+    )
 
 @app.route('/api/doctors/<int:doctor_id>/appointments', methods=['GET'])
 def get_doctor_appointments(doctor_id):
-    appointments = Appointment.query.filter_by(doctor_id=doctor_id).order_by(Appointment.appointment_date.desc()).all()
-    appointments_list = [appointment.to_dict() for appointment in appointments]
-    
-    return jsonify(appointments_list), 200
+    return list_response(
+        Appointment.list_statement(Appointment.doctor_id == doctor_id),
+        Appointment.appointment_date, Appointment.id, date.fromisoformat,
+        Appointment.serialize_rows
+    )
 
 @app.route('/api/appointments/<int:appointment_id>', methods=['PUT'])
 def update_appointment(appointment_id):
@@ -267,6 +489,10 @@ def update_appointment(appointment_id):
             'message': 'Appointment updated successfully',
             'appointment': appointment.to_dict()
         }), 200
+    except IntegrityError:
+        # Re-activating a cancelled appointment whose slot was booked since
+        db.session.rollback()
+        return jsonify({'error': 'That time slot is already booked'}), 409
     except Exception as e:
         db.session.rollback()
         logging.error(f"Appointment update error: {str(e)}")
@@ -289,14 +515,14 @@ def delete_appointment(appointment_id):
         logging.error(f"Appointment deletion error: {str(e)}")
         return jsonify({'error': 'Failed to delete appointment'}), 500
 
-# Helper function to send appointment confirmation email
-def send_appointment_confirmation(recipient_email, patient_name, doctor_name, specialization, appointment_date, appointment_time):
-    try:
-        subject = "Appointment Confirmation"
-        body = f"""
-        Hello {patient_name},
+# Helper function to queue the appointment confirmation email
+def queue_appointment_confirmation(appointment, user, doctor_name, specialization):
+    subject = "Appointment Confirmation"
+    # Per-booking values are substitution tags, so confirmations queued together share one request
+    body = """
+        Hello -patient_name-,
         
-        Your appointment with Dr. {doctor_name} ({specialization}) has been scheduled for {appointment_date} at {appointment_time}.
+        Your appointment with Dr. -doctor_name- (-specialization-) has been scheduled for -date- at -time-.
         
         Please arrive 15 minutes before your scheduled time.
         
@@ -305,9 +531,14 @@ def send_appointment_confirmation(recipient_email, patient_name, doctor_name, sp
         Thank you,
         CardioCare Team
         """
-        
-        success = send_email(recipient_email, subject, body)
-        if not success:
-            logging.error(f"Failed to send appointment confirmation email to {recipient_email}")
-    except Exception as e:
-        logging.error(f"Failed to send email: {str(e)}")
+    # Ids are reused after a delete, so the key also names the booking's patient and creation time
+    key = f"appointment-confirmation:{appointment.id}:{appointment.user_id}:{appointment.created_at.isoformat()}"
+    substitutions = {
+        '-patient_name-': str(user.full_name),
+        '-doctor_name-': str(doctor_name),
+        '-specialization-': str(specialization),
+        '-date-': str(appointment.appointment_date),
+        '-time-': appointment.appointment_time,
+    }
+    enqueue_email(user.email, subject, body, idempotency_key=key, kind='appointment_confirmation',
+                  substitutions=substitutions)
@@ -0,0 +1,454 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left, insort
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+
+from sqlalchemy import event, select, func, inspect
+
+from app import db
+from models import Doctor, Appointment
+
+# Scheduling configuration, overridable from the environment
+BOOKING_HORIZON_DAYS = int(os.environ.get('BOOKING_HORIZON_DAYS', 90))
+SCHEDULE_SYNC_INTERVAL = float(os.environ.get('SCHEDULE_SYNC_INTERVAL', 10))
+SCHEDULE_REBUILD_INTERVAL = float(os.environ.get('SCHEDULE_REBUILD_INTERVAL', 300))
+
+MINUTES_PER_DAY = 24 * 60
+TIME_FORMATS = ('%I:%M %p', '%H:%M')
+WEEKDAY_PREFIXES = {name: index for index, name in enumerate(('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun'))}
+
+# A doctor's availability parsed once: weekday numbers (Monday = 0) and sorted slot start minutes
+DoctorSchedule = namedtuple('DoctorSchedule', ['doctor_id', 'specialization', 'weekdays', 'slot_minutes'])
+
+@lru_cache(maxsize=1024)
+def parse_time(value):
+    """Minutes after midnight for a '09:00 AM' or '14:30' style time."""
+    text = str(value).strip().upper()
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        return parsed.hour * 60 + parsed.minute
+    raise ValueError(f"Unrecognized appointment time '{value}'")
+
+def format_time(minutes):
+    """Canonical slot label as stored in appointment_time, e.g. '09:00 AM'."""
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+def parse_days(value):
+    """Weekday numbers for a comma-separated list of day names."""
+    weekdays = set()
+    for name in (value or '').split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name[:3] not in WEEKDAY_PREFIXES:
+            logging.warning(f"Ignoring unrecognized available day '{name}'")
+            continue
+        weekdays.add(WEEKDAY_PREFIXES[name[:3]])
+    return frozenset(weekdays)
+
+def parse_hours(value):
+    slot_minutes = set()
+    for label in (value or '').split(','):
+        if label.strip():
+            try:
+                slot_minutes.add(parse_time(label))
+            except ValueError as e:
+                logging.warning(f"Ignoring available hour: {str(e)}")
+    return tuple(sorted(slot_minutes))
+
+def slot_key(day, minutes):
+    """Totally ordered integer key for a slot: day ordinal * 1440 + minutes."""
+    return day.toordinal() * MINUTES_PER_DAY + minutes
+
+def slot_from_key(key):
+    ordinal, minutes = divmod(key, MINUTES_PER_DAY)
+    return date.fromordinal(ordinal), minutes
+
+def now_key():
+    now = datetime.now()
+    return slot_key(now.date(), now.hour * 60 + now.minute)
+
+class ScheduleIndex:
+    """
+    In-memory index of doctor availability and booked slots.
+
+    Availability strings are parsed once per doctor into a DoctorSchedule.
+    Booked slots are kept per doctor as a sorted list of slot keys, so a
+    membership test or the start of a date range is a binary search.
+
+    "First available in a specialization" uses one heap per specialization
+    holding (next free slot, doctor) pairs. Booking a doctor's next free
+    slot pushes a fresh entry; superseded entries are discarded lazily when
+    they reach the top, so a query costs O(log doctors) amortized.
+    """
+
+    def __init__(self, horizon_days=BOOKING_HORIZON_DAYS):
+        self.horizon_days = horizon_days
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._schedules = {}
+        self._by_specialization = {}
+        self._booked = {}
+        # doctor_id -> (floor, next free key at or after floor, or None)
+        self._next_free = {}
+        self._heaps = {}
+        self._heap_floors = {}
+
+    def load(self, doctors, bookings):
+        """
+        Replace the index contents.
+
+        Args:
+            doctors: Iterable of (doctor_id, specialization, available_days, available_hours)
+            bookings: Iterable of (doctor_id, appointment_date, appointment_time)
+        """
+        with self._lock:
+            self._reset()
+            for doctor in doctors:
+                self._set_schedule(*doctor)
+            booked = {}
+            for doctor_id, day, time_label in bookings:
+                try:
+                    booked.setdefault(doctor_id, []).append(slot_key(day, parse_time(time_label)))
+                except ValueError as e:
+                    logging.warning(f"Skipping booking of doctor {doctor_id}: {str(e)}")
+            for doctor_id, keys in booked.items():
+                keys.sort()
+                self._booked[doctor_id] = keys
+
+    def _set_schedule(self, doctor_id, specialization, available_days, available_hours):
+        previous = self._schedules.get(doctor_id)
+        if previous is not None:
+            self._by_specialization.get(previous.specialization, set()).discard(doctor_id)
+            self._heaps.pop(previous.specialization, None)
+        specialization = (specialization or '').strip().lower()
+        self._schedules[doctor_id] = DoctorSchedule(
+            doctor_id, specialization, parse_days(available_days), parse_hours(available_hours)
+        )
+        self._by_specialization.setdefault(specialization, set()).add(doctor_id)
+        self._next_free.pop(doctor_id, None)
+        # Rebuilt on the next first_available() call for this specialization
+        self._heaps.pop(specialization, None)
+
+    def set_doctor(self, doctor_id, specialization, available_days, available_hours, bookings=()):
+        """Add or replace one doctor's availability and booked (date, time) slots."""
+        with self._lock:
+            self._set_schedule(doctor_id, specialization, available_days, available_hours)
+            self._booked[doctor_id] = sorted(slot_key(day, parse_time(label)) for day, label in bookings)
+
+    def remove_doctor(self, doctor_id):
+        with self._lock:
+            schedule = self._schedules.pop(doctor_id, None)
+            if schedule is not None:
+                self._by_specialization[schedule.specialization].discard(doctor_id)
+                self._heaps.pop(schedule.specialization, None)
+            self._booked.pop(doctor_id, None)
+            self._next_free.pop(doctor_id, None)
+
+    def has_doctor(self, doctor_id):
+        return doctor_id in self._schedules
+
+    def offers(self, doctor_id, day, minutes):
+        """
+        Whether the doctor works at this slot.
+
+        Doctors without any availability on record accept any slot, as they
+        did before availability was enforced.
+        """
+        schedule = self._schedules.get(doctor_id)
+        if schedule is None:
+            return False
+        if not schedule.weekdays or not schedule.slot_minutes:
+            return True
+        return day.weekday() in schedule.weekdays and minutes in schedule.slot_minutes
+
+    def is_booked(self, doctor_id, day, minutes):
+        booked = self._booked.get(doctor_id, ())
+        key = slot_key(day, minutes)
+        index = bisect_left(booked, key)
+        return index < len(booked) and booked[index] == key
+
+    def book(self, doctor_id, day, minutes):
+        key = slot_key(day, minutes)
+        with self._lock:
+            insort(self._booked.setdefault(doctor_id, []), key)
+            entry = self._next_free.get(doctor_id)
+            if entry is not None and entry[1] == key:
+                self._update_next_free(doctor_id, entry[0], self._find_next_free(doctor_id, key + 1))
+
+    def release(self, doctor_id, day, minutes):
+        key = slot_key(day, minutes)
+        with self._lock:
+            booked = self._booked.get(doctor_id, [])
+            index = bisect_left(booked, key)
+            if index < len(booked) and booked[index] == key:
+                del booked[index]
+            entry = self._next_free.get(doctor_id)
+            if entry is not None and key >= entry[0] and (entry[1] is None or key < entry[1]):
+                self._update_next_free(doctor_id, entry[0], key)
+
+    def _update_next_free(self, doctor_id, floor, key):
+        self._next_free[doctor_id] = (floor, key)
+        heap = self._heaps.get(self._schedules[doctor_id].specialization)
+        if heap is not None and key is not None:
+            heapq.heappush(heap, (key, doctor_id))
+
+    def _slots_by_day(self, schedule, first_ordinal, last_ordinal):
+        for ordinal in range(first_ordinal, last_ordinal + 1):
+            # date.fromordinal(1) is a Monday
+            if (ordinal - 1) % 7 in schedule.weekdays:
+                base = ordinal * MINUTES_PER_DAY
+                yield base, schedule.slot_minutes
+
+    def _find_next_free(self, doctor_id, not_before):
+        schedule = self._schedules.get(doctor_id)
+        if schedule is None or not schedule.weekdays or not schedule.slot_minutes:
+            return None
+        booked = self._booked.get(doctor_id, ())
+        first_ordinal = not_before // MINUTES_PER_DAY
+        for base, slot_minutes in self._slots_by_day(schedule, first_ordinal, first_ordinal + self.horizon_days - 1):
+            for minutes in slot_minutes:
+                key = base + minutes
+                if key < not_before:
+                    continue
+                index = bisect_left(booked, key)
+                if index == len(booked) or booked[index] != key:
+                    return key
+        return None
+
+    def next_free(self, doctor_id, not_before=None):
+        """First free (date, minutes) for the doctor within the horizon, or None."""
+        with self._lock:
+            key = self._find_next_free(doctor_id, now_key() if not_before is None else not_before)
+        return slot_from_key(key) if key is not None else None
+
+    def free_slots(self, doctor_id, start, end, not_before=None):
+        """
+        Free (date, minutes) slots for the doctor between two dates, inclusive.
+
+        Args:
+            not_before (int): Optional slot key; earlier slots are omitted
+        """
+        with self._lock:
+            schedule = self._schedules.get(doctor_id)
+            if schedule is None:
+                return []
+            booked = self._booked.get(doctor_id, [])
+            first, last = start.toordinal(), end.toordinal()
+            # Only the bookings inside the window are looked at
+            lo = bisect_left(booked, first * MINUTES_PER_DAY)
+            hi = bisect_left(booked, (last + 1) * MINUTES_PER_DAY)
+            taken = set(booked[lo:hi])
+            return [
+                slot_from_key(base + minutes)
+                for base, slot_minutes in self._slots_by_day(schedule, first, last)
+                for minutes in slot_minutes
+                if base + minutes not in taken and (not_before is None or base + minutes >= not_before)
+            ]
+
+    def first_available(self, specialization, not_before=None):
+        """
+        Earliest free slot of any doctor in a specialization.
+
+        Returns:
+            tuple: (doctor_id, date, minutes), or None if nobody is free within the horizon
+        """
+        specialization = (specialization or '').strip().lower()
+        not_before = now_key() if not_before is None else not_before
+        with self._lock:
+            doctor_ids = self._by_specialization.get(specialization)
+            if not doctor_ids:
+                return None
+
+            heap = self._heaps.get(specialization)
+            if heap is not None and not_before < self._heap_floors[specialization]:
+                # Cached entries may have skipped slots before this point; answer directly
+                candidates = ((self._find_next_free(d, not_before), d) for d in doctor_ids)
+                key, doctor_id = min(((k, d) for k, d in candidates if k is not None), default=(None, None))
+                return (doctor_id, *slot_from_key(key)) if key is not None else None
+
+            if heap is None or len(heap) > 4 * len(doctor_ids):
+                heap = []
+                for doctor_id in doctor_ids:
+                    entry = self._next_free.get(doctor_id)
+                    if entry is None or entry[0] > not_before:
+                        entry = (not_before, self._find_next_free(doctor_id, not_before))
+                        self._next_free[doctor_id] = entry
+                    if entry[1] is not None:
+                        heap.append((entry[1], doctor_id))
+                heapq.heapify(heap)
+                self._heaps[specialization] = heap
+                self._heap_floors[specialization] = not_before
+
+            while heap:
+                key, doctor_id = heap[0]
+                entry = self._next_free.get(doctor_id)
+                if entry is None or entry[1] != key:
+                    heapq.heappop(heap)  # superseded
+                elif key < not_before:
+                    # That slot is now in the past; look again from not_before
+                    key = self._find_next_free(doctor_id, not_before)
+                    self._next_free[doctor_id] = (not_before, key)
+                    self._heap_floors[specialization] = max(self._heap_floors[specialization], not_before)
+                    if key is None:
+                        heapq.heappop(heap)
+                    else:
+                        heapq.heapreplace(heap, (key, doctor_id))
+                else:
+                    return (doctor_id, *slot_from_key(key))
+            return None
+
+def occupies_slot(table):
+    """Rows that hold their slot, i.e. every appointment that is not cancelled."""
+    return table.c.status.is_(None) | (table.c.status != 'cancelled')
+
+class DatabaseSchedule:
+    """
+    Keeps a ScheduleIndex in step with the database.
+
+    The index is built on first use from doctors and upcoming appointments.
+    Commits in this process mark the doctors they touch as stale and those
+    doctors are reloaded on the next read. Bookings made by other workers
+    are picked up every SCHEDULE_SYNC_INTERVAL seconds (new rows only), and
+    the index is rebuilt every SCHEDULE_REBUILD_INTERVAL seconds to catch
+    cancellations and doctor edits made elsewhere. The index only answers
+    availability queries; double-booking is prevented by the database's
+    unique slot index.
+    """
+
+    def __init__(self, index, sync_interval=SCHEDULE_SYNC_INTERVAL, rebuild_interval=SCHEDULE_REBUILD_INTERVAL):
+        self.index = index
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._synced_at = None
+        self._last_appointment_id = 0
+        self._last_doctor_id = 0
+        self._stale_doctors = set()
+
+    def _doctor_rows(self, *criteria):
+        return db.session.execute(
+            select(Doctor.id, Doctor.specialization, Doctor.available_days, Doctor.available_hours).where(*criteria)
+        ).all()
+
+    def _booking_rows(self, *criteria):
+        table = Appointment.__table__
+        return db.session.execute(
+            select(table.c.doctor_id, table.c.appointment_date, table.c.appointment_time)
+            .where(table.c.appointment_date >= date.today(), occupies_slot(table), *criteria)
+            .execution_options(yield_per=10000)
+        )
+
+    def rebuild(self):
+        started = time.perf_counter()
+        table = Appointment.__table__
+        last_appointment_id = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+        doctors = self._doctor_rows()
+        self.index.load(doctors, self._booking_rows(table.c.id <= last_appointment_id))
+        self._last_appointment_id = last_appointment_id
+        self._last_doctor_id = max((row[0] for row in doctors), default=0)
+        self._built_at = self._synced_at = time.monotonic()
+        logging.info(f"Built schedule index for {len(doctors)} doctors in {time.perf_counter() - started:.2f}s")
+
+    def sync(self):
+        """Add doctors and bookings created since the last build or sync."""
+        for row in self._doctor_rows(Doctor.id > self._last_doctor_id):
+            self.index.set_doctor(*row)
+            self._last_doctor_id = max(self._last_doctor_id, row[0])
+        table = Appointment.__table__
+        rows = db.session.execute(
+            select(table.c.id, table.c.doctor_id, table.c.appointment_date, table.c.appointment_time)
+            .where(table.c.id > self._last_appointment_id, table.c.appointment_date >= date.today(), occupies_slot(table))
+            .order_by(table.c.id)
+        ).all()
+        for appointment_id, doctor_id, day, time_label in rows:
+            self._last_appointment_id = appointment_id
+            try:
+                minutes = parse_time(time_label)
+            except ValueError as e:
+                logging.warning(f"Skipping booking {appointment_id}: {str(e)}")
+                continue
+            # Bookings made in this process may already be in via refresh_doctors()
+            if not self.index.is_booked(doctor_id, day, minutes):
+                self.index.book(doctor_id, day, minutes)
+        self._synced_at = time.monotonic()
+
+    def refresh_doctors(self, doctor_ids):
+        """Reload availability and bookings for specific doctors."""
+        table = Appointment.__table__
+        for doctor_id in doctor_ids:
+            rows = self._doctor_rows(Doctor.id == doctor_id)
+            if not rows:
+                self.index.remove_doctor(doctor_id)
+                continue
+            bookings = [(day, label) for _, day, label in self._booking_rows(table.c.doctor_id == doctor_id)]
+            self.index.set_doctor(*rows[0], bookings=bookings)
+
+    def current(self):
+        """Return the index after applying any pending refresh, sync or rebuild."""
+        with self._lock:
+            now = time.monotonic()
+            if self._built_at is None or now - self._built_at >= self.rebuild_interval:
+                self._stale_doctors.clear()
+                self.rebuild()
+            else:
+                if self._stale_doctors:
+                    stale, self._stale_doctors = self._stale_doctors, set()
+                    self.refresh_doctors(stale)
+                if now - self._synced_at >= self.sync_interval:
+                    self.sync()
+            return self.index
+
+    def ensure_doctor(self, doctor_id):
+        """Return the index, loading the doctor first if it registered in another worker."""
+        index = self.current()
+        if not index.has_doctor(doctor_id):
+            with self._lock:
+                self.refresh_doctors({doctor_id})
+        return index
+
+    def mark_stale(self, doctor_ids):
+        with self._lock:
+            self._stale_doctors.update(doctor_ids)
+
+    def invalidate(self):
+        """Rebuild the whole index on the next read, e.g. after a bulk import."""
+        with self._lock:
+            self._built_at = None
+
+# Process-wide schedule used by the appointment routes
+schedule = DatabaseSchedule(ScheduleIndex())
+
+@event.listens_for(db.session, 'after_flush')
+def _note_schedule_changes(session, flush_context):
+    doctor_ids = session.info.setdefault('schedule_doctors_changed', set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Doctor):
+            doctor_ids.add(instance.id)
+        elif isinstance(instance, Appointment):
+            doctor_ids.add(instance.doctor_id)
+            # A moved appointment frees a slot with its previous doctor too
+            doctor_ids.update(inspect(instance).attrs.doctor_id.history.deleted or ())
+
+@event.listens_for(db.session, 'after_commit')
+def _refresh_after_commit(session):
+    doctor_ids = session.info.pop('schedule_doctors_changed', None)
+    if doctor_ids:
+        # No SQL can run inside after_commit, so the reload happens on the next read
+        schedule.mark_stale(doctor_ids)
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('schedule_doctors_changed', None)
@@ -1,3 +1,6 @@
+-- Reference schema (SQLite) matching models.py at migration version 7.
+-- The application creates and upgrades the schema itself; see migrations.py.
+
 CREATE TABLE IF NOT EXISTS user (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     email VARCHAR(120) UNIQUE NOT NULL,
@@ -21,26 +24,53 @@ CREATE TABLE IF NOT EXISTS doctor (
     FOREIGN KEY (user_id) REFERENCES user (id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_doctor_user_id ON doctor (user_id);
+
 CREATE TABLE IF NOT EXISTS prediction (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
+
+    -- Basic information
     age INTEGER NOT NULL,
     gender VARCHAR(10) NOT NULL,
     height FLOAT NOT NULL,
     weight FLOAT NOT NULL,
+
+    -- Physiological indicators
     systolic_bp INTEGER NOT NULL,
     diastolic_bp INTEGER NOT NULL,
     cholesterol INTEGER NOT NULL,
+    hdl_cholesterol FLOAT,
+    ldl_cholesterol FLOAT,
     glucose INTEGER NOT NULL,
-    smoking BOOLEAN NOT NULL,
-    alcohol BOOLEAN NOT NULL,
-    physical_activity BOOLEAN NOT NULL,
+    heart_rate INTEGER,
+    waist_hip_ratio FLOAT,
+    triglycerides FLOAT,
+    c_reactive_protein FLOAT,
+
+    -- Lifestyle factors
+    sleep_hours FLOAT,
+    stress_level INTEGER,
+    work_hours INTEGER,
+
+    -- Yes/no answers packed per category; bit order in prediction_flags.py
+    symptom_flags INTEGER NOT NULL DEFAULT 0,
+    lifestyle_flags INTEGER NOT NULL DEFAULT 0,
+    history_flags INTEGER NOT NULL DEFAULT 0,
+    condition_flags INTEGER NOT NULL DEFAULT 0,
+
+    -- Prediction results
     prediction_result FLOAT NOT NULL,
     prediction_label BOOLEAN NOT NULL,
+    model_version VARCHAR(40),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES user (id)
 );
 
+CREATE INDEX IF NOT EXISTS ix_prediction_user_created ON prediction (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS ix_prediction_symptom_flags ON prediction (symptom_flags);
+CREATE INDEX IF NOT EXISTS ix_prediction_condition_flags ON prediction (condition_flags);
+
 CREATE TABLE IF NOT EXISTS appointment (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
@@ -50,7 +80,72 @@ CREATE TABLE IF NOT EXISTS appointment (
     reason TEXT,
     status VARCHAR(20) DEFAULT 'pending',
     notes TEXT,
+    payment_status VARCHAR(20) DEFAULT 'unpaid',
+    payment_method VARCHAR(50),
+    payment_amount FLOAT DEFAULT 0.0,
+    payment_date TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    reminder_sent_at TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES user (id),
     FOREIGN KEY (doctor_id) REFERENCES doctor (id)
 );
+
+CREATE INDEX IF NOT EXISTS ix_appointment_user_date ON appointment (user_id, appointment_date, id);
+CREATE INDEX IF NOT EXISTS ix_appointment_doctor_date ON appointment (doctor_id, appointment_date, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_appointment_doctor_slot ON appointment (doctor_id, appointment_date, appointment_time)
+    WHERE status IS NULL OR status != 'cancelled';
+CREATE INDEX IF NOT EXISTS ix_appointment_reminder_due ON appointment (appointment_date, id, status)
+    WHERE reminder_sent_at IS NULL;
+
+-- Analytics rollups, maintained incrementally by analytics.py
+CREATE TABLE IF NOT EXISTS prediction_rollup (
+    day DATE NOT NULL,
+    age_band INTEGER NOT NULL,
+    gender VARCHAR(10) NOT NULL,
+    risk_bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, age_band, gender, risk_bucket)
+);
+
+CREATE TABLE IF NOT EXISTS appointment_rollup (
+    day DATE NOT NULL,
+    doctor_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, doctor_id, status)
+);
+
+-- Transactional email outbox, drained by the workers in outbox.py
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key VARCHAR(200) UNIQUE NOT NULL,
+    kind VARCHAR(50) NOT NULL,
+    recipient VARCHAR(120) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    substitutions TEXT,
+    status VARCHAR(20) NOT NULL,
+    attempts INTEGER NOT NULL,
+    next_attempt_at TIMESTAMP NOT NULL,
+    locked_until TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_email_outbox_due ON email_outbox (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP NOT NULL
+);
+
+INSERT OR IGNORE INTO schema_version (version, name, applied_at) VALUES
+    (1, 'add_missing_columns', CURRENT_TIMESTAMP),
+    (2, 'history_list_indexes', CURRENT_TIMESTAMP),
+    (3, 'unique_appointment_slot', CURRENT_TIMESTAMP),
+    (4, 'analytics_rollups', CURRENT_TIMESTAMP),
+    (5, 'prediction_flag_bitsets', CURRENT_TIMESTAMP),
+    (6, 'email_outbox', CURRENT_TIMESTAMP),
+    (7, 'appointment_reminders', CURRENT_TIMESTAMP);
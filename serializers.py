@@ -0,0 +1,104 @@
+"""
+Row serializers for the read-only list endpoints.
+
+List endpoints select plain columns with SQLAlchemy Core and turn each row
+tuple into the same dict the model's to_dict() returns, without building
+ORM instances or touching the identity map. A RowSerializer is compiled
+once per field list into a function that unpacks the row and builds the
+dict in a single expression, with dates and flag bitsets decoded inline.
+Responses are encoded with orjson when it is installed and with the
+standard library otherwise; both sort keys like Flask's jsonify.
+"""
+import json
+from collections import namedtuple
+
+from flask import Response
+from sqlalchemy import Date, DateTime
+
+from prediction_flags import FLAG_COLUMNS, decode_table
+
+try:
+    import orjson
+except ImportError:  # optional speed-up; the standard library encoder gives the same JSON
+    orjson = None
+
+# One output key: the selected column and how its value is rendered
+Field = namedtuple('Field', ['key', 'column', 'kind'])
+
+VALUE = 'value'          # as returned by the driver
+ISOFORMAT = 'isoformat'  # date or datetime -> ISO 8601 string, None kept
+CSV_LIST = 'csv_list'    # comma-separated text -> list, empty or None -> []
+FLAGS = 'flags'          # packed flag column -> one boolean key per flag
+
+def _expression(kind, value):
+    if kind == VALUE:
+        return value
+    if kind == ISOFORMAT:
+        return f"({value}.isoformat() if {value} is not None else None)"
+    if kind == CSV_LIST:
+        return f"({value}.split(',') if {value} else [])"
+    raise ValueError(f"Unknown field kind '{kind}'")
+
+class RowSerializer:
+    """
+    Serializer compiled once from a field list.
+
+    `columns` are the expressions to select, in the order the compiled
+    serialize_row() unpacks them.
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.columns = [field.column for field in self.fields]
+        self.serialize_row = self._compile()
+
+    @classmethod
+    def for_table(cls, table, extra_fields=(), exclude=()):
+        """
+        Serializer for every column of a table not named in exclude, typed by
+        column type, plus extra fields.
+        """
+        fields = []
+        for column in table.columns:
+            if column.name in exclude:
+                continue
+            if column.name in FLAG_COLUMNS:
+                kind = FLAGS
+            elif isinstance(column.type, (Date, DateTime)):
+                kind = ISOFORMAT
+            else:
+                kind = VALUE
+            fields.append(Field(column.name, column, kind))
+        return cls(fields + list(extra_fields))
+
+    def _compile(self):
+        namespace = {}
+        names = [f'c{i}' for i in range(len(self.fields))]
+        items = []
+        for name, field in zip(names, self.fields):
+            if field.kind == FLAGS:
+                table = f'flags_{name}'
+                namespace[table] = decode_table(field.key)
+                items.append(f"**{table}[{name} or 0]")
+            else:
+                items.append(f"{field.key!r}: {_expression(field.kind, name)}")
+        lines = [
+            'def serialize_row(row):',
+            f"    {', '.join(names)}, = row",
+            f"    return {{{', '.join(items)}}}",
+        ]
+        exec(compile('\n'.join(lines), '<row_serializer>', 'exec'), namespace)
+        return namespace['serialize_row']
+
+    def serialize_rows(self, rows):
+        """Lazily serialize an iterable of rows."""
+        return map(self.serialize_row, rows)
+
+def dumps(obj):
+    """Encode to compact, key-sorted JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+
+def json_response(obj, status=200):
+    return Response(dumps(obj), status=status, mimetype='application/json')
@@ -0,0 +1,136 @@
+"""
+Storage engine profiles for SQLite and PostgreSQL.
+
+STORAGE_PROFILE selects how the database engine is configured:
+
+- 'tuned' (default): SQLite runs in WAL mode with synchronous=NORMAL, a
+  busy timeout, memory-mapped I/O and a larger page cache, so readers no
+  longer block the writer and concurrent workers wait for the write lock
+  instead of failing. PostgreSQL gets a sized connection pool with
+  overflow, and every connection gets statement and idle-in-transaction
+  timeouts.
+- 'baseline': the engine defaults the app used before profiles existed,
+  kept for comparison (see benchmarks/bench_storage.py).
+
+Pool settings are engine options; per-connection settings are applied
+from the engine's 'connect' event, so they hold for every pooled
+connection, including ones opened after a pool recycle. WAL mode persists
+in the database file once set.
+"""
+import os
+import logging
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+STORAGE_PROFILE = os.environ.get('STORAGE_PROFILE', 'tuned')
+
+# Overrides for the tuned profile
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+DB_IDLE_IN_TRANSACTION_TIMEOUT_MS = int(os.environ.get('DB_IDLE_IN_TRANSACTION_TIMEOUT_MS', 60000))
+
+# Engine options shared by every profile
+BASE_ENGINE_OPTIONS = {
+    'pool_recycle': 300,
+    'pool_pre_ping': True,
+}
+
+StorageProfile = namedtuple('StorageProfile', ['name', 'sqlite_pragmas', 'postgresql_settings', 'postgresql_pool'])
+
+PROFILES = {
+    'baseline': StorageProfile('baseline', (), (), {}),
+    'tuned': StorageProfile(
+        'tuned',
+        # journal_mode first: the other pragmas apply per connection either way
+        (
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('busy_timeout', SQLITE_BUSY_TIMEOUT_MS),
+            ('mmap_size', SQLITE_MMAP_SIZE),
+            ('cache_size', -SQLITE_CACHE_SIZE_KB),  # negative means KiB rather than pages
+        ),
+        (
+            ('statement_timeout', DB_STATEMENT_TIMEOUT_MS),
+            ('idle_in_transaction_session_timeout', DB_IDLE_IN_TRANSACTION_TIMEOUT_MS),
+        ),
+        {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT},
+    ),
+}
+
+def get_profile(name=None):
+    name = name or STORAGE_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown storage profile '{name}'; choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+def engine_options(database_uri, profile=None):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for a database URI under a profile.
+
+    Returns:
+        dict: Options passed to create_engine()
+    """
+    profile = get_profile(profile)
+    options = dict(BASE_ENGINE_OPTIONS)
+    if make_url(database_uri).get_backend_name() == 'postgresql':
+        options.update(profile.postgresql_pool)
+    return options
+
+def _apply_sqlite_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def _apply_postgresql_settings(dbapi_connection, settings):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in settings:
+            cursor.execute(f"SET {name} = {int(value)}")
+    finally:
+        cursor.close()
+    # The driver opened a transaction for the SETs; end it so the pool hands out a clean connection
+    dbapi_connection.commit()
+
+def install(engine, profile=None):
+    """Apply a profile's per-connection settings to every connection the engine opens."""
+    profile = get_profile(profile)
+    backend = engine.dialect.name
+    if backend == 'sqlite' and profile.sqlite_pragmas:
+        apply, settings = _apply_sqlite_pragmas, profile.sqlite_pragmas
+    elif backend == 'postgresql' and profile.postgresql_settings:
+        apply, settings = _apply_postgresql_settings, profile.postgresql_settings
+    else:
+        logging.info(f"Storage profile '{profile.name}' uses the {backend} defaults")
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        apply(dbapi_connection, settings)
+
+    logging.info(f"Storage profile '{profile.name}' applied to the {backend} engine")
+
+def describe(connection):
+    """
+    Effective per-connection settings, as reported by the database.
+
+    Returns:
+        dict: Setting name -> value
+    """
+    backend = connection.dialect.name
+    if backend == 'sqlite':
+        names = [name for name, _ in PROFILES['tuned'].sqlite_pragmas]
+        return {name: connection.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names}
+    if backend == 'postgresql':
+        names = [name for name, _ in PROFILES['tuned'].postgresql_settings]
+        return {name: connection.exec_driver_sql(f"SHOW {name}").scalar() for name in names}
+    return {}
@@ -0,0 +1,23 @@
+import os
+
+# Configure the app before it is imported: an in-memory database and no
+# outbox workers issuing their own statements on the engine
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('EMAIL_OUTBOX_IN_PROCESS', '0')
+
+import pytest
+
+from app import app, db
+
+@pytest.fixture
+def app_context():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app_context):
+    return app_context.test_client()
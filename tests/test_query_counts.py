@@ -0,0 +1,107 @@
+"""
+SQL statement counts of the doctor and appointment list endpoints.
+
+Each list endpoint must issue a fixed number of statements however many
+rows it returns. Only statements issued on the request's thread are
+counted, so background work on the same engine cannot skew them.
+"""
+import threading
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import db
+from models import User, Doctor, Appointment
+from pagination import DEFAULT_PAGE_SIZE
+
+# Fewer than one page, just over one page, and many pages
+SIZES = (5, DEFAULT_PAGE_SIZE + 10, 500)
+
+# Statements per request, pinned: a change here is a regression or needs a reason
+DIRECTORY_BUILD_STATEMENTS = 1
+DIRECTORY_CACHED_STATEMENTS = 0
+APPOINTMENT_LIST_STATEMENTS = 1
+
+def seed(n_rows):
+    users = [
+        User(email=f"user{i}@example.com", username=f"user{i}", password_hash='x', full_name=f"User {i}")
+        for i in range(2 * n_rows)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    doctors = [
+        Doctor(user_id=users[n_rows + i].id, specialization='Cardiology', experience_years=10)
+        for i in range(n_rows)
+    ]
+    db.session.add_all(doctors)
+    db.session.flush()
+    # One patient and one doctor with n_rows appointments each
+    db.session.add_all(
+        Appointment(user_id=users[0].id, doctor_id=doctors[0].id if i % 2 else doctors[i].id,
+                    appointment_date=date(2024, 1, 1) + timedelta(days=i), appointment_time='09:00 AM')
+        for i in range(n_rows)
+    )
+    db.session.add_all(
+        Appointment(user_id=users[i].id, doctor_id=doctors[0].id,
+                    appointment_date=date(2024, 1, 1) + timedelta(days=i), appointment_time='10:00 AM')
+        for i in range(1, n_rows)
+    )
+    db.session.commit()
+    user_id, doctor_id = users[0].id, doctors[0].id
+    db.session.remove()
+    return user_id, doctor_id
+
+def count_statements(client, url):
+    """GET url and return (statements issued, JSON body)."""
+    statements = []
+    # The test client handles the request on this thread
+    request_thread = threading.get_ident()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == request_thread:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200, response.status_code
+    return len(statements), response.get_json()
+
+@pytest.mark.parametrize('n_rows', SIZES)
+def test_doctor_directory(client, n_rows):
+    seed(n_rows)
+
+    # Seeding invalidated the directory, so the first request builds it
+    n_statements, doctors = count_statements(client, '/api/doctors')
+    assert len(doctors) == n_rows
+    assert n_statements == DIRECTORY_BUILD_STATEMENTS
+
+    n_statements, doctors = count_statements(client, '/api/doctors')
+    assert len(doctors) == n_rows
+    assert n_statements == DIRECTORY_CACHED_STATEMENTS
+
+@pytest.mark.parametrize('n_rows', SIZES)
+@pytest.mark.parametrize('owner', ['users', 'doctors'])
+def test_appointment_list(client, n_rows, owner):
+    user_id, doctor_id = seed(n_rows)
+    url = f"/api/{owner}/{user_id if owner == 'users' else doctor_id}/appointments"
+    expected = n_rows if owner == 'users' else n_rows + n_rows // 2
+
+    n_statements, appointments = count_statements(client, url)
+    assert len(appointments) == expected
+    assert n_statements == APPOINTMENT_LIST_STATEMENTS
+
+    # Walk every page; each one costs the same as the full list
+    seen = 0
+    page_url = f"{url}?limit={DEFAULT_PAGE_SIZE}"
+    while True:
+        n_statements, page = count_statements(client, page_url)
+        assert n_statements == APPOINTMENT_LIST_STATEMENTS
+        seen += len(page['items'])
+        if page['next_cursor'] is None:
+            break
+        page_url = f"{url}?limit={DEFAULT_PAGE_SIZE}&cursor={page['next_cursor']}"
+    assert seen == expected
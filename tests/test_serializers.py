@@ -0,0 +1,49 @@
+"""
+The Core list serializers must produce what each model's to_dict() returns.
+
+List endpoints serialize rows with the compiled RowSerializers in models.py
+while single-object endpoints call to_dict(), so a column added to one path
+and not the other shows up here.
+"""
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from models import User, Doctor, Appointment, Prediction
+
+@pytest.fixture
+def records(app_context):
+    patient = User(email='patient@example.com', username='patient', password_hash='x', full_name='Pat Patient')
+    doctor_user = User(email='doctor@example.com', username='doctor', password_hash='x',
+                       full_name='Dr Doc', role='doctor')
+    db.session.add_all([patient, doctor_user])
+    db.session.flush()
+    doctor = Doctor(user_id=doctor_user.id, specialization='Cardiology', experience_years=10,
+                    available_days='Monday,Tuesday', available_hours='09:00 AM,10:00 AM')
+    db.session.add(doctor)
+    db.session.flush()
+    appointment = Appointment(user_id=patient.id, doctor_id=doctor.id, appointment_date=date(2024, 1, 1),
+                              appointment_time='09:00 AM', reason='Checkup', payment_date=datetime(2024, 1, 1),
+                              reminder_sent_at=datetime(2023, 12, 31))
+    prediction = Prediction(user_id=patient.id, age=50, gender='male', height=175.0, weight=80.0,
+                            systolic_bp=130, diastolic_bp=85, cholesterol=2, glucose=1,
+                            chest_pain=True, diabetes=True, prediction_result=0.7, prediction_label=True,
+                            model_version='local')
+    db.session.add_all([appointment, prediction])
+    db.session.commit()
+    return patient, doctor, appointment, prediction
+
+def test_doctor_list_matches_to_dict(records):
+    _, doctor, _, _ = records
+    assert Doctor.serialize_list() == [doctor.to_dict()]
+
+def test_appointment_list_matches_to_dict(records):
+    _, _, appointment, _ = records
+    rows = db.session.execute(Appointment.list_statement(Appointment.id == appointment.id))
+    assert list(Appointment.serialize_rows(rows)) == [appointment.to_dict()]
+
+def test_prediction_list_matches_to_dict(records):
+    _, _, _, prediction = records
+    rows = db.session.execute(Prediction.list_statement(Prediction.id == prediction.id))
+    assert list(Prediction.serialize_rows(rows)) == [prediction.to_dict()]